@@ -1,7 +1,12 @@
 import jwt
+import time
 from datetime import datetime, timedelta
 from typing import Dict
 from config import config
+from utils.cache import TTLCache
+
+# Keyed by the raw token, so a cached payload is exactly what decoding it gives
+_verified_tokens = TTLCache(config.AUTH_CACHE_SIZE, config.TOKEN_CACHE_TTL)
 
 def generate_token(user_id: int, role: str) -> str:
     payload = {
@@ -12,8 +17,12 @@ def generate_token(user_id: int, role: str) -> str:
     return jwt.encode(payload, config.JWT_SECRET_KEY, algorithm=config.JWT_ALGORITHM)
 
 def verify_token(token: str) -> Dict:
+    payload = _verified_tokens.get(token)
+    if payload is not None:
+        return payload
     try:
         payload = jwt.decode(token, config.JWT_SECRET_KEY, algorithms=[config.JWT_ALGORITHM])
+        _verified_tokens.set(token, payload, ttl=payload['exp'] - time.time() if 'exp' in payload else None)
         return payload
     except jwt.ExpiredSignatureError:
         raise ValueError("Token has expired")
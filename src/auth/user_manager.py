@@ -1,44 +1,76 @@
 import bcrypt
 import psycopg2
+import threading
+from contextlib import contextmanager
 from psycopg2.extras import RealDictCursor
+from psycopg2.pool import ThreadedConnectionPool
 from typing import Dict, Optional, List
 from config import config
+from utils.cache import TTLCache
 
 class UserManager:
     def __init__(self):
-        self.conn = psycopg2.connect(
-            host=config.DB_HOST,
-            port=config.DB_PORT,
-            database=config.DB_NAME,
-            user=config.DB_USER,
-            password=config.DB_PASSWORD
-        )
+        self._pool = None
+        self._pool_lock = threading.Lock()
+        # ThreadedConnectionPool raises instead of blocking when exhausted
+        self._pool_slots = threading.BoundedSemaphore(config.DB_POOL_MAX_CONNECTIONS)
+        # Buckets are only created and reassigned outside the server (see
+        # create_admin.py), so a change is seen once its cached decision
+        # expires: after OWNERSHIP_CACHE_TTL for a grant, sooner for a denial.
+        self._ownership_cache = TTLCache(config.AUTH_CACHE_SIZE, config.OWNERSHIP_CACHE_TTL)
+
+    def _get_pool(self) -> ThreadedConnectionPool:
+        with self._pool_lock:
+            if self._pool is None:
+                self._pool = ThreadedConnectionPool(
+                    config.DB_POOL_MIN_CONNECTIONS,
+                    config.DB_POOL_MAX_CONNECTIONS,
+                    host=config.DB_HOST,
+                    port=config.DB_PORT,
+                    database=config.DB_NAME,
+                    user=config.DB_USER,
+                    password=config.DB_PASSWORD
+                )
+            return self._pool
+
+    @contextmanager
+    def _connection(self):
+        pool = self._get_pool()
+        with self._pool_slots:
+            conn = pool.getconn()
+            try:
+                yield conn
+                conn.commit()
+            except Exception:
+                if not conn.closed:
+                    conn.rollback()
+                raise
+            finally:
+                pool.putconn(conn, close=bool(conn.closed))
 
     def authenticate_user(self, username: str, password: str) -> Optional[Dict]:
-        with self.conn.cursor(cursor_factory=RealDictCursor) as cur:
+        with self._connection() as conn, conn.cursor(cursor_factory=RealDictCursor) as cur:
             cur.execute("SELECT * FROM users WHERE username = %s", (username,))
             user = cur.fetchone()
             
-            if user and bcrypt.checkpw(password.encode('utf-8'), user['password_hash'].encode('utf-8')):
-                return {"user_id": user['id'], "role": user['role']}
+        if user and bcrypt.checkpw(password.encode('utf-8'), user['password_hash'].encode('utf-8')):
+            return {"user_id": user['id'], "role": user['role']}
         return None
 
     def create_user(self, username: str, password: str, email: str, role: str = 'user') -> bool:
         hashed_password = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
         try:
-            with self.conn.cursor() as cur:
+            with self._connection() as conn, conn.cursor() as cur:
                 cur.execute(
                     "INSERT INTO users (username, password_hash, email, role) VALUES (%s, %s, %s, %s)",
                     (username, hashed_password, email, role)
                 )
-                self.conn.commit()
             return True
         except psycopg2.Error:
-            self.conn.rollback()
             return False
 
     def get_user_buckets(self, user_id: int) -> List[Dict]:
-        with self.conn.cursor(cursor_factory=RealDictCursor) as cur:
+        with self._connection() as conn, conn.cursor(cursor_factory=RealDictCursor) as cur:
             cur.execute("""
                 SELECT id, name
                 FROM buckets
@@ -47,15 +79,28 @@ class UserManager:
             return cur.fetchall()
 
     def check_bucket_ownership(self, user_id: int, bucket_name: str) -> bool:
-        with self.conn.cursor(cursor_factory=RealDictCursor) as cur:
+        key = (user_id, bucket_name)
+        owned = self._ownership_cache.get(key)
+        if owned is not None:
+            return owned
+
+        with self._connection() as conn, conn.cursor(cursor_factory=RealDictCursor) as cur:
             cur.execute("""
                 SELECT id
                 FROM buckets
                 WHERE name = %s AND owner_id = %s
             """, (bucket_name, user_id))
-            return cur.fetchone() is not None
+            owned = cur.fetchone() is not None
+        self._ownership_cache.set(key, owned, ttl=None if owned else config.OWNERSHIP_CACHE_NEGATIVE_TTL)
+        return owned
+
+    def close(self):
+        with self._pool_lock:
+            if self._pool is not None:
+                self._pool.closeall()
+                self._pool = None
 
     def __del__(self):
-        self.conn.close()
+        self.close()
 
 user_manager = UserManager()
\ No newline at end of file
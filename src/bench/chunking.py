@@ -0,0 +1,61 @@
+# Compares fixed-size and content-defined chunking on a series of edited
+# versions of the same object. Run from src/: python -m bench.chunking
+import argparse
+import os
+import random
+import time
+from storage.block_index import block_digest
+from storage.block_storage import BlockStorage
+from storage.chunker import ContentDefinedChunker, FixedSizeChunker
+from config import config
+
+def make_versions(size: int, count: int, edits: int, seed: int):
+    rng = random.Random(seed)
+    data = bytearray(os.urandom(size))
+    versions = [bytes(data)]
+    for _ in range(count - 1):
+        for _ in range(edits):
+            position = rng.randrange(len(data))
+            if rng.random() < 0.5:
+                data[position:position] = os.urandom(rng.randint(1, 64))
+            else:
+                del data[position:position + rng.randint(1, 64)]
+        versions.append(bytes(data))
+    return versions
+
+def run(name: str, chunker, versions, message_size: int):
+    seen = set()
+    total = unique = blocks = 0
+    elapsed = 0.0
+    for data in versions:
+        messages = [data[i:i + message_size] for i in range(0, len(data), message_size)]
+        started = time.perf_counter()
+        chunks = list(chunker.split(messages))
+        elapsed += time.perf_counter() - started
+        for chunk in chunks:
+            digest = block_digest(chunk)
+            if digest not in seen:
+                seen.add(digest)
+                unique += len(chunk)
+        total += len(data)
+        blocks += len(chunks)
+    print(f"{name:>6}: {total / elapsed / 2**20:8.1f} MB/s  "
+          f"dedup ratio {total / unique:6.2f}  "
+          f"avg block {total / blocks:8.0f} B")
+
+def main():
+    parser = argparse.ArgumentParser(description="Fixed-size vs content-defined chunking benchmark")
+    parser.add_argument('--size-mb', type=int, default=16)
+    parser.add_argument('--versions', type=int, default=5)
+    parser.add_argument('--edits', type=int, default=20, help="random inserts/deletes between versions")
+    parser.add_argument('--message-kb', type=int, default=1024, help="upload message size fed to the chunker")
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    versions = make_versions(args.size_mb * 2**20, args.versions, args.edits, args.seed)
+    message_size = args.message_kb * 1024
+    run('fixed', FixedSizeChunker(BlockStorage.BLOCK_SIZE), versions, message_size)
+    run('cdc', ContentDefinedChunker(config.CDC_MIN_SIZE, config.CDC_AVG_SIZE, config.CDC_MAX_SIZE), versions, message_size)
+
+if __name__ == '__main__':
+    main()
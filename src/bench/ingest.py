@@ -0,0 +1,88 @@
+# Upload ingest cost: the multi-pass path (whole-object gzip, md5 over the
+# result, blocks sliced out as copies and staged into a write buffer) against
+# the single-pass IngestPipeline, compressing per block, feeding a gather
+# write. Disk I/O is left out so only hashing, compression and copying are
+# measured. "Copied" counts the block bytes held in buffers of their own rather
+# than as views into the uploaded chunks; compressed output is not a copy.
+# Run from src/: python -m bench.ingest
+import argparse
+import os
+import time
+import tracemalloc
+from storage.block_index import block_digest
+from storage.block_storage import BlockStorage
+from storage.chunker import FixedSizeChunker
+from storage.codecs import BlockCompressor, get_codec
+from storage.ingest import IngestPipeline
+from utils.file_utils import calculate_md5, compress_data
+
+def ingest_multi_pass(chunks, codec: str, block_size: int) -> int:
+    data = b''.join(chunks)
+    copied = len(data) if len(chunks) > 1 else 0
+    if codec != 'none':
+        data = compress_data(data)
+    calculate_md5(data)
+    staging = bytearray()
+    for offset in range(0, len(data), block_size):
+        block = data[offset:offset + block_size]
+        block_digest(block)
+        staging += block
+        copied += 2 * len(block)
+        if len(staging) >= 1024 * 1024:
+            bytes(staging)
+            copied += len(staging)
+            staging.clear()
+    return copied
+
+def ingest_single_pass(chunks, codec: str, block_size: int) -> int:
+    pipeline = IngestPipeline(FixedSizeChunker(block_size))
+    codec = get_codec(codec)
+    compressor = BlockCompressor(codec, 0.1) if codec else None
+    copied = 0
+    gathered = []
+    gathered_size = 0
+    for block in pipeline.blocks(chunks):
+        block_digest(block)
+        if not isinstance(block, memoryview):
+            copied += len(block)
+        if compressor is not None:
+            block, _ = compressor.compress(block)
+        gathered.append(block)
+        gathered_size += len(block)
+        if gathered_size >= 1024 * 1024:
+            gathered.clear()
+            gathered_size = 0
+    pipeline.md5.hexdigest()
+    return copied
+
+def measure(function, chunks, codec: str, block_size: int):
+    tracemalloc.start()
+    started = time.perf_counter()
+    copied = function(chunks, codec, block_size)
+    elapsed = time.perf_counter() - started
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return elapsed, copied, peak
+
+def main():
+    parser = argparse.ArgumentParser(description="Upload ingest benchmark")
+    parser.add_argument('--size-mb', type=int, default=64)
+    parser.add_argument('--chunk-size', type=int, default=1024 * 1024, help="size of the uploaded chunks")
+    parser.add_argument('--block-size', type=int, default=BlockStorage.BLOCK_SIZE)
+    parser.add_argument('--codec', default='auto', help="block codec of the single-pass path")
+    args = parser.parse_args()
+
+    size = args.size_mb * 1024 * 1024
+    # Half random, half zeros, so compression has something to do
+    data = os.urandom(size // 2) + bytes(size - size // 2)
+    chunks = [data[i:i + args.chunk_size] for i in range(0, size, args.chunk_size)]
+
+    for codec in ('none', args.codec):
+        for name, function in (('multi-pass', ingest_multi_pass), ('single-pass', ingest_single_pass)):
+            elapsed, copied, peak = measure(function, chunks, codec, args.block_size)
+            label = codec if name == 'single-pass' or codec == 'none' else 'gzip'
+            print(f"{label:>7} {name:>11}: {args.size_mb / elapsed:8.1f} MB/s  "
+                  f"copied {copied / size:5.2f} x object  peak {peak / (1024 * 1024):8.1f} MB")
+
+if __name__ == '__main__':
+    main()
\ No newline at end of file
@@ -0,0 +1,23 @@
+# In-memory stand-in for auth.user_manager, so benchmarks run the gRPC service
+# without Postgres. Every login succeeds as one user who owns every bucket;
+# tokens are still issued and verified by the real JWT code.
+import threading
+from typing import Dict, List, Optional
+
+class LocalUserManager:
+    def __init__(self, user_id: int = 1, role: str = 'user'):
+        self.user = {'user_id': user_id, 'role': role}
+        self._buckets: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def authenticate_user(self, username: str, password: str) -> Optional[Dict]:
+        return dict(self.user)
+
+    def get_user_buckets(self, user_id: int) -> List[Dict]:
+        with self._lock:
+            return [{'id': bucket_id, 'name': name} for name, bucket_id in self._buckets.items()]
+
+    def check_bucket_ownership(self, user_id: int, bucket_name: str) -> bool:
+        with self._lock:
+            self._buckets.setdefault(bucket_name, len(self._buckets) + 1)
+        return True
\ No newline at end of file
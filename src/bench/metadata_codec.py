@@ -0,0 +1,62 @@
+# Encode/decode and listing throughput of the binary metadata codec against
+# the JSON records it replaced. Run from src/: python -m bench.metadata_codec
+import argparse
+import json
+import os
+import time
+from datetime import datetime
+from storage.metadata_codec import decode_metadata, encode_metadata
+from storage.models import ObjectMetadata
+
+def encode_json(metadata: ObjectMetadata) -> bytes:
+    metadata_dict = metadata.__dict__.copy()
+    metadata_dict['created_at'] = metadata_dict['created_at'].isoformat()
+    metadata_dict['modified_at'] = metadata_dict['modified_at'].isoformat()
+    return json.dumps(metadata_dict).encode()
+
+def make_metadata(index: int, block_count: int, legacy_ids: bool) -> ObjectMetadata:
+    if legacy_ids:
+        block_ids = [int.from_bytes(os.urandom(4), 'big') for _ in range(block_count)]
+    else:
+        block_ids = [os.urandom(16).hex() for _ in range(block_count)]
+    return ObjectMetadata(
+        object_key=f"photos/2024/{index:08d}.jpg",
+        bucket_name="bench",
+        size=block_count * 4096,
+        md5_hash=os.urandom(16).hex(),
+        mime_type="application/octet-stream",
+        created_at=datetime.now(),
+        modified_at=datetime.now(),
+        owner_id="1",
+        acl={"owner": "FULL_CONTROL"},
+        block_ids=block_ids
+    )
+
+def measure(function, items, repeat: int) -> float:
+    started = time.perf_counter()
+    for _ in range(repeat):
+        for item in items:
+            function(item)
+    return (time.perf_counter() - started) / (repeat * len(items))
+
+def main():
+    parser = argparse.ArgumentParser(description="Metadata codec microbenchmark")
+    parser.add_argument('--objects', type=int, default=2000, help="records per listing")
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    for block_count, legacy_ids in ((1, False), (256, False), (262144, False), (256, True)):
+        count = args.objects if block_count < 100000 else 2
+        records = [make_metadata(i, block_count, legacy_ids) for i in range(count)]
+        label = f"{block_count} {'legacy ids' if legacy_ids else 'digests'}"
+        for name, encode in (('json', encode_json), ('binary', encode_metadata)):
+            encoded = [encode(record) for record in records]
+            encode_time = measure(encode, records, args.repeat)
+            decode_time = measure(decode_metadata, encoded, args.repeat)
+            size = sum(map(len, encoded)) / len(encoded)
+            print(f"{label:>20} {name:>6}: {size:12.0f} B/record  "
+                  f"encode {encode_time * 1e6:10.1f} us  decode {decode_time * 1e6:10.1f} us  "
+                  f"list {1 / decode_time:10.0f} records/s")
+
+if __name__ == '__main__':
+    main()
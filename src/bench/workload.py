@@ -0,0 +1,410 @@
+# Reproducible load against ObjectStorage directly (--target storage) or the
+# gRPC service end to end (--target grpc, served in-process on a local port
+# with bench.local_auth standing in for Postgres). Data lives in a temporary
+# directory. Object sizes, the get/put/delete mix, Zipfian key popularity and
+# concurrency are configurable, and a run is determined by --seed: each
+# client thread draws its operations from its own seeded generator. Results
+# are printed as JSON, with the commit they were measured on, so runs can be
+# compared across commits. Run from src/: python -m bench.workload --help
+import argparse
+import ast
+import asyncio
+import bisect
+import itertools
+import json
+import math
+import os
+import random
+import shutil
+import socket
+import subprocess
+import tempfile
+import threading
+import time
+from concurrent import futures
+from typing import Dict, List, Optional
+from config import config
+
+OPERATIONS = ('get', 'put', 'delete')
+SIZE_UNITS = {'k': 1024, 'm': 1024 * 1024, 'g': 1024 * 1024 * 1024}
+
+def parse_size(value: str) -> int:
+    value = value.strip().lower()
+    if value and value[-1] in SIZE_UNITS:
+        return int(float(value[:-1]) * SIZE_UNITS[value[-1]])
+    return int(value)
+
+class SizeDistribution:
+    # fixed:SIZE, uniform:MIN:MAX or lognormal:MEDIAN:SIGMA[:MAX]
+    def __init__(self, spec: str):
+        kind, *params = spec.split(':')
+        self.kind = kind
+        if kind == 'fixed' and len(params) == 1:
+            self.size = parse_size(params[0])
+            self.max_size = self.size
+        elif kind == 'uniform' and len(params) == 2:
+            self.low, self.high = parse_size(params[0]), parse_size(params[1])
+            self.max_size = self.high
+        elif kind == 'lognormal' and len(params) in (2, 3):
+            self.mu = math.log(parse_size(params[0]))
+            self.sigma = float(params[1])
+            self.max_size = parse_size(params[2]) if len(params) == 3 else 64 * 1024 * 1024
+        else:
+            raise ValueError(f"Invalid size distribution '{spec}'")
+
+    def sample(self, rng: random.Random) -> int:
+        if self.kind == 'fixed':
+            return self.size
+        if self.kind == 'uniform':
+            return rng.randint(self.low, self.high)
+        return max(1, min(self.max_size, int(rng.lognormvariate(self.mu, self.sigma))))
+
+class ZipfKeys:
+    # Key ranks follow a Zipf distribution with exponent s (0 is uniform);
+    # ranks are shuffled onto key names so popular keys are not neighbours.
+    def __init__(self, count: int, s: float, seed: int):
+        self._cumulative = list(itertools.accumulate(1 / (rank + 1) ** s for rank in range(count)))
+        self.names = [f"obj-{index:08d}" for index in range(count)]
+        random.Random(seed).shuffle(self.names)
+
+    def sample(self, rng: random.Random) -> str:
+        rank = bisect.bisect_left(self._cumulative, rng.random() * self._cumulative[-1])
+        return self.names[min(rank, len(self.names) - 1)]
+
+class Payloads:
+    # Object data is cut from one seeded random pool at random offsets, so
+    # objects are distinct but generating them costs nothing during a run.
+    def __init__(self, max_size: int, seed: int):
+        self._pool = random.Random(seed).randbytes(max_size + 1024 * 1024)
+
+    def get(self, size: int, rng: random.Random) -> memoryview:
+        offset = rng.randrange(len(self._pool) - size + 1)
+        return memoryview(self._pool)[offset:offset + size]
+
+class StorageClient:
+    def __init__(self, storage, args):
+        self.storage = storage
+        self.args = args
+
+    def put(self, key: str, data: memoryview):
+        self.storage.upload_stream(self.args.bucket, key, [data], "1", self.args.compress, self.args.codec)
+
+    def get(self, key: str) -> Optional[int]:
+        try:
+            return len(self.storage.get_object(self.args.bucket, key).data)
+        except FileNotFoundError:
+            return None
+
+    def delete(self, key: str) -> bool:
+        try:
+            self.storage.delete_object(self.args.bucket, key)
+            return True
+        except FileNotFoundError:
+            return False
+
+    def close(self):
+        pass
+
+class GrpcClient:
+    # One channel per client thread; large objects go through the streaming RPCs
+    def __init__(self, address: str, args):
+        import grpc
+        import object_storage_pb2
+        import object_storage_pb2_grpc
+        self.grpc, self.pb = grpc, object_storage_pb2
+        self.args = args
+        self.channel = grpc.insecure_channel(address, options=[
+            ('grpc.max_send_message_length', config.GRPC_MAX_MESSAGE_LENGTH),
+            ('grpc.max_receive_message_length', config.GRPC_MAX_MESSAGE_LENGTH),
+        ])
+        self.stub = object_storage_pb2_grpc.ObjectStorageServiceStub(self.channel)
+        self.token = self.stub.Authenticate(self.pb.AuthenticationRequest(username="bench", password="bench")).token
+        self.stream_threshold = config.GRPC_MAX_MESSAGE_LENGTH // 2
+
+    def put(self, key: str, data: memoryview):
+        if len(data) < self.stream_threshold:
+            self.stub.UploadObject(self.pb.UploadObjectRequest(
+                token=self.token, bucket_name=self.args.bucket, object_key=key, data=bytes(data),
+                compress=self.args.compress, codec=self.args.codec
+            ))
+            return
+        chunk_size = config.STREAM_CHUNK_SIZE
+
+        def chunks():
+            yield self.pb.UploadObjectChunk(
+                token=self.token, bucket_name=self.args.bucket, object_key=key,
+                compress=self.args.compress, codec=self.args.codec, data=bytes(data[:chunk_size])
+            )
+            for offset in range(chunk_size, len(data), chunk_size):
+                yield self.pb.UploadObjectChunk(data=bytes(data[offset:offset + chunk_size]))
+        self.stub.UploadObjectStream(chunks())
+
+    def get(self, key: str) -> Optional[int]:
+        request = self.pb.GetObjectRequest(token=self.token, bucket_name=self.args.bucket, object_key=key)
+        try:
+            return sum(len(chunk.data) for chunk in self.stub.GetObjectStream(request))
+        except self.grpc.RpcError as e:
+            if e.code() == self.grpc.StatusCode.NOT_FOUND:
+                return None
+            raise
+
+    def delete(self, key: str) -> bool:
+        request = self.pb.DeleteObjectRequest(token=self.token, bucket_name=self.args.bucket, object_key=key)
+        try:
+            self.stub.DeleteObject(request)
+            return True
+        except self.grpc.RpcError as e:
+            if e.code() == self.grpc.StatusCode.NOT_FOUND:
+                return False
+            raise
+
+    def close(self):
+        self.channel.close()
+
+class Recorder:
+    def __init__(self):
+        self.latencies: Dict[str, List[int]] = {operation: [] for operation in OPERATIONS}
+        self.bytes = dict.fromkeys(OPERATIONS, 0)
+        self.misses = dict.fromkeys(OPERATIONS, 0)
+        self.errors = dict.fromkeys(OPERATIONS, 0)
+
+    def merge(self, other: 'Recorder'):
+        for operation in OPERATIONS:
+            self.latencies[operation].extend(other.latencies[operation])
+            self.bytes[operation] += other.bytes[operation]
+            self.misses[operation] += other.misses[operation]
+            self.errors[operation] += other.errors[operation]
+
+def percentile(ordered: List[int], fraction: float) -> float:
+    index = min(len(ordered) - 1, max(0, math.ceil(fraction * len(ordered)) - 1))
+    return ordered[index] / 1e6
+
+def summarize(recorder: Recorder, elapsed: float) -> Dict:
+    operations = {}
+    for operation in OPERATIONS:
+        latencies = sorted(recorder.latencies[operation])
+        if not latencies:
+            continue
+        operations[operation] = {
+            'count': len(latencies),
+            'ops_per_second': round(len(latencies) / elapsed, 1),
+            'mb_per_second': round(recorder.bytes[operation] / elapsed / (1024 * 1024), 2),
+            'misses': recorder.misses[operation],
+            'errors': recorder.errors[operation],
+            'latency_ms': {
+                'mean': round(sum(latencies) / len(latencies) / 1e6, 3),
+                **{name: round(percentile(latencies, fraction), 3) for name, fraction in
+                   (('p50', 0.5), ('p90', 0.9), ('p99', 0.99), ('p999', 0.999))},
+                'max': round(latencies[-1] / 1e6, 3),
+            },
+        }
+    total = sum(len(latencies) for latencies in recorder.latencies.values())
+    return {
+        'elapsed_seconds': round(elapsed, 3),
+        'ops_per_second': round(total / elapsed, 1),
+        'mb_per_second': round(sum(recorder.bytes.values()) / elapsed / (1024 * 1024), 2),
+        'operations': operations,
+    }
+
+def run_client(client, thread_index: int, operation_count: int, args, keys: ZipfKeys, sizes: SizeDistribution,
+               payloads: Payloads, deadline: Optional[float]) -> Recorder:
+    rng = random.Random(args.seed * 1000003 + thread_index)
+    recorder = Recorder()
+    for _ in range(operation_count):
+        if deadline is not None and time.monotonic() >= deadline:
+            break
+        draw = rng.random()
+        operation = 'get' if draw < args.read_ratio else 'delete' if draw < args.read_ratio + args.delete_ratio else 'put'
+        key = keys.sample(rng)
+        data = payloads.get(sizes.sample(rng), rng) if operation == 'put' else None
+        started = time.perf_counter_ns()
+        try:
+            if operation == 'put':
+                client.put(key, data)
+                recorder.bytes['put'] += len(data)
+            elif operation == 'get':
+                size = client.get(key)
+                if size is None:
+                    recorder.misses['get'] += 1
+                else:
+                    recorder.bytes['get'] += size
+            elif not client.delete(key):
+                recorder.misses['delete'] += 1
+        except Exception:
+            recorder.errors[operation] += 1
+        recorder.latencies[operation].append(time.perf_counter_ns() - started)
+    return recorder
+
+def run_phase(clients, operation_counts: List[int], args, keys, sizes, payloads, duration: float = 0) -> Dict:
+    deadline = time.monotonic() + duration if duration else None
+    recorder = Recorder()
+    started = time.perf_counter()
+    with futures.ThreadPoolExecutor(max_workers=len(clients)) as pool:
+        results = [
+            pool.submit(run_client, client, index, count, args, keys, sizes, payloads, deadline)
+            for index, (client, count) in enumerate(zip(clients, operation_counts))
+        ]
+        for result in results:
+            recorder.merge(result.result())
+    return summarize(recorder, time.perf_counter() - started)
+
+def preload(clients, args, keys: ZipfKeys, sizes: SizeDistribution, payloads: Payloads) -> Dict:
+    # Writes every key once, split across the clients, so reads find data
+    started = time.perf_counter()
+    recorder = Recorder()
+
+    def load(thread_index: int):
+        rng = random.Random(args.seed * 7919 + thread_index)
+        for key in keys.names[thread_index::len(clients)]:
+            data = payloads.get(sizes.sample(rng), rng)
+            begin = time.perf_counter_ns()
+            clients[thread_index].put(key, data)
+            recorder.latencies['put'].append(time.perf_counter_ns() - begin)
+            recorder.bytes['put'] += len(data)
+
+    with futures.ThreadPoolExecutor(max_workers=len(clients)) as pool:
+        for result in [pool.submit(load, index) for index in range(len(clients))]:
+            result.result()
+    return summarize(recorder, time.perf_counter() - started)
+
+def git_commit() -> Optional[str]:
+    try:
+        result = subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)), timeout=10
+        )
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return result.stdout.strip() or None
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+class InProcessServer:
+    # The gRPC service on a free local port, in the mode the server would use
+    def __init__(self, storage, mode: str):
+        import grps_server
+        from bench.local_auth import LocalUserManager
+        config.GRPC_SERVER_PORT = free_port()
+        self.address = f"127.0.0.1:{config.GRPC_SERVER_PORT}"
+        self.mode = mode
+        users = LocalUserManager()
+        if mode == 'aio':
+            self._storage_executor = futures.ThreadPoolExecutor(config.AIO_STORAGE_WORKERS, thread_name_prefix="grpc-storage")
+            self._auth_executor = futures.ThreadPoolExecutor(config.AIO_AUTH_WORKERS, thread_name_prefix="grpc-auth")
+            self._loop = asyncio.new_event_loop()
+            self._started = threading.Event()
+            self._thread = threading.Thread(target=self._run_aio, args=(grps_server, storage, users), daemon=True)
+            self._thread.start()
+            self._started.wait()
+        else:
+            self._server = grps_server.create_sync_server(storage, grps_server.SERVER_OPTIONS, users)
+            self._server.start()
+
+    def _run_aio(self, grps_server, storage, users):
+        asyncio.set_event_loop(self._loop)
+        self._server = grps_server.create_aio_server(
+            storage, grps_server.SERVER_OPTIONS, self._storage_executor, self._auth_executor, users
+        )
+        self._loop.run_until_complete(self._server.start())
+        self._started.set()
+        self._loop.run_forever()
+
+    def stop(self):
+        if self.mode == 'aio':
+            asyncio.run_coroutine_threadsafe(self._server.stop(None), self._loop).result()
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join()
+            self._storage_executor.shutdown()
+            self._auth_executor.shutdown()
+        else:
+            self._server.stop(None)
+
+def main():
+    parser = argparse.ArgumentParser(description="Storage engine workload benchmark")
+    parser.add_argument('--target', choices=('storage', 'grpc'), default='storage')
+    parser.add_argument('--server-mode', choices=('sync', 'aio'), default=config.GRPC_SERVER_MODE, help="with --target grpc")
+    parser.add_argument('--keys', type=int, default=1000, help="distinct object keys")
+    parser.add_argument('--operations', type=int, default=10000, help="operations in the measured phase")
+    parser.add_argument('--duration', type=float, default=0, help="stop the measured phase after this many seconds")
+    parser.add_argument('--concurrency', type=int, default=8, help="client threads")
+    parser.add_argument('--object-size', default='lognormal:16k:1.5:4m',
+                        help="fixed:SIZE, uniform:MIN:MAX or lognormal:MEDIAN:SIGMA[:MAX], sizes like 4k or 1m")
+    parser.add_argument('--read-ratio', type=float, default=0.8)
+    parser.add_argument('--delete-ratio', type=float, default=0.0, help="the rest of the operations are puts")
+    parser.add_argument('--zipf', type=float, default=0.99, help="key popularity exponent; 0 for uniform")
+    parser.add_argument('--no-preload', dest='preload', action='store_false', help="start from an empty store")
+    parser.add_argument('--compress', action='store_true')
+    parser.add_argument('--codec', default="", help="block codec for puts")
+    parser.add_argument('--bucket', default='bench')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--dir', default=None, help="parent of the temporary data directory")
+    parser.add_argument('--output', default=None, help="also write the JSON report to this file")
+    parser.add_argument('--config', action='append', default=[], metavar='NAME=VALUE',
+                        help="override a config setting, e.g. METADATA_DURABILITY='sync'; repeatable")
+    args = parser.parse_args()
+    if args.read_ratio + args.delete_ratio > 1:
+        parser.error("--read-ratio and --delete-ratio add up to more than 1")
+    try:
+        sizes = SizeDistribution(args.object_size)
+    except ValueError as e:
+        parser.error(str(e))
+    for override in args.config:
+        name, _, value = override.partition('=')
+        if not hasattr(config, name):
+            parser.error(f"Unknown config setting: {name}")
+        try:
+            setattr(config, name, ast.literal_eval(value))
+        except (ValueError, SyntaxError):
+            parser.error(f"Invalid value for {name}: {value}")
+
+    scratch = tempfile.mkdtemp(prefix="objdir-bench-", dir=args.dir)
+    config.ROCKSDB_PATH = os.path.join(scratch, 'rocksdb')
+    config.BLOCK_STORAGE_PATH = os.path.join(scratch, 'blocks')
+    config.BLOOM_FILTER_PATH = os.path.join(scratch, 'bloom_filter.bin')
+    config.LOG_FILE = os.path.join(scratch, 'server.log')
+    from storage.object_storage import ObjectStorage
+
+    storage = ObjectStorage()
+    server = None
+    clients = []
+    try:
+        if args.target == 'grpc':
+            server = InProcessServer(storage, args.server_mode)
+            clients = [GrpcClient(server.address, args) for _ in range(args.concurrency)]
+        else:
+            clients = [StorageClient(storage, args) for _ in range(args.concurrency)]
+
+        keys = ZipfKeys(args.keys, args.zipf, args.seed)
+        payloads = Payloads(sizes.max_size, args.seed)
+        report = {
+            'commit': git_commit(),
+            'target': args.target if args.target == 'storage' else f"grpc-{args.server_mode}",
+            'workload': {key: value for key, value in vars(args).items() if key not in ('dir', 'output')},
+        }
+        if args.preload:
+            report['preload'] = preload(clients, args, keys, sizes, payloads)
+        counts = [args.operations // args.concurrency + (index < args.operations % args.concurrency)
+                  for index in range(args.concurrency)]
+        if args.duration:
+            counts = [2 ** 62] * args.concurrency
+        report['run'] = run_phase(clients, counts, args, keys, sizes, payloads, args.duration)
+        report['caches'] = storage.cache_stats()
+    finally:
+        for client in clients:
+            client.close()
+        if server is not None:
+            server.stop()
+        storage.close()
+        shutil.rmtree(scratch, ignore_errors=True)
+
+    output = json.dumps(report, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + "\n")
+
+if __name__ == '__main__':
+    main()
\ No newline at end of file
@@ -9,22 +9,109 @@ class Config:
     DB_NAME = 'ObjectDirectory'
     DB_USER = 'postgres'
     DB_PASSWORD = 'ooo196911'
+    DB_POOL_MIN_CONNECTIONS = 1
+    DB_POOL_MAX_CONNECTIONS = 10  # one per gRPC worker thread
     
     # RocksDB
     ROCKSDB_PATH = os.path.join(BASE_DIR, 'data', 'rocksdb')
+    # Block cache size, with bloom filters for point lookups; 0 for the RocksDB defaults
+    ROCKSDB_BLOCK_CACHE_MB = 256
+    # Passed to rocksdbpy's Option.set_<name>
+    ROCKSDB_OPTIONS = {
+        'write_buffer_size': 64 * 1024 * 1024,
+        'max_write_buffer_number': 4,
+        'max_background_jobs': 4,
+        'max_open_files': -1,  # keep table indexes and filters loaded
+        'target_file_size_base': 64 * 1024 * 1024,
+        'bytes_per_sync': 1024 * 1024,
+        'compaction_style': 'level',
+    }
+
+    # Block dedup Bloom filter
+    BLOOM_FILTER_PATH = os.path.join(BASE_DIR, 'data', 'bloom_filter.bin')
+    BLOOM_FILTER_CAPACITY = 10_000_000
+    BLOOM_FILTER_ERROR_RATE = 0.01
     
     # Object Storage
     OBJECT_STORAGE_PATH = os.path.join(BASE_DIR, 'data', 'objects')
+    STREAM_CHUNK_SIZE = 1024 * 1024  # 1 MB per GetObjectStream message
+    LIST_MAX_KEYS = 1000  # default and upper bound for a ListObjects page
+    BATCH_MAX_OBJECTS = 1000  # objects per batch get, upload or delete
+    BATCH_MAX_OBJECT_SIZE = 8 * 1024 * 1024  # larger objects are left out of batch gets
+    # Per-process read caches (0 disables)
+    METADATA_CACHE_BYTES = 64 * 1024 * 1024
+    OBJECT_CACHE_BYTES = 256 * 1024 * 1024
+    OBJECT_CACHE_MAX_OBJECT_SIZE = 1024 * 1024  # larger objects are never cached
     
     # JWT
     JWT_SECRET_KEY = "your-secret-key"  # В реальном приложении используйте безопасный способ хранения ключа
     JWT_ALGORITHM = "HS256"
+
+    # Auth caches: verified tokens and bucket ownership decisions
+    AUTH_CACHE_SIZE = 100_000
+    TOKEN_CACHE_TTL = 300  # never beyond the token's own expiry
+    OWNERSHIP_CACHE_TTL = 60
+    OWNERSHIP_CACHE_NEGATIVE_TTL = 5  # denials are re-checked sooner
     BLOCK_STORAGE_PATH = os.path.join(BASE_DIR, 'data', 'blocks')
+    SEGMENT_SIZE = 256 * 1024 * 1024  # roll over to a new segment file after 256 MB
+    SEGMENT_COMPACTION_THRESHOLD = 0.5  # rewrite segments with less live data than this
+    COMPACTION_INTERVAL = 300  # seconds between background compaction passes
+    COMPACTION_MAX_BYTES_PER_SECOND = 64 * 1024 * 1024  # live data copied by compaction; 0 for no limit
+    GC_INTERVAL = 1  # seconds between steps of the block index garbage sweep
+    GC_BATCH_SIZE = 10000  # block index entries examined per step
+    BLOCK_IO_WORKERS = 16  # threads in the shared block I/O pool
+    BLOCK_IO_MAX_INFLIGHT = 4  # concurrent block operations per request
+    BLOCK_IO_BATCH_SIZE = 1024 * 1024  # largest single block read or write
+    UPLOAD_WINDOW_BYTES = 64 * 1024 * 1024  # upload data whose blocks are referenced at once, ahead of the commit
+    BLOCK_MMAP_CACHE_SIZE = 64  # segment files kept memory-mapped for reads
+
+    # Metadata writes from concurrent requests are group committed: one
+    # RocksDB write (and WAL sync) for up to METADATA_COMMIT_MAX_UPDATES
+    # updates, gathered for up to METADATA_COMMIT_LINGER seconds.
+    METADATA_COMMIT_LINGER = 0.0005
+    METADATA_COMMIT_MAX_UPDATES = 256
+    # 'sync': a write returns once the RocksDB WAL is on disk; 'async':
+    # once the OS has it, so a power loss can drop the last writes.
+    # Overridable per bucket.
+    METADATA_DURABILITY = 'async'
+    BUCKET_METADATA_DURABILITY = {}
+
+    # Chunking: 'fixed' or 'cdc' (content-defined), overridable per bucket
+    CHUNKING_MODE = 'fixed'
+    BUCKET_CHUNKING_MODES = {}
+    CDC_MIN_SIZE = 2 * 1024
+    CDC_AVG_SIZE = 8 * 1024
+    CDC_MAX_SIZE = 64 * 1024
+
+    # Block compression: 'none', 'auto' (fastest available), 'zlib-1/6/9',
+    # 'zstd-1/3/9' with zstandard installed, 'lz4' with lz4 installed
+    DEFAULT_CODEC = 'auto'  # used by uploads that ask for compression without naming a codec
+    COMPRESSION_MIN_SAVINGS = 0.1  # blocks that shrink by less are stored uncompressed
     
     # Server
     GRPC_SERVER_PORT = 23009
-    MAX_WORKERS = 3
+    GRPC_SERVER_MODE = 'sync'  # 'sync': a thread per in-flight RPC, 'aio': asyncio with worker pools
+    GRPC_MAX_MESSAGE_LENGTH = 50 * 1024 * 1024  # 50 MB
+    MAX_WORKERS = 10  # sync mode: RPC handler threads
+    AIO_STORAGE_WORKERS = 32  # aio mode: threads for RocksDB and block I/O
+    AIO_UPLOAD_BATCH_BYTES = 1024 * 1024  # aio mode: streamed upload data handed to a storage thread at once
+    AIO_AUTH_WORKERS = DB_POOL_MAX_CONNECTIONS  # aio mode: threads for Postgres and bcrypt
+    # More than one process: the launcher keeps RocksDB and serves it to the
+    # gRPC worker processes, which share the port through SO_REUSEPORT
+    GRPC_WORKER_PROCESSES = 1
+    METADATA_SERVICE_ADDRESS = os.path.join(BASE_DIR, 'data', 'metadata.sock')
     
+    # Metrics in the Prometheus text format at http://METRICS_HOST:METRICS_PORT/metrics;
+    # 0 turns them off. With several worker processes the launcher serves
+    # METRICS_PORT and worker n serves METRICS_PORT + n.
+    METRICS_HOST = '127.0.0.1'
+    METRICS_PORT = 9109
+    SLOW_CALL_THRESHOLD = 1.0  # seconds; slower RPCs are logged with their stage timings, 0 turns it off
+    # Profile RPC (admins only): a sampling profiler over the server's threads
+    PROFILE_DIR = os.path.join(BASE_DIR, 'profiles')
+    PROFILE_MAX_SECONDS = 300
+    PROFILE_SAMPLE_INTERVAL = 0.01  # seconds between samples
+
     # Logging
     LOG_FILE = os.path.join(BASE_DIR, 'server.log')
     LOG_LEVEL = 'ERROR'
@@ -3,6 +3,8 @@ import grpc
 import object_storage_pb2
 import object_storage_pb2_grpc
 
+UPLOAD_CHUNK_SIZE = 1024 * 1024  # 1 MB per streamed message
+
 class ObjectStorageClient:
     def __init__(self, address='localhost:23009'):
         self.channel = grpc.insecure_channel(
@@ -20,24 +22,51 @@ class ObjectStorageClient:
         response = self.stub.Authenticate(request)
         self.token = response.token
 
-    def upload_file(self, bucket_name, object_key, data, compress):
+    def upload_file(self, bucket_name, object_key, data, compress, codec=""):
         request = object_storage_pb2.UploadObjectRequest(
             token=self.token,
             bucket_name=bucket_name,
             object_key=object_key,
             data=data,
-            compress=compress
+            compress=compress,
+            codec=codec
         )
         return self.stub.UploadObject(request)
 
-    def get_object(self, bucket_name, object_key):
+    def upload_file_stream(self, bucket_name, object_key, file, compress, codec=""):
+        def chunks():
+            yield object_storage_pb2.UploadObjectChunk(
+                token=self.token,
+                bucket_name=bucket_name,
+                object_key=object_key,
+                compress=compress,
+                codec=codec,
+                data=file.read(UPLOAD_CHUNK_SIZE)
+            )
+            for data in iter(lambda: file.read(UPLOAD_CHUNK_SIZE), b''):
+                yield object_storage_pb2.UploadObjectChunk(data=data)
+        return self.stub.UploadObjectStream(chunks())
+
+    def get_object(self, bucket_name, object_key, range_start=0, range_length=0):
         request = object_storage_pb2.GetObjectRequest(
             token=self.token,
             bucket_name=bucket_name,
-            object_key=object_key
+            object_key=object_key,
+            range_start=range_start,
+            range_length=range_length
         )
         return self.stub.GetObject(request)
 
+    def get_object_stream(self, bucket_name, object_key, range_start=0, range_length=0):
+        request = object_storage_pb2.GetObjectRequest(
+            token=self.token,
+            bucket_name=bucket_name,
+            object_key=object_key,
+            range_start=range_start,
+            range_length=range_length
+        )
+        return self.stub.GetObjectStream(request)
+
     def get_object_by_id(self, object_id):
         request = object_storage_pb2.GetObjectByIdRequest(
             token=self.token,
@@ -45,10 +74,12 @@ class ObjectStorageClient:
         )
         return self.stub.GetObjectById(request)
 
-    def list_objects(self, bucket_name):
+    def list_objects(self, bucket_name, continuation_token=""):
         request = object_storage_pb2.ListObjectsRequest(
             token=self.token,
-            bucket_name=bucket_name
+            bucket_name=bucket_name,
+            omit_block_ids=True,
+            continuation_token=continuation_token
         )
         return self.stub.ListObjects(request)
 
@@ -64,6 +95,15 @@ class ObjectStorageClient:
         request = object_storage_pb2.ListUserBucketsRequest(token=self.token)
         return self.stub.ListUserBuckets(request)
 
+    def profile(self, duration_seconds, sample_interval_seconds=0, include_idle=False):
+        request = object_storage_pb2.ProfileRequest(
+            token=self.token,
+            duration_seconds=duration_seconds,
+            sample_interval_seconds=sample_interval_seconds,
+            include_idle=include_idle
+        )
+        return self.stub.Profile(request)
+
 def print_menu():
     print("\n=== Object Storage Console ===")
     print("1. Authenticate")
@@ -73,7 +113,8 @@ def print_menu():
     print("5. List files")
     print("6. Delete file")
     print("7. List user buckets")
-    print("8. Exit")
+    print("8. Profile server (admin)")
+    print("9. Exit")
     print("============================")
 
 def authenticate(client):
@@ -90,6 +131,7 @@ def upload_file(client):
     file_path = input("Enter file path: ")
     object_key = input("Enter object key: ")
     compress = input("Compress file? (y/n): ").lower() == 'y'
+    codec = input("Codec (blank for the server default): ").strip() if compress else ""
 
     if not os.path.exists(file_path):
         print("File not found.")
@@ -97,9 +139,7 @@ def upload_file(client):
 
     try:
         with open(file_path, "rb") as file:
-            data = file.read()
-        
-        response = client.upload_file(bucket_name, object_key, data, compress)
+            response = client.upload_file_stream(bucket_name, object_key, file, compress, codec)
         print(f"File uploaded successfully. Message: {response.message}")
     except grpc.RpcError as e:
         print(f"Error uploading file: {e.details()}")
@@ -110,9 +150,9 @@ def download_file(client):
     save_path = input("Enter save path: ")
 
     try:
-        response = client.get_object(bucket_name, object_key)
         with open(save_path, "wb") as file:
-            file.write(response.data)
+            for chunk in client.get_object_stream(bucket_name, object_key):
+                file.write(chunk.data)
         print(f"File downloaded successfully to {save_path}")
     except grpc.RpcError as e:
         print(f"Error downloading file: {e.details()}")
@@ -138,8 +178,12 @@ def list_files(client):
             print(f"No objects found in bucket '{bucket_name}'")
         else:
             print(f"\nObjects in bucket '{bucket_name}':")
-            for obj in response.objects:
-                print(f"- {obj.object_key} (Size: {obj.size} bytes, Created: {obj.created_at})")
+            while True:
+                for obj in response.objects:
+                    print(f"- {obj.object_key} (Size: {obj.size} bytes, Created: {obj.created_at})")
+                if not response.is_truncated:
+                    break
+                response = client.list_objects(bucket_name, response.next_continuation_token)
     except grpc.RpcError as e:
         print(f"Error listing files: {e.details()}")
 
@@ -165,6 +209,19 @@ def list_user_buckets(client):
     except grpc.RpcError as e:
         print(f"Error listing user buckets: {e.details()}")
 
+def profile_server(client):
+    duration = float(input("Enter profile duration in seconds: "))
+    include_idle = input("Include idle threads? (y/n): ").lower() == 'y'
+    output_path = input("Enter path to save the collapsed stacks: ")
+    try:
+        print(f"Profiling for {duration} seconds...")
+        response = client.profile(duration, include_idle=include_idle)
+        with open(output_path, 'w') as f:
+            f.write(response.collapsed_stacks)
+        print(f"{response.samples} samples saved to {output_path} (server copy: {response.path})")
+    except grpc.RpcError as e:
+        print(f"Error profiling server: {e.details()}")
+
 def main():
     client = ObjectStorageClient()
 
@@ -205,6 +262,11 @@ def main():
             else:
                 list_user_buckets(client)
         elif choice == '8':
+            if not client.token:
+                print("Please authenticate first")
+            else:
+                profile_server(client)
+        elif choice == '9':
             print("Exiting...")
             break
         else:
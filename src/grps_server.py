@@ -1,15 +1,30 @@
+import asyncio
+import contextvars
 import grpc
+import inspect
+import multiprocessing
+import os
+import signal
+import time
 from concurrent import futures
 import object_storage_pb2
 import object_storage_pb2_grpc
-from storage.object_storage import ObjectStorage
+from storage.block_storage import BlockStorage
+from storage.metadata_service import connect_metadata_service, start_metadata_service
+from storage.metadata_store import MetadataStore
+from storage.models import StorageObject
+from storage.object_storage import BatchLimitExceeded, ObjectStorage
 from datetime import datetime
 import logging
 from auth.jwt_manager import generate_token, verify_token
 from auth.user_manager import user_manager
+import functools
 from functools import wraps
 from config import config
+from utils import metrics
+from utils.profiler import SamplingProfiler, format_collapsed
 import json
+import itertools
 import traceback
 import sys
 from google.protobuf.timestamp_pb2 import Timestamp
@@ -17,22 +32,97 @@ from google.protobuf.timestamp_pb2 import Timestamp
 logging.basicConfig(filename=config.LOG_FILE, level=config.LOG_LEVEL)
 grpc_logger = logging.getLogger('grpc')
 grpc_logger.setLevel(config.LOG_LEVEL)
+# Slow calls are warnings, logged whatever LOG_LEVEL is
+slow_call_logger = logging.getLogger('slow_calls')
+slow_call_logger.setLevel(logging.WARNING)
+
+def _authenticate_context(request, context):
+    if hasattr(request, 'token'):
+        try:
+            with metrics.stage('token'):
+                payload = verify_token(request.token)
+            context.user_id = payload['user_id']
+            context.role = payload['role']
+        except ValueError as e:
+            context.abort(grpc.StatusCode.UNAUTHENTICATED, str(e))
+    else:
+        context.abort(grpc.StatusCode.UNAUTHENTICATED, "Token is required")
 
 def auth_middleware(func):
     @wraps(func)
     def wrapper(self, request, context):
-        if hasattr(request, 'token'):
-            try:
-                payload = verify_token(request.token)
-                context.user_id = payload['user_id']
-                context.role = payload['role']
-            except ValueError as e:
-                context.abort(grpc.StatusCode.UNAUTHENTICATED, str(e))
-        else:
-            context.abort(grpc.StatusCode.UNAUTHENTICATED, "Token is required")
+        _authenticate_context(request, context)
         return func(self, request, context)
     return wrapper
 
+def stream_auth_middleware(func):
+    # Client-streaming RPCs carry the token in their first message only
+    @wraps(func)
+    def wrapper(self, request_iterator, context):
+        first = next(request_iterator, None)
+        if first is None:
+            context.abort(grpc.StatusCode.INVALID_ARGUMENT, "Empty request stream")
+        _authenticate_context(first, context)
+        return func(self, itertools.chain([first], request_iterator), context)
+    return wrapper
+
+class _AuthenticatedContext:
+    # grpc.aio contexts do not accept new attributes, so the caller's identity
+    # travels on this proxy instead
+    def __init__(self, context, user_id, role):
+        self._context = context
+        self.user_id = user_id
+        self.role = role
+
+    def __getattr__(self, name):
+        return getattr(self._context, name)
+
+async def _authenticate_context_async(request, context):
+    if not hasattr(request, 'token'):
+        await context.abort(grpc.StatusCode.UNAUTHENTICATED, "Token is required")
+    try:
+        with metrics.stage('token'):
+            payload = verify_token(request.token)
+    except ValueError as e:
+        await context.abort(grpc.StatusCode.UNAUTHENTICATED, str(e))
+    return _AuthenticatedContext(context, payload['user_id'], payload['role'])
+
+async def _next_message(request_iterator):
+    try:
+        return await request_iterator.__anext__()
+    except StopAsyncIteration:
+        return None
+
+async def _prepend(first, request_iterator):
+    yield first
+    async for message in request_iterator:
+        yield message
+
+def async_auth_middleware(func):
+    if inspect.isasyncgenfunction(func):
+        @wraps(func)
+        async def stream_wrapper(self, request, context):
+            context = await _authenticate_context_async(request, context)
+            async for response in func(self, request, context):
+                yield response
+        return stream_wrapper
+
+    @wraps(func)
+    async def wrapper(self, request, context):
+        context = await _authenticate_context_async(request, context)
+        return await func(self, request, context)
+    return wrapper
+
+def async_stream_auth_middleware(func):
+    @wraps(func)
+    async def wrapper(self, request_iterator, context):
+        first = await _next_message(request_iterator)
+        if first is None:
+            await context.abort(grpc.StatusCode.INVALID_ARGUMENT, "Empty request stream")
+        context = await _authenticate_context_async(first, context)
+        return await func(self, _prepend(first, request_iterator), context)
+    return wrapper
+
 def admin_required(func):
     @wraps(func)
     def wrapper(self, request, context):
@@ -41,12 +131,189 @@ def admin_required(func):
         return func(self, request, context)
     return wrapper
 
+def async_admin_required(func):
+    @wraps(func)
+    async def wrapper(self, request, context):
+        if getattr(context, 'role', None) != 'admin':
+            await context.abort(grpc.StatusCode.PERMISSION_DENIED, "Admin access required")
+        return await func(self, request, context)
+    return wrapper
+
+RPC_REQUESTS = metrics.registry.counter(
+    'objdir_grpc_requests_total', "RPCs handled, by method and status code", ('method', 'code')
+)
+RPC_SECONDS = metrics.registry.histogram(
+    'objdir_grpc_request_seconds', "RPC latency, by method; streamed responses until their last message", ('method',)
+)
+
+def _record_rpc(method, context, started, code, stages):
+    # A code set on the context, e.g. by abort, wins over how the handler ended
+    code = context.code() or code
+    elapsed = time.perf_counter() - started
+    RPC_SECONDS.labels(method).observe(elapsed)
+    RPC_REQUESTS.labels(method, code.name).inc()
+    if config.SLOW_CALL_THRESHOLD and elapsed >= config.SLOW_CALL_THRESHOLD:
+        breakdown = ', '.join(
+            f"{name} {seconds * 1000:.1f}ms" for name, seconds in sorted(stages.items(), key=lambda item: -item[1])
+        )
+        slow_call_logger.warning("Slow call %s took %.1fms (%s): %s", method, elapsed * 1000, code.name,
+                                 breakdown or "no stages recorded")
+
+def _instrumented_handler(handler, unary, stream):
+    # The same handler with its behavior wrapped; unary and stream wrap
+    # behaviors that return one response and an iterator of them
+    if handler.unary_unary:
+        return grpc.unary_unary_rpc_method_handler(
+            unary(handler.unary_unary), handler.request_deserializer, handler.response_serializer)
+    if handler.unary_stream:
+        return grpc.unary_stream_rpc_method_handler(
+            stream(handler.unary_stream), handler.request_deserializer, handler.response_serializer)
+    if handler.stream_unary:
+        return grpc.stream_unary_rpc_method_handler(
+            unary(handler.stream_unary), handler.request_deserializer, handler.response_serializer)
+    return grpc.stream_stream_rpc_method_handler(
+        stream(handler.stream_stream), handler.request_deserializer, handler.response_serializer)
+
+class MetricsInterceptor(grpc.ServerInterceptor):
+    def intercept_service(self, continuation, handler_call_details):
+        handler = continuation(handler_call_details)
+        if handler is None:
+            return None
+        method = handler_call_details.method.rsplit('/', 1)[-1]
+
+        def unary(behavior):
+            def wrapper(request, context):
+                started = time.perf_counter()
+                code = grpc.StatusCode.UNKNOWN
+                with metrics.request_stages() as stages:
+                    try:
+                        response = behavior(request, context)
+                        code = grpc.StatusCode.OK
+                        return response
+                    finally:
+                        _record_rpc(method, context, started, code, stages)
+            return wrapper
+
+        def stream(behavior):
+            def wrapper(request, context):
+                started = time.perf_counter()
+                code = grpc.StatusCode.UNKNOWN
+                with metrics.request_stages() as stages:
+                    try:
+                        yield from behavior(request, context)
+                        code = grpc.StatusCode.OK
+                    except GeneratorExit:
+                        code = grpc.StatusCode.CANCELLED
+                        raise
+                    finally:
+                        _record_rpc(method, context, started, code, stages)
+            return wrapper
+
+        return _instrumented_handler(handler, unary, stream)
+
+class AsyncMetricsInterceptor(grpc.aio.ServerInterceptor):
+    async def intercept_service(self, continuation, handler_call_details):
+        handler = await continuation(handler_call_details)
+        if handler is None:
+            return None
+        method = handler_call_details.method.rsplit('/', 1)[-1]
+
+        def unary(behavior):
+            if not inspect.iscoroutinefunction(behavior):
+                return behavior
+
+            async def wrapper(request, context):
+                started = time.perf_counter()
+                code = grpc.StatusCode.UNKNOWN
+                with metrics.request_stages() as stages:
+                    try:
+                        response = await behavior(request, context)
+                        code = grpc.StatusCode.OK
+                        return response
+                    except asyncio.CancelledError:
+                        code = grpc.StatusCode.CANCELLED
+                        raise
+                    finally:
+                        _record_rpc(method, context, started, code, stages)
+            return wrapper
+
+        def stream(behavior):
+            if not inspect.isasyncgenfunction(behavior):
+                return behavior
+
+            async def wrapper(request, context):
+                started = time.perf_counter()
+                code = grpc.StatusCode.UNKNOWN
+                with metrics.request_stages() as stages:
+                    try:
+                        async for response in behavior(request, context):
+                            yield response
+                        code = grpc.StatusCode.OK
+                    except (asyncio.CancelledError, GeneratorExit):
+                        code = grpc.StatusCode.CANCELLED
+                        raise
+                    finally:
+                        _record_rpc(method, context, started, code, stages)
+            return wrapper
+
+        return _instrumented_handler(handler, unary, stream)
+
+class _TimedUsers:
+    # Every call into the user store (Postgres, bcrypt) is timed as the auth stage
+    def __init__(self, users):
+        self._users = users
+
+    def __getattr__(self, name):
+        attribute = getattr(self._users, name)
+        if not callable(attribute):
+            return attribute
+
+        @wraps(attribute)
+        def timed(*args, **kwargs):
+            with metrics.stage('auth'):
+                return attribute(*args, **kwargs)
+        return timed
+
+def _new_profiler(request) -> SamplingProfiler:
+    if not 0 < request.duration_seconds <= config.PROFILE_MAX_SECONDS:
+        raise ValueError(f"duration_seconds must be more than 0 and at most {config.PROFILE_MAX_SECONDS}")
+    interval = request.sample_interval_seconds or config.PROFILE_SAMPLE_INTERVAL
+    if interval < 0.001:
+        raise ValueError("sample_interval_seconds must be at least 0.001")
+    return SamplingProfiler(interval, request.include_idle)
+
+def _profile_response(profiler: SamplingProfiler):
+    collapsed = format_collapsed(profiler.stacks)
+    os.makedirs(config.PROFILE_DIR, exist_ok=True)
+    path = os.path.join(config.PROFILE_DIR, f"profile-{os.getpid()}-{datetime.now():%Y%m%d-%H%M%S}.folded")
+    with open(path, 'w') as f:
+        f.write(collapsed)
+    return object_storage_pb2.ProfileResponse(path=path, samples=profiler.samples, collapsed_stacks=collapsed)
+
+BATCH_TOO_LARGE = f"A batch holds at most {config.BATCH_MAX_OBJECTS} objects"
+BATCH_RESPONSE_OVERHEAD = 1024 * 1024  # room for keys, metadata and framing
+BATCH_DATA_BUDGET = config.GRPC_MAX_MESSAGE_LENGTH - BATCH_RESPONSE_OVERHEAD
+
+def _upload_items(request):
+    return [(item.object_key, item.data, item.compress, item.codec) for item in request.objects]
+
+def _batch_error(error: Exception):
+    if isinstance(error, FileNotFoundError):
+        return grpc.StatusCode.NOT_FOUND, "Object not found"
+    if isinstance(error, ValueError):
+        return grpc.StatusCode.INVALID_ARGUMENT, str(error)
+    if isinstance(error, BatchLimitExceeded):
+        return grpc.StatusCode.RESOURCE_EXHAUSTED, str(error)
+    return grpc.StatusCode.INTERNAL, str(error)
+
 class ObjectStorageServicer(object_storage_pb2_grpc.ObjectStorageServiceServicer):
-    def __init__(self, storage):
+    def __init__(self, storage, users=None):
+        # users stands in for the Postgres-backed user_manager, e.g. in benchmarks
         self.storage = storage
+        self.users = _TimedUsers(users if users is not None else user_manager)
 
     def Authenticate(self, request, context):
-        user = user_manager.authenticate_user(request.username, request.password)
+        user = self.users.authenticate_user(request.username, request.password)
         if user:
             token = generate_token(user['user_id'], user['role'])
             return object_storage_pb2.AuthenticationResponse(token=token)
@@ -55,7 +322,7 @@ class ObjectStorageServicer(object_storage_pb2_grpc.ObjectStorageServiceServicer
 
     @auth_middleware
     def UploadObject(self, request, context):
-        if not user_manager.check_bucket_ownership(context.user_id, request.bucket_name):
+        if not self.users.check_bucket_ownership(context.user_id, request.bucket_name):
             context.abort(grpc.StatusCode.PERMISSION_DENIED, "You don't own this bucket")
         
 
@@ -65,31 +332,87 @@ class ObjectStorageServicer(object_storage_pb2_grpc.ObjectStorageServiceServicer
                 request.object_key,
                 request.data,
                 context.user_id,
-                request.compress
+                request.compress,
+                request.codec
             )
             
             return object_storage_pb2.UploadObjectResponse(
                 message="Object uploaded successfully",
                 metadata=self._metadata_to_proto(storage_object.metadata)
             )
+        except ValueError as e:
+            context.abort(grpc.StatusCode.INVALID_ARGUMENT, str(e))
         except Exception as e:
             exc_info = sys.exc_info()
             context.abort(grpc.StatusCode.INTERNAL, ''.join(traceback.format_exception(*exc_info)))
 
+    @stream_auth_middleware
+    def UploadObjectStream(self, request_iterator, context):
+        header = next(request_iterator)
+        if not self.users.check_bucket_ownership(context.user_id, header.bucket_name):
+            context.abort(grpc.StatusCode.PERMISSION_DENIED, "You don't own this bucket")
+
+        try:
+            chunks = itertools.chain([header.data], (chunk.data for chunk in request_iterator))
+            metadata = self.storage.upload_stream(
+                header.bucket_name,
+                header.object_key,
+                chunks,
+                context.user_id,
+                header.compress,
+                header.codec
+            )
+
+            return object_storage_pb2.UploadObjectResponse(
+                message="Object uploaded successfully",
+                metadata=self._metadata_to_proto(metadata)
+            )
+        except ValueError as e:
+            context.abort(grpc.StatusCode.INVALID_ARGUMENT, str(e))
+        except Exception as e:
+            exc_info = sys.exc_info()
+            context.abort(grpc.StatusCode.INTERNAL, ''.join(traceback.format_exception(*exc_info)))
 
     @auth_middleware
     def GetObject(self, request, context):
-        if not user_manager.check_bucket_ownership(context.user_id, request.bucket_name):
+        if not self.users.check_bucket_ownership(context.user_id, request.bucket_name):
             context.abort(grpc.StatusCode.PERMISSION_DENIED, "You don't own this bucket")
         
         try:
-            storage_object = self.storage.get_object(request.bucket_name, request.object_key)
+            storage_object = self.storage.get_object(
+                request.bucket_name, request.object_key, request.range_start, request.range_length
+            )
             return object_storage_pb2.GetObjectResponse(
                 metadata=self._metadata_to_proto(storage_object.metadata),
                 data=storage_object.data
             )
         except FileNotFoundError:
             context.abort(grpc.StatusCode.NOT_FOUND, "Object not found")
+        except ValueError as e:
+            context.abort(grpc.StatusCode.OUT_OF_RANGE, str(e))
+        except Exception as e:
+            context.abort(grpc.StatusCode.INTERNAL, str(e))
+
+    @auth_middleware
+    def GetObjectStream(self, request, context):
+        if not self.users.check_bucket_ownership(context.user_id, request.bucket_name):
+            context.abort(grpc.StatusCode.PERMISSION_DENIED, "You don't own this bucket")
+
+        try:
+            metadata, chunks = self.storage.get_object_stream(
+                request.bucket_name, request.object_key, request.range_start, request.range_length
+            )
+        except FileNotFoundError:
+            context.abort(grpc.StatusCode.NOT_FOUND, "Object not found")
+        except ValueError as e:
+            context.abort(grpc.StatusCode.OUT_OF_RANGE, str(e))
+        except Exception as e:
+            context.abort(grpc.StatusCode.INTERNAL, str(e))
+
+        yield object_storage_pb2.GetObjectChunk(metadata=self._metadata_to_proto(metadata))
+        try:
+            for chunk in chunks:
+                yield object_storage_pb2.GetObjectChunk(data=chunk)
         except Exception as e:
             context.abort(grpc.StatusCode.INTERNAL, str(e))
 
@@ -110,20 +433,33 @@ class ObjectStorageServicer(object_storage_pb2_grpc.ObjectStorageServiceServicer
     
     @auth_middleware
     def ListObjects(self, request, context):
-        if not user_manager.check_bucket_ownership(context.user_id, request.bucket_name):
+        if not self.users.check_bucket_ownership(context.user_id, request.bucket_name):
             context.abort(grpc.StatusCode.PERMISSION_DENIED, "You don't own this bucket")
         
         try:
-            objects = self.storage.list_objects(request.bucket_name)
+            result = self.storage.list_objects(
+                request.bucket_name,
+                prefix=request.prefix,
+                delimiter=request.delimiter,
+                start_after=request.start_after,
+                continuation_token=request.continuation_token,
+                max_keys=request.max_keys,
+                include_block_ids=not request.omit_block_ids
+            )
             return object_storage_pb2.ListObjectsResponse(
-                objects=[self._metadata_to_proto(obj) for obj in objects]
+                objects=[self._metadata_to_proto(obj) for obj in result.objects],
+                common_prefixes=result.common_prefixes,
+                is_truncated=result.is_truncated,
+                next_continuation_token=result.next_continuation_token
             )
+        except ValueError as e:
+            context.abort(grpc.StatusCode.INVALID_ARGUMENT, str(e))
         except Exception as e:
             context.abort(grpc.StatusCode.INTERNAL, str(e))
 
     @auth_middleware
     def DeleteObject(self, request, context):
-        if not user_manager.check_bucket_ownership(context.user_id, request.bucket_name):
+        if not self.users.check_bucket_ownership(context.user_id, request.bucket_name):
             context.abort(grpc.StatusCode.PERMISSION_DENIED, "You don't own this bucket")
         
         try:
@@ -134,16 +470,97 @@ class ObjectStorageServicer(object_storage_pb2_grpc.ObjectStorageServiceServicer
         except Exception as e:
             context.abort(grpc.StatusCode.INTERNAL, str(e))
 
+    @auth_middleware
+    def BatchGetObjects(self, request, context):
+        if not self.users.check_bucket_ownership(context.user_id, request.bucket_name):
+            context.abort(grpc.StatusCode.PERMISSION_DENIED, "You don't own this bucket")
+        if len(request.object_keys) > config.BATCH_MAX_OBJECTS:
+            context.abort(grpc.StatusCode.INVALID_ARGUMENT, BATCH_TOO_LARGE)
+
+        try:
+            results = self.storage.get_objects(
+                request.bucket_name, list(request.object_keys), BATCH_DATA_BUDGET, config.BATCH_MAX_OBJECT_SIZE
+            )
+        except Exception as e:
+            context.abort(grpc.StatusCode.INTERNAL, str(e))
+        return self._batch_response(request.object_keys, results)
+
+    @auth_middleware
+    def BatchUploadObjects(self, request, context):
+        if not self.users.check_bucket_ownership(context.user_id, request.bucket_name):
+            context.abort(grpc.StatusCode.PERMISSION_DENIED, "You don't own this bucket")
+        if len(request.objects) > config.BATCH_MAX_OBJECTS:
+            context.abort(grpc.StatusCode.INVALID_ARGUMENT, BATCH_TOO_LARGE)
+
+        try:
+            results = self.storage.upload_files(request.bucket_name, _upload_items(request), context.user_id)
+        except Exception as e:
+            context.abort(grpc.StatusCode.INTERNAL, str(e))
+        return self._batch_response([item.object_key for item in request.objects], results)
+
+    @auth_middleware
+    def DeleteObjects(self, request, context):
+        if not self.users.check_bucket_ownership(context.user_id, request.bucket_name):
+            context.abort(grpc.StatusCode.PERMISSION_DENIED, "You don't own this bucket")
+        if len(request.object_keys) > config.BATCH_MAX_OBJECTS:
+            context.abort(grpc.StatusCode.INVALID_ARGUMENT, BATCH_TOO_LARGE)
+
+        try:
+            results = self.storage.delete_objects(request.bucket_name, list(request.object_keys))
+        except Exception as e:
+            context.abort(grpc.StatusCode.INTERNAL, str(e))
+        return self._batch_response(request.object_keys, results)
+
+    def _batch_response(self, object_keys, results):
+        # Object data beyond what fits in one message is left out; those
+        # objects have to be fetched on their own. Batch gets leave most of
+        # them unread already; this catches repeated keys and legacy records,
+        # whose stored size is the compressed one.
+        response = object_storage_pb2.BatchObjectsResponse()
+        data_budget = BATCH_DATA_BUDGET
+        for object_key, result in zip(object_keys, results):
+            item = response.results.add(object_key=object_key)
+            if isinstance(result, Exception):
+                code, item.message = _batch_error(result)
+                item.code = code.value[0]
+            elif isinstance(result, StorageObject):
+                if len(result.data) > data_budget:
+                    item.code = grpc.StatusCode.RESOURCE_EXHAUSTED.value[0]
+                    item.message = "Batch response is full; get this object on its own"
+                    continue
+                data_budget -= len(result.data)
+                item.metadata.CopyFrom(self._metadata_to_proto(result.metadata))
+                item.data = result.data
+            elif result is not None:
+                item.metadata.CopyFrom(self._metadata_to_proto(result))
+        return response
+
     @auth_middleware
     def ListUserBuckets(self, request, context):
         try:
-            buckets = user_manager.get_user_buckets(context.user_id)
+            buckets = self.users.get_user_buckets(context.user_id)
             return object_storage_pb2.ListUserBucketsResponse(
                 buckets=[self._bucket_to_proto(bucket) for bucket in buckets]
             )
         except Exception as e:
             context.abort(grpc.StatusCode.INTERNAL, str(e))
 
+    @auth_middleware
+    @admin_required
+    def Profile(self, request, context):
+        try:
+            profiler = _new_profiler(request)
+            profiler.start()
+        except ValueError as e:
+            context.abort(grpc.StatusCode.INVALID_ARGUMENT, str(e))
+        except RuntimeError as e:
+            context.abort(grpc.StatusCode.FAILED_PRECONDITION, str(e))
+        try:
+            time.sleep(request.duration_seconds)
+        finally:
+            profiler.stop()
+        return _profile_response(profiler)
+
     def _bucket_to_proto(self, bucket):
         return object_storage_pb2.BucketInfo(
             id=bucket['id'],
@@ -152,39 +569,391 @@ class ObjectStorageServicer(object_storage_pb2_grpc.ObjectStorageServiceServicer
 
     def _metadata_to_proto(self, metadata):
         try:
-            return object_storage_pb2.ObjectMetadata(
-                object_key=str(metadata.object_key),
-                bucket_name=str(metadata.bucket_name),
-                size=int(metadata.size),
-                md5_hash=str(metadata.md5_hash),
-                mime_type=str(metadata.mime_type),
-                created_at=metadata.created_at.isoformat(),
-                modified_at=metadata.modified_at.isoformat(),
-                owner_id=str(metadata.owner_id),
-                is_compressed=bool(metadata.is_compressed),
-                acl=json.dumps(metadata.acl),
-                block_ids=[str(block_id) for block_id in metadata.block_ids]
-            )
-        except Exception as e:
-            print(f"Error in _metadata_to_proto: {str(e)}")
-            print(f"Metadata: {metadata}")
+            with metrics.stage('proto_build'):
+                return object_storage_pb2.ObjectMetadata(
+                    object_key=str(metadata.object_key),
+                    bucket_name=str(metadata.bucket_name),
+                    size=int(metadata.size),
+                    md5_hash=str(metadata.md5_hash),
+                    mime_type=str(metadata.mime_type),
+                    created_at=metadata.created_at.isoformat(),
+                    modified_at=metadata.modified_at.isoformat(),
+                    owner_id=str(metadata.owner_id),
+                    is_compressed=bool(metadata.is_compressed),
+                    acl=json.dumps(metadata.acl),
+                    block_ids=[str(block_id) for block_id in metadata.block_ids or []],
+                    codec=metadata.codec or ""
+                )
+        except Exception:
+            logging.exception("Could not convert metadata to proto: %s", metadata)
             raise
 
-def serve():
-    storage = ObjectStorage()
+class AsyncObjectStorageServicer(ObjectStorageServicer):
+    # Handlers run on the event loop, so an idle or slow client costs a
+    # coroutine rather than a thread. Blocking work goes to sized pools:
+    # RocksDB and block I/O to storage_executor, Postgres and bcrypt to
+    # auth_executor.
+    def __init__(self, storage, storage_executor, auth_executor, users=None):
+        super().__init__(storage, users)
+        self.storage_executor = storage_executor
+        self.auth_executor = auth_executor
+
+    # Pool work runs in a copy of the caller's context, so its stage timings
+    # count towards the request
+    async def _run_storage(self, func, *args):
+        return await asyncio.get_running_loop().run_in_executor(self.storage_executor, contextvars.copy_context().run, func, *args)
+
+    async def _run_auth(self, func, *args):
+        return await asyncio.get_running_loop().run_in_executor(self.auth_executor, contextvars.copy_context().run, func, *args)
+
+    async def _check_bucket_ownership(self, context, bucket_name):
+        if not await self._run_auth(self.users.check_bucket_ownership, context.user_id, bucket_name):
+            await context.abort(grpc.StatusCode.PERMISSION_DENIED, "You don't own this bucket")
+
+    async def Authenticate(self, request, context):
+        user = await self._run_auth(self.users.authenticate_user, request.username, request.password)
+        if not user:
+            await context.abort(grpc.StatusCode.UNAUTHENTICATED, "Invalid credentials")
+        token = generate_token(user['user_id'], user['role'])
+        return object_storage_pb2.AuthenticationResponse(token=token)
+
+    @async_auth_middleware
+    async def UploadObject(self, request, context):
+        await self._check_bucket_ownership(context, request.bucket_name)
+
+        try:
+            storage_object = await self._run_storage(
+                self.storage.upload_file,
+                request.bucket_name,
+                request.object_key,
+                request.data,
+                context.user_id,
+                request.compress,
+                request.codec
+            )
+        except ValueError as e:
+            await context.abort(grpc.StatusCode.INVALID_ARGUMENT, str(e))
+        except Exception:
+            await context.abort(grpc.StatusCode.INTERNAL, traceback.format_exc())
+
+        return object_storage_pb2.UploadObjectResponse(
+            message="Object uploaded successfully",
+            metadata=self._metadata_to_proto(storage_object.metadata)
+        )
+
+    @async_stream_auth_middleware
+    async def UploadObjectStream(self, request_iterator, context):
+        header = await _next_message(request_iterator)
+        await self._check_bucket_ownership(context, header.bucket_name)
+
+        # Messages are received on the event loop and handed to a storage
+        # thread in batches, so a slow client only holds a thread while its
+        # data is being stored. Receiving waits for each batch, which bounds
+        # what is buffered.
+        try:
+            upload = await self._run_storage(
+                self.storage.open_upload,
+                header.bucket_name,
+                header.object_key,
+                context.user_id,
+                header.compress,
+                header.codec
+            )
+            try:
+                batch = [header.data]
+                batch_bytes = len(header.data)
+                async for message in request_iterator:
+                    batch.append(message.data)
+                    batch_bytes += len(message.data)
+                    if batch_bytes >= config.AIO_UPLOAD_BATCH_BYTES:
+                        await self._run_storage(upload.write, batch)
+                        batch = []
+                        batch_bytes = 0
+                metadata = await self._run_storage(upload.finish, batch)
+            except BaseException:
+                # Also when the client goes away; waits for a write in progress
+                self.storage_executor.submit(upload.abort)
+                raise
+        except ValueError as e:
+            await context.abort(grpc.StatusCode.INVALID_ARGUMENT, str(e))
+        except Exception:
+            await context.abort(grpc.StatusCode.INTERNAL, traceback.format_exc())
+
+        return object_storage_pb2.UploadObjectResponse(
+            message="Object uploaded successfully",
+            metadata=self._metadata_to_proto(metadata)
+        )
+
+    @async_auth_middleware
+    async def GetObject(self, request, context):
+        await self._check_bucket_ownership(context, request.bucket_name)
+
+        try:
+            storage_object = await self._run_storage(
+                self.storage.get_object, request.bucket_name, request.object_key, request.range_start, request.range_length
+            )
+        except FileNotFoundError:
+            await context.abort(grpc.StatusCode.NOT_FOUND, "Object not found")
+        except ValueError as e:
+            await context.abort(grpc.StatusCode.OUT_OF_RANGE, str(e))
+        except Exception as e:
+            await context.abort(grpc.StatusCode.INTERNAL, str(e))
+
+        return object_storage_pb2.GetObjectResponse(
+            metadata=self._metadata_to_proto(storage_object.metadata),
+            data=storage_object.data
+        )
+
+    @async_auth_middleware
+    async def GetObjectStream(self, request, context):
+        await self._check_bucket_ownership(context, request.bucket_name)
+
+        try:
+            metadata, chunks = await self._run_storage(
+                self.storage.get_object_stream, request.bucket_name, request.object_key,
+                request.range_start, request.range_length
+            )
+        except FileNotFoundError:
+            await context.abort(grpc.StatusCode.NOT_FOUND, "Object not found")
+        except ValueError as e:
+            await context.abort(grpc.StatusCode.OUT_OF_RANGE, str(e))
+        except Exception as e:
+            await context.abort(grpc.StatusCode.INTERNAL, str(e))
+
+        yield object_storage_pb2.GetObjectChunk(metadata=self._metadata_to_proto(metadata))
+        while True:
+            try:
+                chunk = await self._run_storage(next, chunks, None)
+            except Exception as e:
+                await context.abort(grpc.StatusCode.INTERNAL, str(e))
+            if chunk is None:
+                break
+            yield object_storage_pb2.GetObjectChunk(data=chunk)
+
+    @async_auth_middleware
+    async def ListObjects(self, request, context):
+        await self._check_bucket_ownership(context, request.bucket_name)
+
+        try:
+            result = await self._run_storage(functools.partial(
+                self.storage.list_objects,
+                request.bucket_name,
+                prefix=request.prefix,
+                delimiter=request.delimiter,
+                start_after=request.start_after,
+                continuation_token=request.continuation_token,
+                max_keys=request.max_keys,
+                include_block_ids=not request.omit_block_ids
+            ))
+        except ValueError as e:
+            await context.abort(grpc.StatusCode.INVALID_ARGUMENT, str(e))
+        except Exception as e:
+            await context.abort(grpc.StatusCode.INTERNAL, str(e))
+
+        return object_storage_pb2.ListObjectsResponse(
+            objects=[self._metadata_to_proto(obj) for obj in result.objects],
+            common_prefixes=result.common_prefixes,
+            is_truncated=result.is_truncated,
+            next_continuation_token=result.next_continuation_token
+        )
+
+    @async_auth_middleware
+    async def DeleteObject(self, request, context):
+        await self._check_bucket_ownership(context, request.bucket_name)
+
+        try:
+            await self._run_storage(self.storage.delete_object, request.bucket_name, request.object_key)
+        except FileNotFoundError:
+            await context.abort(grpc.StatusCode.NOT_FOUND, "Object not found")
+        except Exception as e:
+            await context.abort(grpc.StatusCode.INTERNAL, str(e))
+
+        return object_storage_pb2.DeleteObjectResponse(message="Object deleted successfully")
+
+    @async_auth_middleware
+    async def BatchGetObjects(self, request, context):
+        await self._check_bucket_ownership(context, request.bucket_name)
+        if len(request.object_keys) > config.BATCH_MAX_OBJECTS:
+            await context.abort(grpc.StatusCode.INVALID_ARGUMENT, BATCH_TOO_LARGE)
+
+        try:
+            results = await self._run_storage(
+                self.storage.get_objects, request.bucket_name, list(request.object_keys), BATCH_DATA_BUDGET,
+                config.BATCH_MAX_OBJECT_SIZE
+            )
+        except Exception as e:
+            await context.abort(grpc.StatusCode.INTERNAL, str(e))
+        return self._batch_response(request.object_keys, results)
+
+    @async_auth_middleware
+    async def BatchUploadObjects(self, request, context):
+        await self._check_bucket_ownership(context, request.bucket_name)
+        if len(request.objects) > config.BATCH_MAX_OBJECTS:
+            await context.abort(grpc.StatusCode.INVALID_ARGUMENT, BATCH_TOO_LARGE)
+
+        try:
+            results = await self._run_storage(
+                self.storage.upload_files, request.bucket_name, _upload_items(request), context.user_id
+            )
+        except Exception as e:
+            await context.abort(grpc.StatusCode.INTERNAL, str(e))
+        return self._batch_response([item.object_key for item in request.objects], results)
+
+    @async_auth_middleware
+    async def DeleteObjects(self, request, context):
+        await self._check_bucket_ownership(context, request.bucket_name)
+        if len(request.object_keys) > config.BATCH_MAX_OBJECTS:
+            await context.abort(grpc.StatusCode.INVALID_ARGUMENT, BATCH_TOO_LARGE)
+
+        try:
+            results = await self._run_storage(self.storage.delete_objects, request.bucket_name, list(request.object_keys))
+        except Exception as e:
+            await context.abort(grpc.StatusCode.INTERNAL, str(e))
+        return self._batch_response(request.object_keys, results)
+
+    @async_auth_middleware
+    async def ListUserBuckets(self, request, context):
+        try:
+            buckets = await self._run_auth(self.users.get_user_buckets, context.user_id)
+        except Exception as e:
+            await context.abort(grpc.StatusCode.INTERNAL, str(e))
+
+        return object_storage_pb2.ListUserBucketsResponse(
+            buckets=[self._bucket_to_proto(bucket) for bucket in buckets]
+        )
+
+    @async_auth_middleware
+    @async_admin_required
+    async def Profile(self, request, context):
+        try:
+            profiler = _new_profiler(request)
+            profiler.start()
+        except ValueError as e:
+            await context.abort(grpc.StatusCode.INVALID_ARGUMENT, str(e))
+        except RuntimeError as e:
+            await context.abort(grpc.StatusCode.FAILED_PRECONDITION, str(e))
+        try:
+            await asyncio.sleep(request.duration_seconds)
+        finally:
+            profiler.stop()
+        return await self._run_storage(_profile_response, profiler)
+
+SERVER_OPTIONS = [
+    ('grpc.max_send_message_length', config.GRPC_MAX_MESSAGE_LENGTH),
+    ('grpc.max_receive_message_length', config.GRPC_MAX_MESSAGE_LENGTH)
+]
+
+def create_sync_server(storage, options, users=None):
     server = grpc.server(
-        futures.ThreadPoolExecutor(max_workers=10),
-        options=[
-            ('grpc.max_send_message_length', 50 * 1024 * 1024),  # 50 MB
-            ('grpc.max_receive_message_length', 50 * 1024 * 1024)  # 50 MB
-        ]
+        futures.ThreadPoolExecutor(max_workers=config.MAX_WORKERS), interceptors=[MetricsInterceptor()], options=options
     )
     object_storage_pb2_grpc.add_ObjectStorageServiceServicer_to_server(
-        ObjectStorageServicer(storage), server)
+        ObjectStorageServicer(storage, users), server)
+    server.add_insecure_port(f'[::]:{config.GRPC_SERVER_PORT}')
+    return server
+
+def create_aio_server(storage, options, storage_executor, auth_executor, users=None):
+    server = grpc.aio.server(interceptors=[AsyncMetricsInterceptor()], options=options)
+    object_storage_pb2_grpc.add_ObjectStorageServiceServicer_to_server(
+        AsyncObjectStorageServicer(storage, storage_executor, auth_executor, users), server)
     server.add_insecure_port(f'[::]:{config.GRPC_SERVER_PORT}')
+    return server
+
+def _serve_sync(storage, options):
+    server = create_sync_server(storage, options)
     server.start()
-    print(f"gRPC server started on port {config.GRPC_SERVER_PORT}")
-    server.wait_for_termination()
+    print(f"gRPC server started on port {config.GRPC_SERVER_PORT} (pid {os.getpid()})")
+    try:
+        server.wait_for_termination()
+    finally:
+        server.stop(None)
+
+async def _serve_aio(storage, options):
+    storage_executor = futures.ThreadPoolExecutor(max_workers=config.AIO_STORAGE_WORKERS, thread_name_prefix="grpc-storage")
+    auth_executor = futures.ThreadPoolExecutor(max_workers=config.AIO_AUTH_WORKERS, thread_name_prefix="grpc-auth")
+    server = create_aio_server(storage, options, storage_executor, auth_executor)
+    await server.start()
+    print(f"gRPC server (asyncio) started on port {config.GRPC_SERVER_PORT} (pid {os.getpid()})")
+    try:
+        await server.wait_for_termination()
+    finally:
+        await server.stop(None)
+        storage_executor.shutdown()
+        auth_executor.shutdown()
+
+def _start_metrics_server(port):
+    if not port:
+        return None
+    server = metrics.start_metrics_server(config.METRICS_HOST, port)
+    print(f"Metrics served on http://{config.METRICS_HOST}:{port}/metrics")
+    return server
+
+def _run(storage, options, metrics_port):
+    storage.start_background_compaction(config.COMPACTION_INTERVAL)
+    metrics_server = _start_metrics_server(metrics_port)
+    try:
+        if config.GRPC_SERVER_MODE == 'aio':
+            asyncio.run(_serve_aio(storage, options))
+        else:
+            _serve_sync(storage, options)
+    finally:
+        if metrics_server is not None:
+            metrics_server.shutdown()
+        storage.close()
+
+def _exit_on_sigterm():
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+
+def _run_worker(worker_id, authkey):
+    _exit_on_sigterm()
+    metadata = connect_metadata_service(config.METADATA_SERVICE_ADDRESS, authkey)
+    metrics_port = config.METRICS_PORT + worker_id if config.METRICS_PORT else 0
+    _run(ObjectStorage(metadata=metadata, namespace=worker_id), SERVER_OPTIONS + [('grpc.so_reuseport', 1)], metrics_port)
+
+def serve_multiprocess(worker_count):
+    # This process owns RocksDB and compaction and supervises the workers;
+    # it never starts gRPC itself, since gRPC does not survive a fork.
+    _exit_on_sigterm()
+    authkey = os.urandom(32)
+    store = MetadataStore(BlockStorage())
+    store.start_background_compaction(config.COMPACTION_INTERVAL)
+    service = start_metadata_service(store, config.METADATA_SERVICE_ADDRESS, authkey)
+    metrics_server = _start_metrics_server(config.METRICS_PORT)
+    context = multiprocessing.get_context('spawn')
+    workers = {}
+
+    def start_worker(worker_id):
+        workers[worker_id] = context.Process(
+            target=_run_worker, args=(worker_id, authkey), name=f"grpc-worker-{worker_id}"
+        )
+        workers[worker_id].start()
+
+    try:
+        for worker_id in range(1, worker_count + 1):
+            start_worker(worker_id)
+        while True:
+            time.sleep(1)
+            for worker_id, process in list(workers.items()):
+                if not process.is_alive():
+                    logging.error("gRPC worker %d exited with code %s, restarting", worker_id, process.exitcode)
+                    start_worker(worker_id)
+    except (KeyboardInterrupt, SystemExit):
+        pass
+    finally:
+        for process in workers.values():
+            process.terminate()
+        for process in workers.values():
+            process.join()
+        service.stop_event.set()
+        if metrics_server is not None:
+            metrics_server.shutdown()
+        store.close()
+
+def serve():
+    if config.GRPC_WORKER_PROCESSES > 1:
+        serve_multiprocess(config.GRPC_WORKER_PROCESSES)
+    else:
+        _run(ObjectStorage(), SERVER_OPTIONS, config.METRICS_PORT)
 
 if __name__ == '__main__':
     serve()
\ No newline at end of file
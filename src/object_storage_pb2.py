@@ -13,7 +13,7 @@ _sym_db = _symbol_database.Default()
 
 
 
-DESCRIPTOR = _descriptor_pool.Default().AddSerializedFile(b'\n\x14object_storage.proto\x12\x0eobject_storage\";\n\x15\x41uthenticationRequest\x12\x10\n\x08username\x18\x01 \x01(\t\x12\x10\n\x08password\x18\x02 \x01(\t\"\'\n\x16\x41uthenticationResponse\x12\r\n\x05token\x18\x01 \x01(\t\"m\n\x13UploadObjectRequest\x12\r\n\x05token\x18\x01 \x01(\t\x12\x13\n\x0b\x62ucket_name\x18\x02 \x01(\t\x12\x12\n\nobject_key\x18\x03 \x01(\t\x12\x0c\n\x04\x64\x61ta\x18\x04 \x01(\x0c\x12\x10\n\x08\x63ompress\x18\x05 \x01(\x08\"Y\n\x14UploadObjectResponse\x12\x0f\n\x07message\x18\x01 \x01(\t\x12\x30\n\x08metadata\x18\x02 \x01(\x0b\x32\x1e.object_storage.ObjectMetadata\"J\n\x10GetObjectRequest\x12\r\n\x05token\x18\x01 \x01(\t\x12\x13\n\x0b\x62ucket_name\x18\x02 \x01(\t\x12\x12\n\nobject_key\x18\x03 \x01(\t\"S\n\x11GetObjectResponse\x12\x30\n\x08metadata\x18\x01 \x01(\x0b\x32\x1e.object_storage.ObjectMetadata\x12\x0c\n\x04\x64\x61ta\x18\x02 \x01(\x0c\"8\n\x12ListObjectsRequest\x12\r\n\x05token\x18\x01 \x01(\t\x12\x13\n\x0b\x62ucket_name\x18\x02 \x01(\t\"F\n\x13ListObjectsResponse\x12/\n\x07objects\x18\x01 \x03(\x0b\x32\x1e.object_storage.ObjectMetadata\"M\n\x13\x44\x65leteObjectRequest\x12\r\n\x05token\x18\x01 \x01(\t\x12\x13\n\x0b\x62ucket_name\x18\x02 \x01(\t\x12\x12\n\nobject_key\x18\x03 \x01(\t\"\'\n\x14\x44\x65leteObjectResponse\x12\x0f\n\x07message\x18\x01 \x01(\t\"\xde\x01\n\x0eObjectMetadata\x12\x12\n\nobject_key\x18\x01 \x01(\t\x12\x13\n\x0b\x62ucket_name\x18\x02 \x01(\t\x12\x0c\n\x04size\x18\x03 \x01(\x03\x12\x10\n\x08md5_hash\x18\x04 \x01(\t\x12\x11\n\tmime_type\x18\x05 \x01(\t\x12\x12\n\ncreated_at\x18\x06 \x01(\t\x12\x13\n\x0bmodified_at\x18\x07 \x01(\t\x12\x10\n\x08owner_id\x18\x08 \x01(\t\x12\x15\n\ris_compressed\x18\t \x01(\x08\x12\x0b\n\x03\x61\x63l\x18\n \x01(\t\x12\x11\n\tblock_ids\x18\x0b \x03(\t\"\'\n\x16ListUserBucketsRequest\x12\r\n\x05token\x18\x01 \x01(\t\"F\n\x17ListUserBucketsResponse\x12+\n\x07\x62uckets\x18\x01 \x03(\x0b\x32\x1a.object_storage.BucketInfo\"&\n\nBucketInfo\x12\n\n\x02id\x18\x01 \x01(\x05\x12\x0c\n\x04name\x18\x02 \x01(\t2\xc5\x04\n\x14ObjectStorageService\x12_\n\x0c\x41uthenticate\x12%.object_storage.AuthenticationRequest\x1a&.object_storage.AuthenticationResponse\"\x00\x12[\n\x0cUploadObject\x12#.object_storage.UploadObjectRequest\x1a$.object_storage.UploadObjectResponse\"\x00\x12R\n\tGetObject\x12 .object_storage.GetObjectRequest\x1a!.object_storage.GetObjectResponse\"\x00\x12X\n\x0bListObjects\x12\".object_storage.ListObjectsRequest\x1a#.object_storage.ListObjectsResponse\"\x00\x12[\n\x0c\x44\x65leteObject\x12#.object_storage.DeleteObjectRequest\x1a$.object_storage.DeleteObjectResponse\"\x00\x12\x64\n\x0fListUserBuckets\x12&.object_storage.ListUserBucketsRequest\x1a\'.object_storage.ListUserBucketsResponse\"\x00\x62\x06proto3')
+DESCRIPTOR = _descriptor_pool.Default().AddSerializedFile(b'\n\x14object_storage.proto\x12\x0eobject_storage\";\n\x15\x41uthenticationRequest\x12\x10\n\x08username\x18\x01 \x01(\t\x12\x10\n\x08password\x18\x02 \x01(\t\"\'\n\x16\x41uthenticationResponse\x12\r\n\x05token\x18\x01 \x01(\t\"|\n\x13UploadObjectRequest\x12\r\n\x05token\x18\x01 \x01(\t\x12\x13\n\x0b\x62ucket_name\x18\x02 \x01(\t\x12\x12\n\nobject_key\x18\x03 \x01(\t\x12\x0c\n\x04\x64\x61ta\x18\x04 \x01(\x0c\x12\x10\n\x08\x63ompress\x18\x05 \x01(\x08\x12\r\n\x05\x63odec\x18\x06 \x01(\t\"z\n\x11UploadObjectChunk\x12\r\n\x05token\x18\x01 \x01(\t\x12\x13\n\x0b\x62ucket_name\x18\x02 \x01(\t\x12\x12\n\nobject_key\x18\x03 \x01(\t\x12\x10\n\x08\x63ompress\x18\x04 \x01(\x08\x12\x0c\n\x04\x64\x61ta\x18\x05 \x01(\x0c\x12\r\n\x05\x63odec\x18\x06 \x01(\t\"Y\n\x14UploadObjectResponse\x12\x0f\n\x07message\x18\x01 \x01(\t\x12\x30\n\x08metadata\x18\x02 \x01(\x0b\x32\x1e.object_storage.ObjectMetadata\"u\n\x10GetObjectRequest\x12\r\n\x05token\x18\x01 \x01(\t\x12\x13\n\x0b\x62ucket_name\x18\x02 \x01(\t\x12\x12\n\nobject_key\x18\x03 \x01(\t\x12\x13\n\x0brange_start\x18\x04 \x01(\x03\x12\x14\n\x0crange_length\x18\x05 \x01(\x03\"S\n\x11GetObjectResponse\x12\x30\n\x08metadata\x18\x01 \x01(\x0b\x32\x1e.object_storage.ObjectMetadata\x12\x0c\n\x04\x64\x61ta\x18\x02 \x01(\x0c\"P\n\x0eGetObjectChunk\x12\x30\n\x08metadata\x18\x01 \x01(\x0b\x32\x1e.object_storage.ObjectMetadata\x12\x0c\n\x04\x64\x61ta\x18\x02 \x01(\x0c\"\xb6\x01\n\x12ListObjectsRequest\x12\r\n\x05token\x18\x01 \x01(\t\x12\x13\n\x0b\x62ucket_name\x18\x02 \x01(\t\x12\x16\n\x0eomit_block_ids\x18\x03 \x01(\x08\x12\x0e\n\x06prefix\x18\x04 \x01(\t\x12\x11\n\tdelimiter\x18\x05 \x01(\t\x12\x13\n\x0bstart_after\x18\x06 \x01(\t\x12\x1a\n\x12\x63ontinuation_token\x18\x07 \x01(\t\x12\x10\n\x08max_keys\x18\x08 \x01(\x05\"\x96\x01\n\x13ListObjectsResponse\x12/\n\x07objects\x18\x01 \x03(\x0b\x32\x1e.object_storage.ObjectMetadata\x12\x17\n\x0f\x63ommon_prefixes\x18\x02 \x03(\t\x12\x14\n\x0cis_truncated\x18\x03 \x01(\x08\x12\x1f\n\x17next_continuation_token\x18\x04 \x01(\t\"M\n\x13\x44\x65leteObjectRequest\x12\r\n\x05token\x18\x01 \x01(\t\x12\x13\n\x0b\x62ucket_name\x18\x02 \x01(\t\x12\x12\n\nobject_key\x18\x03 \x01(\t\"\'\n\x14\x44\x65leteObjectResponse\x12\x0f\n\x07message\x18\x01 \x01(\t\"Q\n\x16\x42\x61tchGetObjectsRequest\x12\r\n\x05token\x18\x01 \x01(\t\x12\x13\n\x0b\x62ucket_name\x18\x02 \x01(\t\x12\x13\n\x0bobject_keys\x18\x03 \x03(\t\"T\n\x0f\x42\x61tchUploadItem\x12\x12\n\nobject_key\x18\x01 \x01(\t\x12\x0c\n\x04\x64\x61ta\x18\x02 \x01(\x0c\x12\x10\n\x08\x63ompress\x18\x03 \x01(\x08\x12\r\n\x05\x63odec\x18\x04 \x01(\t\"q\n\x19\x42\x61tchUploadObjectsRequest\x12\r\n\x05token\x18\x01 \x01(\t\x12\x13\n\x0b\x62ucket_name\x18\x02 \x01(\t\x12\x30\n\x07objects\x18\x03 \x03(\x0b\x32\x1f.object_storage.BatchUploadItem\"O\n\x14\x44\x65leteObjectsRequest\x12\r\n\x05token\x18\x01 \x01(\t\x12\x13\n\x0b\x62ucket_name\x18\x02 \x01(\t\x12\x13\n\x0bobject_keys\x18\x03 \x03(\t\"\x81\x01\n\x0cObjectResult\x12\x12\n\nobject_key\x18\x01 \x01(\t\x12\x0c\n\x04\x63ode\x18\x02 \x01(\x05\x12\x0f\n\x07message\x18\x03 \x01(\t\x12\x30\n\x08metadata\x18\x04 \x01(\x0b\x32\x1e.object_storage.ObjectMetadata\x12\x0c\n\x04\x64\x61ta\x18\x05 \x01(\x0c\"E\n\x14\x42\x61tchObjectsResponse\x12-\n\x07results\x18\x01 \x03(\x0b\x32\x1c.object_storage.ObjectResult\"\xf3\x01\n\x0eObjectMetadata\x12\x12\n\nobject_key\x18\x01 \x01(\t\x12\x13\n\x0b\x62ucket_name\x18\x02 \x01(\t\x12\x0c\n\x04size\x18\x03 \x01(\x03\x12\x10\n\x08md5_hash\x18\x04 \x01(\t\x12\x11\n\tmime_type\x18\x05 \x01(\t\x12\x12\n\ncreated_at\x18\x06 \x01(\t\x12\x13\n\x0bmodified_at\x18\x07 \x01(\t\x12\x10\n\x08owner_id\x18\x08 \x01(\t\x12\x15\n\ris_compressed\x18\t \x01(\x08\x12\x0b\n\x03\x61\x63l\x18\n \x01(\t\x12\x11\n\tblock_ids\x18\x0b \x03(\t\x12\r\n\x05\x63odec\x18\r \x01(\tJ\x04\x08\x0c\x10\r\"\'\n\x16ListUserBucketsRequest\x12\r\n\x05token\x18\x01 \x01(\t\"F\n\x17ListUserBucketsResponse\x12+\n\x07\x62uckets\x18\x01 \x03(\x0b\x32\x1a.object_storage.BucketInfo\"&\n\nBucketInfo\x12\n\n\x02id\x18\x01 \x01(\x05\x12\x0c\n\x04name\x18\x02 \x01(\t\"p\n\x0eProfileRequest\x12\r\n\x05token\x18\x01 \x01(\t\x12\x18\n\x10\x64uration_seconds\x18\x02 \x01(\x01\x12\x1f\n\x17sample_interval_seconds\x18\x03 \x01(\x01\x12\x14\n\x0cinclude_idle\x18\x04 \x01(\x08\"J\n\x0fProfileResponse\x12\x0c\n\x04path\x18\x01 \x01(\t\x12\x0f\n\x07samples\x18\x02 \x01(\x03\x12\x18\n\x10\x63ollapsed_stacks\x18\x03 \x01(\t2\xfa\x08\n\x14ObjectStorageService\x12_\n\x0c\x41uthenticate\x12%.object_storage.AuthenticationRequest\x1a&.object_storage.AuthenticationResponse\"\x00\x12[\n\x0cUploadObject\x12#.object_storage.UploadObjectRequest\x1a$.object_storage.UploadObjectResponse\"\x00\x12\x61\n\x12UploadObjectStream\x12!.object_storage.UploadObjectChunk\x1a$.object_storage.UploadObjectResponse\"\x00(\x01\x12R\n\tGetObject\x12 .object_storage.GetObjectRequest\x1a!.object_storage.GetObjectResponse\"\x00\x12W\n\x0fGetObjectStream\x12 .object_storage.GetObjectRequest\x1a\x1e.object_storage.GetObjectChunk\"\x00\x30\x01\x12X\n\x0bListObjects\x12\".object_storage.ListObjectsRequest\x1a#.object_storage.ListObjectsResponse\"\x00\x12[\n\x0c\x44\x65leteObject\x12#.object_storage.DeleteObjectRequest\x1a$.object_storage.DeleteObjectResponse\"\x00\x12\x61\n\x0f\x42\x61tchGetObjects\x12&.object_storage.BatchGetObjectsRequest\x1a$.object_storage.BatchObjectsResponse\"\x00\x12g\n\x12\x42\x61tchUploadObjects\x12).object_storage.BatchUploadObjectsRequest\x1a$.object_storage.BatchObjectsResponse\"\x00\x12]\n\rDeleteObjects\x12$.object_storage.DeleteObjectsRequest\x1a$.object_storage.BatchObjectsResponse\"\x00\x12\x64\n\x0fListUserBuckets\x12&.object_storage.ListUserBucketsRequest\x1a\'.object_storage.ListUserBucketsResponse\"\x00\x12L\n\x07Profile\x12\x1e.object_storage.ProfileRequest\x1a\x1f.object_storage.ProfileResponse\"\x00\x62\x06proto3')
 
 _globals = globals()
 _builder.BuildMessageAndEnumDescriptors(DESCRIPTOR, _globals)
@@ -25,29 +25,49 @@ if _descriptor._USE_C_DESCRIPTORS == False:
   _globals['_AUTHENTICATIONRESPONSE']._serialized_start=101
   _globals['_AUTHENTICATIONRESPONSE']._serialized_end=140
   _globals['_UPLOADOBJECTREQUEST']._serialized_start=142
-  _globals['_UPLOADOBJECTREQUEST']._serialized_end=251
-  _globals['_UPLOADOBJECTRESPONSE']._serialized_start=253
-  _globals['_UPLOADOBJECTRESPONSE']._serialized_end=342
-  _globals['_GETOBJECTREQUEST']._serialized_start=344
-  _globals['_GETOBJECTREQUEST']._serialized_end=418
-  _globals['_GETOBJECTRESPONSE']._serialized_start=420
-  _globals['_GETOBJECTRESPONSE']._serialized_end=503
-  _globals['_LISTOBJECTSREQUEST']._serialized_start=505
-  _globals['_LISTOBJECTSREQUEST']._serialized_end=561
-  _globals['_LISTOBJECTSRESPONSE']._serialized_start=563
-  _globals['_LISTOBJECTSRESPONSE']._serialized_end=633
-  _globals['_DELETEOBJECTREQUEST']._serialized_start=635
-  _globals['_DELETEOBJECTREQUEST']._serialized_end=712
-  _globals['_DELETEOBJECTRESPONSE']._serialized_start=714
-  _globals['_DELETEOBJECTRESPONSE']._serialized_end=753
-  _globals['_OBJECTMETADATA']._serialized_start=756
-  _globals['_OBJECTMETADATA']._serialized_end=978
-  _globals['_LISTUSERBUCKETSREQUEST']._serialized_start=980
-  _globals['_LISTUSERBUCKETSREQUEST']._serialized_end=1019
-  _globals['_LISTUSERBUCKETSRESPONSE']._serialized_start=1021
-  _globals['_LISTUSERBUCKETSRESPONSE']._serialized_end=1091
-  _globals['_BUCKETINFO']._serialized_start=1093
-  _globals['_BUCKETINFO']._serialized_end=1131
-  _globals['_OBJECTSTORAGESERVICE']._serialized_start=1134
-  _globals['_OBJECTSTORAGESERVICE']._serialized_end=1715
+  _globals['_UPLOADOBJECTREQUEST']._serialized_end=266
+  _globals['_UPLOADOBJECTCHUNK']._serialized_start=268
+  _globals['_UPLOADOBJECTCHUNK']._serialized_end=390
+  _globals['_UPLOADOBJECTRESPONSE']._serialized_start=392
+  _globals['_UPLOADOBJECTRESPONSE']._serialized_end=481
+  _globals['_GETOBJECTREQUEST']._serialized_start=483
+  _globals['_GETOBJECTREQUEST']._serialized_end=600
+  _globals['_GETOBJECTRESPONSE']._serialized_start=602
+  _globals['_GETOBJECTRESPONSE']._serialized_end=685
+  _globals['_GETOBJECTCHUNK']._serialized_start=687
+  _globals['_GETOBJECTCHUNK']._serialized_end=767
+  _globals['_LISTOBJECTSREQUEST']._serialized_start=770
+  _globals['_LISTOBJECTSREQUEST']._serialized_end=952
+  _globals['_LISTOBJECTSRESPONSE']._serialized_start=955
+  _globals['_LISTOBJECTSRESPONSE']._serialized_end=1105
+  _globals['_DELETEOBJECTREQUEST']._serialized_start=1107
+  _globals['_DELETEOBJECTREQUEST']._serialized_end=1184
+  _globals['_DELETEOBJECTRESPONSE']._serialized_start=1186
+  _globals['_DELETEOBJECTRESPONSE']._serialized_end=1225
+  _globals['_BATCHGETOBJECTSREQUEST']._serialized_start=1227
+  _globals['_BATCHGETOBJECTSREQUEST']._serialized_end=1308
+  _globals['_BATCHUPLOADITEM']._serialized_start=1310
+  _globals['_BATCHUPLOADITEM']._serialized_end=1394
+  _globals['_BATCHUPLOADOBJECTSREQUEST']._serialized_start=1396
+  _globals['_BATCHUPLOADOBJECTSREQUEST']._serialized_end=1509
+  _globals['_DELETEOBJECTSREQUEST']._serialized_start=1511
+  _globals['_DELETEOBJECTSREQUEST']._serialized_end=1590
+  _globals['_OBJECTRESULT']._serialized_start=1593
+  _globals['_OBJECTRESULT']._serialized_end=1722
+  _globals['_BATCHOBJECTSRESPONSE']._serialized_start=1724
+  _globals['_BATCHOBJECTSRESPONSE']._serialized_end=1793
+  _globals['_OBJECTMETADATA']._serialized_start=1796
+  _globals['_OBJECTMETADATA']._serialized_end=2039
+  _globals['_LISTUSERBUCKETSREQUEST']._serialized_start=2041
+  _globals['_LISTUSERBUCKETSREQUEST']._serialized_end=2080
+  _globals['_LISTUSERBUCKETSRESPONSE']._serialized_start=2082
+  _globals['_LISTUSERBUCKETSRESPONSE']._serialized_end=2152
+  _globals['_BUCKETINFO']._serialized_start=2154
+  _globals['_BUCKETINFO']._serialized_end=2192
+  _globals['_PROFILEREQUEST']._serialized_start=2194
+  _globals['_PROFILEREQUEST']._serialized_end=2306
+  _globals['_PROFILERESPONSE']._serialized_start=2308
+  _globals['_PROFILERESPONSE']._serialized_end=2382
+  _globals['_OBJECTSTORAGESERVICE']._serialized_start=2385
+  _globals['_OBJECTSTORAGESERVICE']._serialized_end=3531
 # @@protoc_insertion_point(module_scope)
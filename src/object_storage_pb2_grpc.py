@@ -24,11 +24,21 @@ class ObjectStorageServiceStub(object):
                 request_serializer=object__storage__pb2.UploadObjectRequest.SerializeToString,
                 response_deserializer=object__storage__pb2.UploadObjectResponse.FromString,
                 )
+        self.UploadObjectStream = channel.stream_unary(
+                '/object_storage.ObjectStorageService/UploadObjectStream',
+                request_serializer=object__storage__pb2.UploadObjectChunk.SerializeToString,
+                response_deserializer=object__storage__pb2.UploadObjectResponse.FromString,
+                )
         self.GetObject = channel.unary_unary(
                 '/object_storage.ObjectStorageService/GetObject',
                 request_serializer=object__storage__pb2.GetObjectRequest.SerializeToString,
                 response_deserializer=object__storage__pb2.GetObjectResponse.FromString,
                 )
+        self.GetObjectStream = channel.unary_stream(
+                '/object_storage.ObjectStorageService/GetObjectStream',
+                request_serializer=object__storage__pb2.GetObjectRequest.SerializeToString,
+                response_deserializer=object__storage__pb2.GetObjectChunk.FromString,
+                )
         self.ListObjects = channel.unary_unary(
                 '/object_storage.ObjectStorageService/ListObjects',
                 request_serializer=object__storage__pb2.ListObjectsRequest.SerializeToString,
@@ -39,11 +49,31 @@ class ObjectStorageServiceStub(object):
                 request_serializer=object__storage__pb2.DeleteObjectRequest.SerializeToString,
                 response_deserializer=object__storage__pb2.DeleteObjectResponse.FromString,
                 )
+        self.BatchGetObjects = channel.unary_unary(
+                '/object_storage.ObjectStorageService/BatchGetObjects',
+                request_serializer=object__storage__pb2.BatchGetObjectsRequest.SerializeToString,
+                response_deserializer=object__storage__pb2.BatchObjectsResponse.FromString,
+                )
+        self.BatchUploadObjects = channel.unary_unary(
+                '/object_storage.ObjectStorageService/BatchUploadObjects',
+                request_serializer=object__storage__pb2.BatchUploadObjectsRequest.SerializeToString,
+                response_deserializer=object__storage__pb2.BatchObjectsResponse.FromString,
+                )
+        self.DeleteObjects = channel.unary_unary(
+                '/object_storage.ObjectStorageService/DeleteObjects',
+                request_serializer=object__storage__pb2.DeleteObjectsRequest.SerializeToString,
+                response_deserializer=object__storage__pb2.BatchObjectsResponse.FromString,
+                )
         self.ListUserBuckets = channel.unary_unary(
                 '/object_storage.ObjectStorageService/ListUserBuckets',
                 request_serializer=object__storage__pb2.ListUserBucketsRequest.SerializeToString,
                 response_deserializer=object__storage__pb2.ListUserBucketsResponse.FromString,
                 )
+        self.Profile = channel.unary_unary(
+                '/object_storage.ObjectStorageService/Profile',
+                request_serializer=object__storage__pb2.ProfileRequest.SerializeToString,
+                response_deserializer=object__storage__pb2.ProfileResponse.FromString,
+                )
 
 
 class ObjectStorageServiceServicer(object):
@@ -61,12 +91,24 @@ class ObjectStorageServiceServicer(object):
         context.set_details('Method not implemented!')
         raise NotImplementedError('Method not implemented!')
 
+    def UploadObjectStream(self, request_iterator, context):
+        """Missing associated documentation comment in .proto file."""
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
     def GetObject(self, request, context):
         """Missing associated documentation comment in .proto file."""
         context.set_code(grpc.StatusCode.UNIMPLEMENTED)
         context.set_details('Method not implemented!')
         raise NotImplementedError('Method not implemented!')
 
+    def GetObjectStream(self, request, context):
+        """Missing associated documentation comment in .proto file."""
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
     def ListObjects(self, request, context):
         """Missing associated documentation comment in .proto file."""
         context.set_code(grpc.StatusCode.UNIMPLEMENTED)
@@ -79,12 +121,36 @@ class ObjectStorageServiceServicer(object):
         context.set_details('Method not implemented!')
         raise NotImplementedError('Method not implemented!')
 
+    def BatchGetObjects(self, request, context):
+        """Missing associated documentation comment in .proto file."""
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def BatchUploadObjects(self, request, context):
+        """Missing associated documentation comment in .proto file."""
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def DeleteObjects(self, request, context):
+        """Missing associated documentation comment in .proto file."""
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
     def ListUserBuckets(self, request, context):
         """Missing associated documentation comment in .proto file."""
         context.set_code(grpc.StatusCode.UNIMPLEMENTED)
         context.set_details('Method not implemented!')
         raise NotImplementedError('Method not implemented!')
 
+    def Profile(self, request, context):
+        """Missing associated documentation comment in .proto file."""
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
 
 def add_ObjectStorageServiceServicer_to_server(servicer, server):
     rpc_method_handlers = {
@@ -98,11 +164,21 @@ def add_ObjectStorageServiceServicer_to_server(servicer, server):
                     request_deserializer=object__storage__pb2.UploadObjectRequest.FromString,
                     response_serializer=object__storage__pb2.UploadObjectResponse.SerializeToString,
             ),
+            'UploadObjectStream': grpc.stream_unary_rpc_method_handler(
+                    servicer.UploadObjectStream,
+                    request_deserializer=object__storage__pb2.UploadObjectChunk.FromString,
+                    response_serializer=object__storage__pb2.UploadObjectResponse.SerializeToString,
+            ),
             'GetObject': grpc.unary_unary_rpc_method_handler(
                     servicer.GetObject,
                     request_deserializer=object__storage__pb2.GetObjectRequest.FromString,
                     response_serializer=object__storage__pb2.GetObjectResponse.SerializeToString,
             ),
+            'GetObjectStream': grpc.unary_stream_rpc_method_handler(
+                    servicer.GetObjectStream,
+                    request_deserializer=object__storage__pb2.GetObjectRequest.FromString,
+                    response_serializer=object__storage__pb2.GetObjectChunk.SerializeToString,
+            ),
             'ListObjects': grpc.unary_unary_rpc_method_handler(
                     servicer.ListObjects,
                     request_deserializer=object__storage__pb2.ListObjectsRequest.FromString,
@@ -113,11 +189,31 @@ def add_ObjectStorageServiceServicer_to_server(servicer, server):
                     request_deserializer=object__storage__pb2.DeleteObjectRequest.FromString,
                     response_serializer=object__storage__pb2.DeleteObjectResponse.SerializeToString,
             ),
+            'BatchGetObjects': grpc.unary_unary_rpc_method_handler(
+                    servicer.BatchGetObjects,
+                    request_deserializer=object__storage__pb2.BatchGetObjectsRequest.FromString,
+                    response_serializer=object__storage__pb2.BatchObjectsResponse.SerializeToString,
+            ),
+            'BatchUploadObjects': grpc.unary_unary_rpc_method_handler(
+                    servicer.BatchUploadObjects,
+                    request_deserializer=object__storage__pb2.BatchUploadObjectsRequest.FromString,
+                    response_serializer=object__storage__pb2.BatchObjectsResponse.SerializeToString,
+            ),
+            'DeleteObjects': grpc.unary_unary_rpc_method_handler(
+                    servicer.DeleteObjects,
+                    request_deserializer=object__storage__pb2.DeleteObjectsRequest.FromString,
+                    response_serializer=object__storage__pb2.BatchObjectsResponse.SerializeToString,
+            ),
             'ListUserBuckets': grpc.unary_unary_rpc_method_handler(
                     servicer.ListUserBuckets,
                     request_deserializer=object__storage__pb2.ListUserBucketsRequest.FromString,
                     response_serializer=object__storage__pb2.ListUserBucketsResponse.SerializeToString,
             ),
+            'Profile': grpc.unary_unary_rpc_method_handler(
+                    servicer.Profile,
+                    request_deserializer=object__storage__pb2.ProfileRequest.FromString,
+                    response_serializer=object__storage__pb2.ProfileResponse.SerializeToString,
+            ),
     }
     generic_handler = grpc.method_handlers_generic_handler(
             'object_storage.ObjectStorageService', rpc_method_handlers)
@@ -162,6 +258,23 @@ class ObjectStorageService(object):
             options, channel_credentials,
             insecure, call_credentials, compression, wait_for_ready, timeout, metadata)
 
+    @staticmethod
+    def UploadObjectStream(request_iterator,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.stream_unary(request_iterator, target, '/object_storage.ObjectStorageService/UploadObjectStream',
+            object__storage__pb2.UploadObjectChunk.SerializeToString,
+            object__storage__pb2.UploadObjectResponse.FromString,
+            options, channel_credentials,
+            insecure, call_credentials, compression, wait_for_ready, timeout, metadata)
+
     @staticmethod
     def GetObject(request,
             target,
@@ -179,6 +292,23 @@ class ObjectStorageService(object):
             options, channel_credentials,
             insecure, call_credentials, compression, wait_for_ready, timeout, metadata)
 
+    @staticmethod
+    def GetObjectStream(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_stream(request, target, '/object_storage.ObjectStorageService/GetObjectStream',
+            object__storage__pb2.GetObjectRequest.SerializeToString,
+            object__storage__pb2.GetObjectChunk.FromString,
+            options, channel_credentials,
+            insecure, call_credentials, compression, wait_for_ready, timeout, metadata)
+
     @staticmethod
     def ListObjects(request,
             target,
@@ -213,6 +343,57 @@ class ObjectStorageService(object):
             options, channel_credentials,
             insecure, call_credentials, compression, wait_for_ready, timeout, metadata)
 
+    @staticmethod
+    def BatchGetObjects(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(request, target, '/object_storage.ObjectStorageService/BatchGetObjects',
+            object__storage__pb2.BatchGetObjectsRequest.SerializeToString,
+            object__storage__pb2.BatchObjectsResponse.FromString,
+            options, channel_credentials,
+            insecure, call_credentials, compression, wait_for_ready, timeout, metadata)
+
+    @staticmethod
+    def BatchUploadObjects(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(request, target, '/object_storage.ObjectStorageService/BatchUploadObjects',
+            object__storage__pb2.BatchUploadObjectsRequest.SerializeToString,
+            object__storage__pb2.BatchObjectsResponse.FromString,
+            options, channel_credentials,
+            insecure, call_credentials, compression, wait_for_ready, timeout, metadata)
+
+    @staticmethod
+    def DeleteObjects(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(request, target, '/object_storage.ObjectStorageService/DeleteObjects',
+            object__storage__pb2.DeleteObjectsRequest.SerializeToString,
+            object__storage__pb2.BatchObjectsResponse.FromString,
+            options, channel_credentials,
+            insecure, call_credentials, compression, wait_for_ready, timeout, metadata)
+
     @staticmethod
     def ListUserBuckets(request,
             target,
@@ -229,3 +410,20 @@ class ObjectStorageService(object):
             object__storage__pb2.ListUserBucketsResponse.FromString,
             options, channel_credentials,
             insecure, call_credentials, compression, wait_for_ready, timeout, metadata)
+
+    @staticmethod
+    def Profile(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(request, target, '/object_storage.ObjectStorageService/Profile',
+            object__storage__pb2.ProfileRequest.SerializeToString,
+            object__storage__pb2.ProfileResponse.FromString,
+            options, channel_credentials,
+            insecure, call_credentials, compression, wait_for_ready, timeout, metadata)
@@ -0,0 +1,198 @@
+import hashlib
+import itertools
+import logging
+import os
+import struct
+import threading
+from collections import Counter, defaultdict
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+from .block_storage import BlockLocator, BlockRef
+from utils.bloom_filter import BloomFilter
+from config import config
+
+logger = logging.getLogger(__name__)
+
+BLOCK_KEY_PREFIX = b"\x00blk:"
+DIGEST_SIZE = 16
+
+def block_digest(block: bytes) -> bytes:
+    return hashlib.blake2b(block, digest_size=DIGEST_SIZE).digest()
+
+def split_digests(packed: bytes) -> List[bytes]:
+    return [packed[offset:offset + DIGEST_SIZE] for offset in range(0, len(packed), DIGEST_SIZE)]
+
+class BlockEntry(NamedTuple):
+    locator: BlockLocator
+    refcount: int
+
+# Blocks whose reference count drops to zero keep their entry, so a concurrent
+# upload can still reuse them, until compaction drops it.
+class BlockIndex:
+    ENTRY_FORMAT = struct.Struct(">QQIQB")  # segment_id, offset, length, refcount, codec
+    UNCOMPRESSED_ENTRY_FORMAT = struct.Struct(">QQIQ")  # entries written before block codecs
+    RESOLVE_BATCH_SIZE = 1024
+
+    def __init__(self, db):
+        self.db = db
+        self.lock = threading.RLock()
+        self._pins = Counter()
+        self.bloom_filter = None
+        self._rebuilding_filter = None
+        self._load_bloom_filter()
+
+    def _load_bloom_filter(self):
+        path = config.BLOOM_FILTER_PATH
+        try:
+            self.bloom_filter = BloomFilter.load(path)
+        except FileNotFoundError:
+            pass
+        except (ValueError, struct.error):
+            logger.warning("Ignoring unreadable Bloom filter snapshot %s", path)
+        if self.bloom_filter is not None:
+            # The snapshot is only trusted once: after a crash it would miss
+            # blocks added since it was taken, so it is rebuilt instead.
+            os.remove(path)
+            return
+        threading.Thread(target=self.rebuild_bloom_filter, name="bloom-filter-rebuild", daemon=True).start()
+
+    def rebuild_bloom_filter(self):
+        entry_count = sum(1 for _ in self.iter_entries())
+        # Leave headroom so the false positive rate holds while the index grows
+        capacity = max(config.BLOOM_FILTER_CAPACITY, 2 * entry_count)
+        with self.lock:
+            self._rebuilding_filter = BloomFilter.for_capacity(capacity, config.BLOOM_FILTER_ERROR_RATE)
+        digests = (digest for digest, _ in self.iter_entries())
+        while True:
+            batch = list(itertools.islice(digests, self.RESOLVE_BATCH_SIZE))
+            if not batch:
+                break
+            with self.lock:
+                self._rebuilding_filter.add_many(batch)
+        with self.lock:
+            self.bloom_filter, self._rebuilding_filter = self._rebuilding_filter, None
+
+    def save_bloom_filter(self):
+        with self.lock:
+            if self.bloom_filter is not None:
+                os.makedirs(os.path.dirname(config.BLOOM_FILTER_PATH), exist_ok=True)
+                self.bloom_filter.save(config.BLOOM_FILTER_PATH)
+
+    def _add_to_bloom_filters(self, digests: List[bytes]):
+        # Blocks committed during a rebuild must land in the new filter too
+        for bloom_filter in (self.bloom_filter, self._rebuilding_filter):
+            if bloom_filter is not None and digests:
+                bloom_filter.add_many(digests)
+
+    @staticmethod
+    def _key(digest: bytes) -> bytes:
+        return BLOCK_KEY_PREFIX + digest
+
+    def _pack(self, entry: BlockEntry) -> bytes:
+        locator = entry.locator
+        return self.ENTRY_FORMAT.pack(locator.segment_id, locator.offset, locator.length, entry.refcount, locator.codec)
+
+    def _unpack(self, value: bytes) -> BlockEntry:
+        if len(value) == self.UNCOMPRESSED_ENTRY_FORMAT.size:
+            segment_id, offset, length, refcount = self.UNCOMPRESSED_ENTRY_FORMAT.unpack(value)
+            return BlockEntry(BlockLocator(segment_id, offset, length), refcount)
+        segment_id, offset, length, refcount, codec = self.ENTRY_FORMAT.unpack(value)
+        return BlockEntry(BlockLocator(segment_id, offset, length, codec), refcount)
+
+    def get(self, digest: bytes) -> Optional[BlockEntry]:
+        value = self.db.get(self._key(digest))
+        return self._unpack(value) if value is not None else None
+
+    def pin_existing(self, digests: List[bytes]) -> List[bool]:
+        # The Bloom filter answers most misses without touching RocksDB; until
+        # it has been rebuilt every lookup goes to RocksDB. The rest are
+        # looked up together.
+        bloom_filter = self.bloom_filter
+        maybe = bloom_filter.check_many(digests) if bloom_filter is not None else [True] * len(digests)
+        candidates = [digest for digest, found in zip(digests, maybe) if found]
+        with self.lock:
+            values = self.db.multi_get([self._key(digest) for digest in candidates]) if candidates else []
+            existing = {digest for digest, value in zip(candidates, values) if value is not None}
+            found = [digest in existing for digest in digests]
+            for digest, exists in zip(digests, found):
+                if exists:
+                    self._pins[digest] += 1
+        return found
+
+    def unpin(self, digests: Iterable[bytes]):
+        with self.lock:
+            for digest in digests:
+                self._pins[digest] -= 1
+                if not self._pins[digest]:
+                    del self._pins[digest]
+
+    def commit(self, batch, added: Iterable[bytes], new_blocks: Dict[bytes, BlockLocator], removed: Iterable[bytes]):
+        deltas = Counter(added)
+        deltas.subtract(removed)
+        with self.lock:
+            created = []
+            for digest, delta in deltas.items():
+                if not delta:
+                    continue
+                entry = self.get(digest)
+                if entry is None:
+                    if digest not in new_blocks:
+                        if delta < 0:
+                            continue
+                        raise RuntimeError(f"Block {digest.hex()} vanished from the block index")
+                    entry = BlockEntry(new_blocks[digest], 0)
+                    created.append(digest)
+                batch.add(self._key(digest), self._pack(BlockEntry(entry.locator, max(entry.refcount + delta, 0))))
+            self._add_to_bloom_filters(created)
+            self.db.write(batch)
+
+    def resolve(self, block_ids: Iterable) -> Iterator[BlockRef]:
+        pending: List[bytes] = []
+
+        def flush():
+            values = self.db.multi_get([self._key(digest) for digest in pending])
+            for digest, value in zip(pending, values):
+                if value is None:
+                    raise FileNotFoundError(f"Block {digest.hex()} is missing from the block index")
+                yield self._unpack(value).locator
+            pending.clear()
+
+        for block_id in block_ids:
+            if isinstance(block_id, str):
+                pending.append(bytes.fromhex(block_id))
+                if len(pending) >= self.RESOLVE_BATCH_SIZE:
+                    yield from flush()
+            else:
+                yield from flush()
+                yield block_id
+        yield from flush()
+
+    def iter_entries(self, after: Optional[bytes] = None) -> Iterator[Tuple[bytes, BlockEntry]]:
+        # In digest order, starting after the given digest if there is one
+        start = BLOCK_KEY_PREFIX if after is None else self._key(after) + b"\x00"
+        for key, value in self.db.iterator(mode='from', key=start):
+            if not key.startswith(BLOCK_KEY_PREFIX):
+                break
+            yield key[len(BLOCK_KEY_PREFIX):], self._unpack(value)
+
+    def live_bytes_per_segment(self) -> Dict[int, int]:
+        live_bytes = defaultdict(int)
+        for digest, entry in self.iter_entries():
+            if entry.refcount or digest in self._pins:
+                live_bytes[entry.locator.segment_id] += entry.locator.length
+        return live_bytes
+
+    def drop_if_unreferenced(self, digest: bytes) -> bool:
+        with self.lock:
+            entry = self.get(digest)
+            if entry is None:
+                return True
+            if entry.refcount or digest in self._pins:
+                return False
+            self.db.delete(self._key(digest))
+            return True
+
+    def relocate(self, digest: bytes, old: BlockLocator, new: BlockLocator):
+        with self.lock:
+            entry = self.get(digest)
+            if entry is not None and entry.locator == old:
+                self.db.set(self._key(digest), self._pack(BlockEntry(new, entry.refcount)))
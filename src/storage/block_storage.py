@@ -1,51 +1,426 @@
+import functools
+import mmap
 import os
-import struct
-from typing import List, Tuple
+import re
+import threading
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple, Union
 from config import config
+from .codecs import CODEC_NONE, decompress_block
+
+IOV_MAX = os.sysconf('SC_IOV_MAX') if 'SC_IOV_MAX' in os.sysconf_names else 1024
+PAGE_SIZE = mmap.PAGESIZE
+
+class BlockLocator(NamedTuple):
+    segment_id: int
+    offset: int
+    length: int
+    codec: int = CODEC_NONE  # the stored bytes are compressed with this codec
+
+    def __str__(self):
+        return f"{self.segment_id:08x}:{self.offset}:{self.length}"
+
+# Objects written before segment files were introduced still reference
+# standalone block files by integer id.
+BlockRef = Union[BlockLocator, int]
+
+class BlockWriter:
+    # Gathers blocks into extents of up to batch_size bytes; each extent is
+    # reserved contiguously in the active segment and written on the I/O pool
+    # with a single pwritev straight from the blocks, with at most
+    # max_inflight extents outstanding. Blocks must stay unmodified until
+    # flush, which returns their locators, in write order, once every extent
+    # is on disk.
+    def __init__(self, storage: 'BlockStorage', batch_size: int, max_inflight: int):
+        self._storage = storage
+        self._batch_size = batch_size
+        self._max_inflight = max_inflight
+        self._blocks = []
+        self._codecs = []
+        self._buffered = 0
+        self._locators: List[BlockLocator] = []
+        self._pending = deque()
+
+    def write(self, block: bytes, codec: int = CODEC_NONE):
+        self._blocks.append(block)
+        self._codecs.append(codec)
+        self._buffered += len(block)
+        if self._buffered >= self._batch_size:
+            self._submit()
+
+    def _submit(self):
+        if not self._blocks:
+            return
+        segment_id, offset = self._storage._reserve(self._buffered)
+        extent_offset = offset
+        for block, codec in zip(self._blocks, self._codecs):
+            self._locators.append(BlockLocator(segment_id, offset, len(block), codec))
+            offset += len(block)
+        while len(self._pending) >= self._max_inflight:
+            self._pending.popleft().result()
+        self._pending.append(self._storage._submit(self._storage._write_at, segment_id, extent_offset, self._blocks))
+        self._blocks = []
+        self._codecs = []
+        self._buffered = 0
+
+    def flush(self) -> List[BlockLocator]:
+        self._submit()
+        while self._pending:
+            self._pending.popleft().result()
+        locators, self._locators = self._locators, []
+        return locators
+
+    def __enter__(self) -> 'BlockWriter':
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        # Never leave writes running behind a failed caller
+        while self._pending:
+            future = self._pending.popleft()
+            if exc_type is None:
+                future.result()
+            else:
+                future.exception()
+
+# Every process appending to the store owns a namespace: the top bits of the
+# segment id, so writers never share a segment. Namespace 0 is the metadata
+# owner and covers segments written before namespaces existed.
+SEGMENT_NAMESPACE_BITS = 24
+
+def segment_namespace(segment_id: int) -> int:
+    return segment_id >> SEGMENT_NAMESPACE_BITS
 
 class BlockStorage:
     BLOCK_SIZE = 4096  # 4 KB blocks
+    SEGMENT_FILE_PATTERN = re.compile(r"^segment_([0-9a-f]{8})$")
 
-    def __init__(self):
+    def __init__(self, namespace: int = 0):
+        self.namespace = namespace
         self.storage_path = config.BLOCK_STORAGE_PATH
+        self.segment_size = config.SEGMENT_SIZE
+        self.io_batch_size = config.BLOCK_IO_BATCH_SIZE
+        self.max_inflight = config.BLOCK_IO_MAX_INFLIGHT
         os.makedirs(self.storage_path, exist_ok=True)
+        # Shared by all requests; each request keeps at most max_inflight
+        # operations queued so a large object cannot starve the others.
+        self._executor = ThreadPoolExecutor(max_workers=config.BLOCK_IO_WORKERS, thread_name_prefix="block-io")
+        self._write_lock = threading.Lock()
+        # Descriptors of segments this process writes; reads go through
+        # read-only mappings, at most max_mappings of them cached
+        self._fds: Dict[int, int] = {}
+        self._fds_lock = threading.Lock()
+        self.max_mappings = config.BLOCK_MMAP_CACHE_SIZE
+        self._mappings: 'OrderedDict[int, mmap.mmap]' = OrderedDict()
+        self._mappings_lock = threading.Lock()
+        self._retired_segments: List[int] = []
+
+        own_segment_ids = [segment_id for segment_id in self.list_segments() if segment_namespace(segment_id) == namespace]
+        self._active_segment_id = own_segment_ids[-1] if own_segment_ids else namespace << SEGMENT_NAMESPACE_BITS
+        self._open_active_segment()
 
     def _get_block_file_path(self, block_id: int) -> str:
         return os.path.join(self.storage_path, f"block_{block_id:08x}")
 
-    def write_blocks(self, data: bytes) -> List[int]:
-        block_ids = []
-        for i in range(0, len(data), self.BLOCK_SIZE):
-            block = data[i:i+self.BLOCK_SIZE]
-            block_id = self._write_block(block)
-            block_ids.append(block_id)
-        return block_ids
-
-    def _write_block(self, block: bytes) -> int:
-        block_id = self._generate_block_id()
-        path = self._get_block_file_path(block_id)
-        with open(path, 'wb') as f:
-            f.write(block)
-        return block_id
-
-    def read_blocks(self, block_ids: List[int]) -> bytes:
-        data = b''
+    def _get_segment_file_path(self, segment_id: int) -> str:
+        return os.path.join(self.storage_path, f"segment_{segment_id:08x}")
+
+    def list_segments(self) -> List[int]:
+        segment_ids = []
+        for name in os.listdir(self.storage_path):
+            match = self.SEGMENT_FILE_PATTERN.match(name)
+            if match:
+                segment_ids.append(int(match.group(1), 16))
+        return sorted(set(segment_ids).difference(self._retired_segments))
+
+    def segment_size_on_disk(self, segment_id: int) -> int:
+        return os.path.getsize(self._get_segment_file_path(segment_id))
+
+    @property
+    def active_segment_id(self) -> int:
+        return self._active_segment_id
+
+    def _open_active_segment(self):
+        fd = os.open(self._get_segment_file_path(self._active_segment_id), os.O_RDWR | os.O_CREAT, 0o644)
+        with self._fds_lock:
+            self._fds[self._active_segment_id] = fd
+        self._active_offset = os.fstat(fd).st_size
+
+    def _roll_segment(self):
+        # The previous segment's descriptor stays cached for reads and for
+        # writes into extents that were reserved before the roll.
+        self._active_segment_id += 1
+        self._open_active_segment()
+
+    def _reserve(self, length: int) -> Tuple[int, int]:
+        with self._write_lock:
+            if self._active_offset and self._active_offset + length > self.segment_size:
+                self._roll_segment()
+            offset = self._active_offset
+            self._active_offset += length
+            return self._active_segment_id, offset
+
+    def _write_at(self, segment_id: int, offset: int, buffers: List[bytes]):
+        fd = self._get_fd(segment_id)
+        index = 0
+        while index < len(buffers):
+            written = os.pwritev(fd, buffers[index:index + IOV_MAX], offset)
+            offset += written
+            # Skip what was written; a short write resumes mid-buffer
+            while index < len(buffers) and written >= len(buffers[index]):
+                written -= len(buffers[index])
+                index += 1
+            if written:
+                buffers[index] = memoryview(buffers[index])[written:]
+
+    def _submit(self, function: Callable, *args):
+        return self._executor.submit(function, *args)
+
+    def _map_ordered(self, function: Callable, items: Iterable) -> Iterator:
+        # Runs up to max_inflight calls ahead on the I/O pool, yielding
+        # results in input order.
+        pending = deque()
+        try:
+            for item in items:
+                if len(pending) >= self.max_inflight:
+                    yield pending.popleft().result()
+                pending.append(self._executor.submit(function, item))
+            while pending:
+                yield pending.popleft().result()
+        finally:
+            for future in pending:
+                future.cancel()
+
+    def writer(self) -> BlockWriter:
+        return BlockWriter(self, self.io_batch_size, self.max_inflight)
+
+    def write_block(self, block: bytes, codec: int = CODEC_NONE) -> BlockLocator:
+        segment_id, offset = self._reserve(len(block))
+        self._write_at(segment_id, offset, [block])
+        return BlockLocator(segment_id, offset, len(block), codec)
+
+    def write_blocks(self, blocks: Iterable[bytes]) -> List[BlockLocator]:
+        with self.writer() as writer:
+            for block in blocks:
+                writer.write(block)
+            return writer.flush()
+
+    def read_blocks(self, block_ids: Iterable[BlockRef]) -> bytes:
+        return b''.join(self.iter_blocks(block_ids))
+
+    def iter_blocks(self, block_ids: Iterable[BlockRef],
+                    leases: Optional[Dict[int, mmap.mmap]] = None) -> Iterator[Union[bytes, memoryview]]:
+        # Yields the decompressed data in order; adjacent blocks are merged
+        # into one read, so pieces do not necessarily match block boundaries.
+        # Uncompressed pieces are views of the segment mapping, not copies.
+        return self._map_ordered(functools.partial(self._read_run, leases=leases), self._coalesce(block_ids))
+
+    def read_objects(self, objects: List[List[BlockRef]]) -> List[bytes]:
+        # Reads several block lists through one window on the I/O pool, so
+        # small objects do not each wait for their own round of reads.
+        runs = [(index, run) for index, block_ids in enumerate(objects) for run in self._coalesce(block_ids)]
+        pieces = [[] for _ in objects]
+        for (index, _), data in zip(runs, self._map_ordered(self._read_run, (run for _, run in runs))):
+            pieces[index].append(data)
+        return [b''.join(object_pieces) for object_pieces in pieces]
+
+    def _coalesce(self, block_ids: Iterable[BlockRef]) -> Iterator[List[BlockRef]]:
+        run = []
+        run_length = 0
         for block_id in block_ids:
-            data += self._read_block(block_id)
-        return data
+            if (
+                run and not isinstance(block_id, int) and not isinstance(run[-1], int)
+                and block_id.segment_id == run[-1].segment_id
+                and block_id.offset == run[-1].offset + run[-1].length
+                and run_length + block_id.length <= self.io_batch_size
+            ):
+                run.append(block_id)
+                run_length += block_id.length
+                continue
+            if run:
+                yield run
+            run = [block_id]
+            run_length = 0 if isinstance(block_id, int) else block_id.length
+        if run:
+            yield run
+
+    def _read_run(self, run: List[BlockRef], leases: Optional[Dict[int, mmap.mmap]] = None) -> Union[bytes, memoryview]:
+        first, last = run[0], run[-1]
+        if isinstance(first, int):
+            return self.read_stored_block(first)
+        # Runs are resolved on the I/O pool ahead of the reader; asking the
+        # kernel to read the pages in now keeps the disk busy meanwhile
+        view = self._view(
+            first.segment_id, first.offset, last.offset + last.length - first.offset, prefetch=True,
+            mapping=leases.get(first.segment_id) if leases else None
+        )
+        if all(locator.codec == CODEC_NONE for locator in run):
+            return view
+        # Compressed blocks are decoded here, on the I/O pool
+        return b''.join(
+            decompress_block(view[locator.offset - first.offset:locator.offset - first.offset + locator.length], locator.codec)
+            for locator in run
+        )
 
-    def _read_block(self, block_id: int) -> bytes:
-        path = self._get_block_file_path(block_id)
-        with open(path, 'rb') as f:
-            return f.read()
+    def read_stream(self, block_ids: Iterable[BlockRef], chunk_size: int) -> Iterator[bytes]:
+        # The segments holding the blocks are mapped up front and the
+        # mappings held until the stream is done: a slow reader can outlast
+        # compaction moving the blocks and unlinking their old segment, in
+        # this process or another, and an unlinked file stays readable while
+        # it is mapped.
+        block_ids = list(block_ids)
+        return self._read_stream(self.iter_blocks(block_ids, self._lease(block_ids)), chunk_size)
 
-    def delete_blocks(self, block_ids: List[int]):
+    def _lease(self, block_ids: List[BlockRef]) -> Dict[int, mmap.mmap]:
+        ends = {}
         for block_id in block_ids:
-            path = self._get_block_file_path(block_id)
-            if os.path.exists(path):
-                os.remove(path)
-
-    def _generate_block_id(self) -> int:
-        # This is a simple implementation. In a production system,
-        # you'd want a more robust method of generating unique IDs.
-        return int.from_bytes(os.urandom(4), byteorder='big')
\ No newline at end of file
+            if not isinstance(block_id, int):
+                ends[block_id.segment_id] = max(ends.get(block_id.segment_id, 0), block_id.offset + block_id.length)
+        return {segment_id: self._mapping(segment_id, end) for segment_id, end in ends.items()}
+
+    def _read_stream(self, blocks: Iterator[Union[bytes, memoryview]], chunk_size: int) -> Iterator[bytes]:
+        # Cuts the data into chunk_size pieces for the wire, each joined
+        # straight from the mapped blocks: the only copy of the data made.
+        parts = []
+        buffered = 0
+        for block in blocks:
+            view = memoryview(block)
+            while buffered + len(view) >= chunk_size:
+                take = chunk_size - buffered
+                parts.append(view[:take])
+                yield b''.join(parts)
+                parts = []
+                buffered = 0
+                view = view[take:]
+            if view:
+                parts.append(view)
+                buffered += len(view)
+        if parts:
+            yield b''.join(parts)
+
+    def read_stored_block(self, block_id: BlockRef) -> Union[bytes, memoryview]:
+        # The bytes as stored, still compressed if the block is
+        if isinstance(block_id, int):
+            with open(self._get_block_file_path(block_id), 'rb') as f:
+                return f.read()
+        return self._view(block_id.segment_id, block_id.offset, block_id.length)
+
+    def _view(self, segment_id: int, offset: int, length: int, prefetch: bool = False,
+              mapping: Optional[mmap.mmap] = None) -> memoryview:
+        end = offset + length
+        if mapping is None:
+            mapping = self._mapping(segment_id, end)
+        if prefetch and length >= PAGE_SIZE:
+            start = offset - offset % PAGE_SIZE
+            mapping.madvise(mmap.MADV_WILLNEED, start, end - start)
+        return memoryview(mapping)[offset:end]
+
+    def _mapping(self, segment_id: int, end: int) -> mmap.mmap:
+        with self._mappings_lock:
+            mapping = self._mappings.get(segment_id)
+            if mapping is not None and len(mapping) >= end:
+                self._mappings.move_to_end(segment_id)
+            else:
+                mapping = None
+        if mapping is None:
+            # Segments only grow while mapped, so one that has grown past its
+            # mapping is simply mapped again
+            mapping = self._map_segment(segment_id)
+            if len(mapping) < end:
+                raise OSError(f"Segment {segment_id:08x} ends before byte {end}")
+        return mapping
+
+    def _map_segment(self, segment_id: int) -> mmap.mmap:
+        fd = os.open(self._get_segment_file_path(segment_id), os.O_RDONLY)
+        try:
+            mapping = mmap.mmap(fd, 0, access=mmap.ACCESS_READ)
+        finally:
+            os.close(fd)
+        with self._mappings_lock:
+            cached = self._mappings.get(segment_id)
+            if cached is None or len(cached) < len(mapping):
+                self._mappings[segment_id] = mapping
+            self._mappings.move_to_end(segment_id)
+            # Evicted mappings are not closed: views handed out may still use
+            # them, and each is unmapped once its last view is gone
+            while len(self._mappings) > self.max_mappings:
+                self._mappings.popitem(last=False)
+        return mapping
+
+    def _get_fd(self, segment_id: int) -> int:
+        with self._fds_lock:
+            fd = self._fds.get(segment_id)
+            if fd is None:
+                fd = os.open(self._get_segment_file_path(segment_id), os.O_RDWR)
+                self._fds[segment_id] = fd
+            return fd
+
+    def delete_blocks(self, block_ids: List[BlockRef]):
+        # Segment space is reclaimed by compaction; only legacy files are unlinked here
+        block_file_ids = [block_id for block_id in block_ids if isinstance(block_id, int)]
+        for _ in self._map_ordered(self._remove_block_file, block_file_ids):
+            pass
+
+    def _remove_block_file(self, block_id: int):
+        try:
+            os.remove(self._get_block_file_path(block_id))
+        except FileNotFoundError:
+            pass
+
+    def truncate_segment(self, segment_id: int, length: int) -> int:
+        # Cuts a segment back to length bytes, returning how many were dropped
+        with self._write_lock:
+            path = self._get_segment_file_path(segment_id)
+            size = os.path.getsize(path)
+            if size <= length:
+                return 0
+            os.truncate(path, length)
+            if segment_id == self._active_segment_id:
+                self._active_offset = min(self._active_offset, length)
+        # A mapping past the end of the file faults when touched there
+        with self._mappings_lock:
+            self._mappings.pop(segment_id, None)
+        return size - length
+
+    def remove_segment(self, segment_id: int):
+        if segment_id == self._active_segment_id:
+            raise ValueError("Cannot remove the active segment")
+        # Unlinked on the next pass, so readers in any process that resolved
+        # locators before the relocation still have a full pass to map it;
+        # streams keep what they mapped (read_stream) for as long as they run.
+        with self._fds_lock:
+            self._retired_segments.append(segment_id)
+
+    def release_retired_segments(self):
+        with self._fds_lock:
+            retired, self._retired_segments = self._retired_segments, []
+        for segment_id in retired:
+            try:
+                os.remove(self._get_segment_file_path(segment_id))
+            except FileNotFoundError:
+                pass
+        # Descriptors and mappings of segments unlinked by this or another
+        # process were kept for readers mid-way through them; they go now.
+        with self._fds_lock:
+            unlinked = [
+                segment_id for segment_id, fd in self._fds.items()
+                if segment_id != self._active_segment_id and os.fstat(fd).st_nlink == 0
+            ]
+            fds = [self._fds.pop(segment_id) for segment_id in unlinked]
+        for fd in fds:
+            os.close(fd)
+        with self._mappings_lock:
+            mapped = list(self._mappings)
+        unmapped = [segment_id for segment_id in mapped if not os.path.exists(self._get_segment_file_path(segment_id))]
+        with self._mappings_lock:
+            for segment_id in unmapped:
+                self._mappings.pop(segment_id, None)
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+        with self._fds_lock:
+            fds, self._fds = list(self._fds.values()), {}
+        for fd in fds:
+            os.close(fd)
+        with self._mappings_lock:
+            self._mappings.clear()
\ No newline at end of file
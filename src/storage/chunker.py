@@ -0,0 +1,217 @@
+import bisect
+import hashlib
+from typing import Iterable, Iterator, List
+from config import config
+from .block_storage import BlockStorage
+
+try:
+    import numpy as np
+except ImportError:  # the pure Python gear hash is used instead
+    np = None
+
+MASK_32 = (1 << 32) - 1
+# The gear table must never change: cut points, and therefore block digests,
+# are derived from it.
+GEAR = [int.from_bytes(hashlib.blake2b(bytes([i]), digest_size=4).digest(), 'big') for i in range(256)]
+GEAR_ARRAY = np.array(GEAR, dtype=np.uint32) if np is not None else None
+
+class Chunker:
+    # split cuts a whole stream at once; a splitter takes the stream chunk by
+    # chunk as it arrives, for callers that are fed rather than pulling.
+    # Each generator a splitter returns must be exhausted before the next call.
+    def split(self, chunks: Iterable[bytes]) -> Iterator[bytes]:
+        splitter = self.splitter()
+        for chunk in chunks:
+            yield from splitter.feed(chunk)
+        yield from splitter.finish()
+
+    def splitter(self):
+        raise NotImplementedError
+
+class FixedSizeChunker(Chunker):
+    def __init__(self, block_size: int):
+        self.block_size = block_size
+
+    def splitter(self) -> '_FixedSizeSplitter':
+        return _FixedSizeSplitter(self.block_size)
+
+class _FixedSizeSplitter:
+    # Blocks are views into the chunks, which must not be modified
+    # afterwards; only a block spanning two chunks is assembled in a buffer
+    # of its own.
+    def __init__(self, block_size: int):
+        self.block_size = block_size
+        self.partial = bytearray()
+
+    def feed(self, chunk: bytes) -> Iterator[bytes]:
+        block_size = self.block_size
+        view = memoryview(chunk)
+        if self.partial:
+            needed = block_size - len(self.partial)
+            self.partial += view[:needed]
+            view = view[needed:]
+            if len(self.partial) < block_size:
+                return
+            block, self.partial = self.partial, bytearray()
+            yield block
+        full = len(view) - len(view) % block_size
+        for offset in range(0, full, block_size):
+            yield view[offset:offset + block_size]
+        self.partial += view[full:]
+
+    def finish(self) -> Iterator[bytes]:
+        if self.partial:
+            yield self.partial
+
+class ContentDefinedChunker(Chunker):
+    # FastCDC-style chunking with a 32-bit gear hash (so a 32-byte window) and
+    # normalized chunk sizes: a stricter mask before avg_size, a looser one after.
+    WINDOW = 32
+
+    def __init__(self, min_size: int, avg_size: int, max_size: int, batch_size: int = 1024 * 1024):
+        if not self.WINDOW <= min_size < avg_size < max_size:
+            raise ValueError("Chunk sizes must satisfy 32 <= min_size < avg_size < max_size")
+        self.min_size = min_size
+        self.avg_size = avg_size
+        self.max_size = max_size
+        self.batch_size = batch_size
+        # Hashing in small windows keeps the working arrays in cache; each
+        # window still holds several max-size chunks so little is rehashed.
+        self.hash_window = 4 * max_size
+        bits = avg_size.bit_length() - 1
+        self.mask_s = self._top_bits_mask(bits + 2)
+        self.mask_l = self._top_bits_mask(bits - 2)
+
+    @staticmethod
+    def _top_bits_mask(bits: int) -> int:
+        return ((1 << bits) - 1) << (32 - bits)
+
+    def splitter(self) -> '_ContentDefinedSplitter':
+        return _ContentDefinedSplitter(self)
+
+    @staticmethod
+    def _join(tail, pending: List[bytes]) -> bytes:
+        if not tail and len(pending) == 1:
+            return pending[0]
+        return b''.join([tail, *pending])
+
+    def _split_buffer(self, buffer: bytes, final: bool):
+        start = 0
+        view = memoryview(buffer)
+        while len(buffer) - start >= self.hash_window or (final and start < len(buffer)):
+            window = view[start:start + self.hash_window]
+            cuts = self.cut_points(window, final=final and start + self.hash_window >= len(buffer))
+            previous = 0
+            for end in cuts:
+                yield window[previous:end]
+                previous = end
+            start += previous
+        return start
+
+    def cut_points(self, data, final: bool) -> List[int]:
+        # Returns chunk end offsets. Unless final, the trailing bytes whose cut
+        # could still depend on data not seen yet are left unassigned.
+        if np is not None:
+            return self._cut_points_vectorized(data, final)
+        return self._cut_points_python(data, final)
+
+    def _cut_points_vectorized(self, data, final: bool) -> List[int]:
+        n = len(data)
+        if not n:
+            return []
+        hashes = GEAR_ARRAY[np.frombuffer(data, dtype=np.uint8)]
+        # h[i] = sum(GEAR[data[i - j]] << j for j < 32), built by doubling the window
+        width = 1
+        while width < self.WINDOW:
+            shifted = hashes[:-width] << np.uint32(width)
+            hashes[width:] += shifted
+            width *= 2
+        # mask_l is a subset of mask_s, so small-chunk cuts are filtered from the large ones
+        positions = np.flatnonzero((hashes & np.uint32(self.mask_l)) == 0)
+        candidates_l = (positions + 1).tolist()
+        candidates_s = (positions[(hashes[positions] & np.uint32(self.mask_s)) == 0] + 1).tolist()
+
+        cuts = []
+        start = 0
+        while start < n:
+            end = self._first_candidate(candidates_s, start + self.min_size, min(start + self.avg_size, n))
+            if end is None and start + self.avg_size < n:
+                end = self._first_candidate(candidates_l, start + self.avg_size + 1, min(start + self.max_size, n))
+            if end is None:
+                if start + self.max_size <= n:
+                    end = start + self.max_size
+                elif final:
+                    end = n
+                else:
+                    break
+            cuts.append(end)
+            start = end
+        return cuts
+
+    @staticmethod
+    def _first_candidate(candidates: List[int], low: int, high: int):
+        index = bisect.bisect_left(candidates, low)
+        if index < len(candidates) and candidates[index] <= high:
+            return candidates[index]
+        return None
+
+    def _cut_points_python(self, data, final: bool) -> List[int]:
+        n = len(data)
+        cuts = []
+        start = 0
+        while start < n:
+            end = None
+            h = 0
+            # Bytes more than a window before the first possible cut cannot affect it
+            i = start + self.min_size - self.WINDOW
+            limit = min(start + self.max_size, n)
+            while i < limit:
+                h = ((h << 1) + GEAR[data[i]]) & MASK_32
+                i += 1
+                length = i - start
+                if length >= self.min_size:
+                    mask = self.mask_s if length <= self.avg_size else self.mask_l
+                    if not h & mask:
+                        end = i
+                        break
+            if end is None:
+                if start + self.max_size <= n:
+                    end = start + self.max_size
+                elif final:
+                    end = n
+                else:
+                    break
+            cuts.append(end)
+            start = end
+        return cuts
+
+class _ContentDefinedSplitter:
+    # Chunks are gathered into batches of at least batch_size bytes; a batch
+    # is copied once, when it has to be joined with the previous batch's
+    # unassigned tail or with other chunks, and blocks are views into it.
+    def __init__(self, chunker: ContentDefinedChunker):
+        self.chunker = chunker
+        self.tail = b''
+        self.pending = []
+        self.pending_size = 0
+
+    def feed(self, chunk: bytes) -> Iterator[bytes]:
+        self.pending.append(chunk)
+        self.pending_size += len(chunk)
+        if self.pending_size >= self.chunker.batch_size:
+            data = self.chunker._join(self.tail, self.pending)
+            self.pending = []
+            self.pending_size = 0
+            consumed = yield from self.chunker._split_buffer(data, final=False)
+            self.tail = memoryview(data)[consumed:]
+
+    def finish(self) -> Iterator[bytes]:
+        yield from self.chunker._split_buffer(self.chunker._join(self.tail, self.pending), final=True)
+
+def get_chunker(bucket_name: str) -> Chunker:
+    mode = config.BUCKET_CHUNKING_MODES.get(bucket_name, config.CHUNKING_MODE)
+    if mode == 'fixed':
+        return FixedSizeChunker(BlockStorage.BLOCK_SIZE)
+    if mode == 'cdc':
+        return ContentDefinedChunker(config.CDC_MIN_SIZE, config.CDC_AVG_SIZE, config.CDC_MAX_SIZE)
+    raise ValueError(f"Unknown chunking mode: {mode}")
@@ -0,0 +1,105 @@
+import threading
+import zlib
+from functools import partial
+from typing import Callable, Dict, NamedTuple, Optional, Tuple
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+try:
+    import lz4.block
+except ImportError:
+    lz4 = None
+
+# Codec ids are stored with every block in the block index, so they must never
+# be reused. Levels share an id: decompression does not depend on them.
+CODEC_NONE = 0
+CODEC_ZLIB = 1
+CODEC_ZSTD = 2
+CODEC_LZ4 = 3
+
+class Codec(NamedTuple):
+    name: str
+    codec_id: int
+    compress: Callable[[bytes], bytes]
+
+CODECS: Dict[str, Codec] = {}
+DECOMPRESSORS: Dict[int, Callable[[bytes], bytes]] = {}
+
+def register_codec(codec: Codec, decompress: Callable[[bytes], bytes]):
+    CODECS[codec.name] = codec
+    DECOMPRESSORS[codec.codec_id] = decompress
+
+for _level in (1, 6, 9):
+    register_codec(Codec(f"zlib-{_level}", CODEC_ZLIB, partial(zlib.compress, level=_level)), zlib.decompress)
+
+if zstandard is not None:
+    # Compression contexts are not thread-safe; each I/O thread keeps its own
+    _zstd_local = threading.local()
+
+    def _zstd_compressor(level: int):
+        compressors = _zstd_local.__dict__.setdefault('compressors', {})
+        if level not in compressors:
+            compressors[level] = zstandard.ZstdCompressor(level=level)
+        return compressors[level]
+
+    def _zstd_decompress(data: bytes) -> bytes:
+        if not hasattr(_zstd_local, 'decompressor'):
+            _zstd_local.decompressor = zstandard.ZstdDecompressor()
+        return _zstd_local.decompressor.decompress(data)
+
+    for _level in (1, 3, 9):
+        register_codec(
+            Codec(f"zstd-{_level}", CODEC_ZSTD, lambda data, level=_level: _zstd_compressor(level).compress(data)),
+            _zstd_decompress
+        )
+
+if lz4 is not None:
+    register_codec(Codec("lz4", CODEC_LZ4, lz4.block.compress), lz4.block.decompress)
+
+def get_codec(name: str) -> Optional[Codec]:
+    # 'auto' is the fastest codec available; 'none' stores blocks as they are
+    if name == 'none':
+        return None
+    if name == 'auto':
+        name = next(candidate for candidate in ('lz4', 'zstd-1', 'zlib-1') if candidate in CODECS)
+    try:
+        return CODECS[name]
+    except KeyError:
+        raise ValueError(f"Unknown or unavailable compression codec '{name}'") from None
+
+def decompress_block(data: bytes, codec_id: int) -> bytes:
+    if codec_id == CODEC_NONE:
+        return data
+    decompress = DECOMPRESSORS.get(codec_id)
+    if decompress is None:
+        raise RuntimeError(f"Block was compressed with codec {codec_id}, which is not installed")
+    return decompress(data)
+
+class BlockCompressor:
+    # Compresses blocks independently and keeps a block as it is unless
+    # compression saves at least min_savings of it. After a block that does
+    # not, the following blocks are stored without trying, for a stretch that
+    # doubles with every further miss up to MAX_SKIP, so incompressible data
+    # costs an occasional sample rather than a compression per block.
+    MAX_SKIP = 64
+
+    def __init__(self, codec: Codec, min_savings: float):
+        self.codec = codec
+        self.min_savings = min_savings
+        self._skip = 0
+        self._backoff = 1
+
+    def compress(self, block: bytes) -> Tuple[bytes, int]:
+        if self._skip:
+            self._skip -= 1
+            return block, CODEC_NONE
+        compressed = self.codec.compress(block)
+        if len(compressed) <= len(block) * (1 - self.min_savings):
+            self._backoff = 1
+            return compressed, self.codec.codec_id
+        self._skip = self._backoff
+        self._backoff = min(self._backoff * 2, self.MAX_SKIP)
+        return block, CODEC_NONE
\ No newline at end of file
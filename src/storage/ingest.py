@@ -0,0 +1,30 @@
+import hashlib
+from typing import Iterable, Iterator
+from utils import metrics
+
+class IngestPipeline:
+    # A single pass over an upload: hashes and counts the original bytes and
+    # cuts them into blocks. Nothing is buffered beyond what the chunker needs,
+    # and blocks are views into the chunks wherever the chunker allows it.
+    # Compression happens later, per block, so it is skipped for blocks that
+    # are already stored.
+    # The data is either pulled through blocks or pushed with feed and
+    # finish, not both.
+    def __init__(self, chunker):
+        self.splitter = chunker.splitter()
+        self.md5 = hashlib.md5()
+        self.size = 0
+
+    def blocks(self, chunks: Iterable[bytes]) -> Iterator[bytes]:
+        for chunk in chunks:
+            yield from self.feed(chunk)
+        yield from self.finish()
+
+    def feed(self, chunk: bytes) -> Iterator[bytes]:
+        with metrics.stage('hash'):
+            self.md5.update(chunk)
+        self.size += len(chunk)
+        return self.splitter.feed(chunk)
+
+    def finish(self) -> Iterator[bytes]:
+        return self.splitter.finish()
\ No newline at end of file
@@ -0,0 +1,63 @@
+import json
+import struct
+import threading
+from typing import Any, Dict, List, NamedTuple
+
+INTENT_KEY_PREFIX = b"\x00intent:"
+INTENT_ID = struct.Struct(">Q")
+
+# Kinds of pending work
+UPLOAD = 'upload'  # blocks are being appended to segments of a namespace from segment_id on
+FREE = 'free'  # legacy block files whose object record is gone, still to be unlinked
+
+class Intent(NamedTuple):
+    intent_id: int
+    kind: str
+    details: Dict[str, Any]
+
+# Work that spans the block files and RocksDB is recorded here first. An
+# intent is written before the work starts and deleted in the same batch
+# that makes its outcome durable, so whatever is left at startup was
+# interrupted and is rolled back or finished by recovery.
+class IntentLog:
+    def __init__(self, db):
+        self.db = db
+        self._lock = threading.Lock()
+        pending = self.pending()
+        self._next_id = pending[-1].intent_id + 1 if pending else 1
+
+    @staticmethod
+    def _key(intent_id: int) -> bytes:
+        return INTENT_KEY_PREFIX + INTENT_ID.pack(intent_id)
+
+    def _allocate(self) -> int:
+        with self._lock:
+            intent_id = self._next_id
+            self._next_id += 1
+            return intent_id
+
+    def begin(self, kind: str, batch=None, **details) -> int:
+        # Written on its own unless a batch is given, in which case it takes
+        # effect together with the rest of the batch
+        intent_id = self._allocate()
+        value = json.dumps({'kind': kind, **details}).encode()
+        if batch is None:
+            self.db.set(self._key(intent_id), value)
+        else:
+            batch.add(self._key(intent_id), value)
+        return intent_id
+
+    def complete(self, intent_id: int, batch=None):
+        if batch is None:
+            self.db.delete(self._key(intent_id))
+        else:
+            batch.delete(self._key(intent_id))
+
+    def pending(self) -> List[Intent]:
+        intents = []
+        for key, value in self.db.iterator(mode='from', key=INTENT_KEY_PREFIX):
+            if not key.startswith(INTENT_KEY_PREFIX):
+                break
+            details = json.loads(value)
+            intents.append(Intent(INTENT_ID.unpack(key[len(INTENT_KEY_PREFIX):])[0], details.pop('kind'), details))
+        return intents
\ No newline at end of file
@@ -0,0 +1,178 @@
+import json
+import struct
+import sys
+from array import array
+from datetime import datetime, timedelta
+from typing import List, Optional, Tuple
+from .models import BlockDigests, ObjectMetadata
+from .block_storage import BlockLocator
+
+# Binary layout (version 1). A fixed big-endian header
+#   version:B flags:B size:q created_at:q modified_at:q
+#   lengths of object_key, bucket_name, md5_hash, mime_type, owner_id, version
+#   and extras:7I (version is 0xFFFFFFFF when None)
+#   block_kind:B block_count:I
+# is followed by the utf-8 strings, the extras JSON (acl, user_metadata, parts,
+# replication_info, codec; None values omitted) and the packed block ids: digests as
+# 16 raw bytes each, legacy integer block ids as little-endian array('Q').
+# Summary records use block_kind 2: the ids live in a separate manifest record
+# (block_kind:B block_count:I + packed ids) and block_count is informational.
+# Manifests may end with the original size of every block, for range reads:
+# sizes_kind:B followed by block_size:I last_block_size:I when all blocks but
+# the last have one size, or by the sizes as little-endian array('I').
+# Timestamps are ns since the naive epoch, matching the naive datetimes used
+# throughout. Records written before this format are JSON and start with '{'.
+FORMAT_VERSION = 1
+HEADER = struct.Struct(">BBqqq7IBI")
+NONE_LENGTH = 0xFFFFFFFF
+FLAG_COMPRESSED = 1
+FLAG_ENCRYPTED = 2
+BLOCKS_DIGESTS = 0
+BLOCKS_LEGACY_IDS = 1
+BLOCKS_IN_MANIFEST = 2
+MANIFEST_HEADER = struct.Struct(">BI")
+SIZES_HEADER = struct.Struct(">B")
+SIZES_UNIFORM = 1
+SIZES_LISTED = 2
+UNIFORM_SIZES = struct.Struct(">II")
+DIGEST_SIZE = 16
+EPOCH = datetime(1970, 1, 1)
+EXTRA_FIELDS = ('acl', 'user_metadata', 'parts', 'replication_info', 'codec')
+RETIRED_FIELDS = ('content_md5',)  # still in some records, no longer read
+
+def _timestamp_to_ns(value: datetime) -> int:
+    return (value - EPOCH) // timedelta(microseconds=1) * 1000
+
+def _ns_to_timestamp(value: int) -> datetime:
+    return EPOCH + timedelta(microseconds=value // 1000)
+
+def _encode_block_ids(block_ids: List) -> Tuple[int, bytes]:
+    if isinstance(block_ids, BlockDigests):
+        return BLOCKS_DIGESTS, block_ids.packed
+    if all(isinstance(block_id, str) for block_id in block_ids):
+        return BLOCKS_DIGESTS, bytes.fromhex(''.join(block_ids))
+    if all(isinstance(block_id, int) for block_id in block_ids):
+        ids = array('Q', block_ids)
+        if sys.byteorder == 'big':
+            ids.byteswap()
+        return BLOCKS_LEGACY_IDS, ids.tobytes()
+    raise ValueError("Block ids must be all digests or all legacy integer ids")
+
+def _decode_block_ids(kind: int, count: int, packed: bytes) -> List:
+    if kind == BLOCKS_IN_MANIFEST:
+        return None
+    if not count:
+        return []
+    if kind == BLOCKS_DIGESTS:
+        return packed.hex(' ', DIGEST_SIZE).split(' ')
+    ids = array('Q')
+    ids.frombytes(packed)
+    if sys.byteorder == 'big':
+        ids.byteswap()
+    return ids.tolist()
+
+def encode_metadata(metadata: ObjectMetadata, with_blocks: bool = True) -> bytes:
+    flags = (FLAG_COMPRESSED if metadata.is_compressed else 0) | (FLAG_ENCRYPTED if metadata.is_encrypted else 0)
+    strings = [
+        value.encode('utf-8') for value in (
+            metadata.object_key, metadata.bucket_name, metadata.md5_hash,
+            metadata.mime_type, str(metadata.owner_id), metadata.version or ''
+        )
+    ]
+    extras = {field: getattr(metadata, field) for field in EXTRA_FIELDS if getattr(metadata, field) is not None}
+    strings.append(json.dumps(extras).encode() if extras else b'')
+    lengths = [len(value) for value in strings]
+    if metadata.version is None:
+        lengths[5] = NONE_LENGTH
+    block_ids = metadata.block_ids or []
+    if with_blocks:
+        block_kind, packed_blocks = _encode_block_ids(block_ids)
+    else:
+        block_kind, packed_blocks = BLOCKS_IN_MANIFEST, b''
+    header = HEADER.pack(
+        FORMAT_VERSION, flags, metadata.size,
+        _timestamp_to_ns(metadata.created_at), _timestamp_to_ns(metadata.modified_at),
+        *lengths, block_kind, len(block_ids)
+    )
+    return b''.join((header, *strings, packed_blocks))
+
+def decode_metadata(data: bytes) -> ObjectMetadata:
+    if data[:1] == b'{':
+        return _decode_json_metadata(data)
+
+    (version, flags, size, created_at, modified_at, *lengths, block_kind, block_count) = HEADER.unpack_from(data)
+    if version != FORMAT_VERSION:
+        raise ValueError(f"Unsupported metadata format version {version}")
+    fields = []
+    offset = HEADER.size
+    for length in lengths:
+        if length == NONE_LENGTH:
+            fields.append(None)
+            continue
+        fields.append(data[offset:offset + length])
+        offset += length
+    object_key, bucket_name, md5_hash, mime_type, owner_id, object_version, extras = fields
+    extras = json.loads(extras) if extras else {}
+    for name in RETIRED_FIELDS:
+        extras.pop(name, None)
+
+    return ObjectMetadata(
+        object_key=object_key.decode('utf-8'),
+        bucket_name=bucket_name.decode('utf-8'),
+        size=size,
+        md5_hash=md5_hash.decode('utf-8'),
+        mime_type=mime_type.decode('utf-8'),
+        created_at=_ns_to_timestamp(created_at),
+        modified_at=_ns_to_timestamp(modified_at),
+        owner_id=owner_id.decode('utf-8'),
+        version=object_version.decode('utf-8') if object_version is not None else None,
+        is_compressed=bool(flags & FLAG_COMPRESSED),
+        is_encrypted=bool(flags & FLAG_ENCRYPTED),
+        block_ids=_decode_block_ids(block_kind, block_count, data[offset:]),
+        **extras
+    )
+
+def encode_summary(metadata: ObjectMetadata) -> bytes:
+    return encode_metadata(metadata, with_blocks=False)
+
+def _encode_block_sizes(block_sizes: List[int]) -> bytes:
+    if len(set(block_sizes[:-1])) <= 1:
+        return SIZES_HEADER.pack(SIZES_UNIFORM) + UNIFORM_SIZES.pack(block_sizes[0], block_sizes[-1])
+    sizes = array('I', block_sizes)
+    if sys.byteorder == 'big':
+        sizes.byteswap()
+    return SIZES_HEADER.pack(SIZES_LISTED) + sizes.tobytes()
+
+def _decode_block_sizes(count: int, packed: bytes) -> List[int]:
+    sizes_kind, = SIZES_HEADER.unpack_from(packed)
+    if sizes_kind == SIZES_UNIFORM:
+        block_size, last_block_size = UNIFORM_SIZES.unpack_from(packed, SIZES_HEADER.size)
+        return [block_size] * (count - 1) + [last_block_size]
+    sizes = array('I')
+    sizes.frombytes(packed[SIZES_HEADER.size:])
+    if sys.byteorder == 'big':
+        sizes.byteswap()
+    return sizes.tolist()
+
+def encode_manifest(block_ids: List, block_sizes: Optional[List[int]] = None) -> bytes:
+    block_kind, packed_blocks = _encode_block_ids(block_ids)
+    packed_sizes = _encode_block_sizes(block_sizes) if block_sizes else b''
+    return b''.join((MANIFEST_HEADER.pack(block_kind, len(block_ids)), packed_blocks, packed_sizes))
+
+def decode_manifest(data: bytes) -> Tuple[List, Optional[List[int]]]:
+    block_kind, block_count = MANIFEST_HEADER.unpack_from(data)
+    ids_end = MANIFEST_HEADER.size + block_count * (DIGEST_SIZE if block_kind == BLOCKS_DIGESTS else 8)
+    block_ids = _decode_block_ids(block_kind, block_count, data[MANIFEST_HEADER.size:ids_end])
+    block_sizes = _decode_block_sizes(block_count, data[ids_end:]) if len(data) > ids_end else None
+    return block_ids, block_sizes
+
+def _decode_json_metadata(data: bytes) -> ObjectMetadata:
+    metadata_dict = json.loads(data)
+    metadata_dict['created_at'] = datetime.fromisoformat(metadata_dict['created_at'])
+    metadata_dict['modified_at'] = datetime.fromisoformat(metadata_dict['modified_at'])
+    # Records from before segment files were content addressed store locators as lists
+    metadata_dict['block_ids'] = [
+        BlockLocator(*block_id) if isinstance(block_id, list) else block_id
+        for block_id in metadata_dict['block_ids']
+    ]
+    return ObjectMetadata(**metadata_dict)
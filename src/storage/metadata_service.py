@@ -0,0 +1,36 @@
+import os
+import threading
+import time
+from multiprocessing.managers import BaseManager
+from .metadata_store import MetadataStore
+
+# Serves one MetadataStore to the worker processes over a Unix socket. RocksDB
+# allows a single writer, and block reference counts need one owner anyway,
+# so workers send it their metadata calls while reading and writing segment
+# files themselves.
+class MetadataManager(BaseManager):
+    pass
+
+def start_metadata_service(store: MetadataStore, address: str, authkey: bytes):
+    if os.path.exists(address):
+        os.remove(address)
+    MetadataManager.register('get_store', callable=lambda: store)
+    server = MetadataManager(address=address, authkey=authkey).get_server()
+    # serve_forever exits the interpreter when stopped, so it gets a thread
+    # of its own rather than the caller's.
+    threading.Thread(target=server.serve_forever, name="metadata-service", daemon=True).start()
+    return server
+
+def connect_metadata_service(address: str, authkey: bytes, timeout: float = 30.0):
+    MetadataManager.register('get_store')
+    manager = MetadataManager(address=address, authkey=authkey)
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            manager.connect()
+            break
+        except (FileNotFoundError, ConnectionRefusedError):
+            if time.monotonic() >= deadline:
+                raise
+            time.sleep(0.1)
+    return manager.get_store()
\ No newline at end of file
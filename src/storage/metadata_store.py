@@ -0,0 +1,633 @@
+import base64
+import binascii
+import logging
+import os
+import struct
+import threading
+from bisect import bisect_left, bisect_right
+from collections import Counter
+from itertools import accumulate, islice
+from typing import Dict, List, Optional, Tuple
+from .models import BlockDigests, ListObjectsResult, ObjectMetadata
+from .block_storage import BlockLocator, BlockRef, BlockStorage, BlockWriter, segment_namespace
+from .block_index import BlockIndex, block_digest, split_digests
+from .intent_log import FREE, UPLOAD, IntentLog
+from .metadata_codec import decode_manifest, decode_metadata, encode_manifest, encode_summary
+from .metadata_writer import MetadataUpdate, MetadataWriter
+from utils.background import start_periodic_task
+from utils.rate_limiter import RateLimiter
+import rocksdbpy
+from config import config
+
+logger = logging.getLogger(__name__)
+
+# One RocksDB keyspace, split by key prefix: object summaries under
+# "bucket:key", and everything else under prefixes starting with a zero byte,
+# which bucket names cannot: manifests, the block index (block_index.py),
+# intents (intent_log.py), the block references of open uploads and format
+# metadata. A bucket's summaries are
+# contiguous, so listing it only reads the files covering its range.
+FORMAT_VERSION_KEY = b"\x00meta:format_version"
+FORMAT_VERSION = 2
+MANIFEST_KEY_PREFIX = b"\x00man:"
+UPLOAD_REFS_KEY_PREFIX = b"\x00uref:"  # + intent id + sequence number: packed digests
+UPLOAD_REFS_KEY_FORMAT = struct.Struct(">QQ")
+
+def rocksdb_options() -> rocksdbpy.Option:
+    opts = rocksdbpy.Option()
+    opts.create_if_missing(True)
+    if config.ROCKSDB_BLOCK_CACHE_MB:
+        # Block cache, plus whole key bloom filters on table files and
+        # memtables, so lookups of absent keys mostly skip reading blocks
+        opts.optimize_for_point_lookup(config.ROCKSDB_BLOCK_CACHE_MB)
+    for name, value in config.ROCKSDB_OPTIONS.items():
+        setter = getattr(opts, f"set_{name}", None)
+        if setter is None:
+            raise ValueError(f"Unknown RocksDB option: {name}")
+        setter(value)
+    return opts
+
+def check_range(metadata: ObjectMetadata, start: int, length: int) -> Tuple[int, int]:
+    # Records from before block codecs that are one gzip stream store the
+    # compressed size, so their ranges are left for the reader to check
+    # against the data as it decompresses.
+    if metadata.is_compressed and metadata.codec is None:
+        if start < 0 or length < 0:
+            raise ValueError("Range start and length must not be negative")
+        return start, length
+    return clamp_range(metadata.size, start, length)
+
+def clamp_range(size: int, start: int, length: int) -> Tuple[int, int]:
+    # A length of 0 reads to the end of the object
+    if start < 0 or length < 0:
+        raise ValueError("Range start and length must not be negative")
+    if start > size:
+        raise ValueError(f"Range starts at {start}, beyond the end of the object ({size} bytes)")
+    if not length or start + length > size:
+        length = size - start
+    return start, length
+
+def block_range(metadata: ObjectMetadata, start: int, length: int) -> Tuple[int, int, int]:
+    # The blocks [first, end) covering the range, and the offset of the range
+    # within the first. Without block sizes every block is needed.
+    if metadata.block_sizes is None:
+        return 0, len(metadata.block_ids), start
+    offsets = list(accumulate(metadata.block_sizes, initial=0))
+    first = max(bisect_right(offsets, start) - 1, 0)
+    end = bisect_left(offsets, start + length, first)
+    return first, max(end, first), start - offsets[first]
+
+def _block_digests(metadata: ObjectMetadata) -> List[bytes]:
+    if isinstance(metadata.block_ids, BlockDigests):
+        return split_digests(metadata.block_ids.packed)
+    return [bytes.fromhex(block_id) for block_id in metadata.block_ids or [] if isinstance(block_id, str)]
+
+def _sync_writes(bucket_name: str) -> bool:
+    durability = config.BUCKET_METADATA_DURABILITY.get(bucket_name, config.METADATA_DURABILITY)
+    if durability not in ('sync', 'async'):
+        raise ValueError(f"Unknown metadata durability: {durability}")
+    return durability == 'sync'
+
+class _CommitGroup:
+    # What the updates of a group commit have staged so far. Records written
+    # or deleted by earlier updates of the group are seen by later ones.
+    def __init__(self, records: Dict[bytes, Optional[ObjectMetadata]]):
+        self.batch = rocksdbpy.WriteBatch()
+        self.records = records
+        self.added: List[bytes] = []
+        self.released: List[bytes] = []
+        self.new_blocks: Dict[bytes, BlockLocator] = {}
+        self.dropped: List[ObjectMetadata] = []  # removed records, whose legacy block files go too
+        self.uploads: List[int] = []  # upload intents completed by the group
+
+    def replace(self, metadata_key: bytes, metadata: Optional[ObjectMetadata]) -> Optional[ObjectMetadata]:
+        previous = self.records.get(metadata_key)
+        if previous is not None:
+            self.released.extend(_block_digests(previous))
+            self.dropped.append(previous)
+        self.records[metadata_key] = metadata
+        return previous
+
+# Everything kept in RocksDB: object records, the block index and the
+# compaction of the segments it points into. Calls take and return plain
+# values so that worker processes can reach a single instance through the
+# metadata service.
+class MetadataStore:
+    RELOCATION_BATCH_SIZE = 256
+
+    def __init__(self, block_storage: BlockStorage):
+        self.db_path = config.ROCKSDB_PATH
+        self.db = rocksdbpy.open(self.db_path, rocksdb_options())
+        self.block_storage = block_storage
+        self.block_index = BlockIndex(self.db)
+        self._compaction_lock = threading.Lock()
+        self._inflight_segments = Counter()
+        self._upload_segments: Dict[int, int] = {}  # open upload intents and the segment each pins
+        self._committed_uploads = set()
+        self._upload_refs: Dict[int, List[bytes]] = {}  # keys of the references each open upload took so far
+        self._upload_pins: Dict[int, Counter] = {}  # blocks each open upload holds pinned
+        self._inflight_lock = threading.Lock()
+        self._relocation_limiter = RateLimiter(config.COMPACTION_MAX_BYTES_PER_SECOND)
+        self._gc_cursor = None
+        self._closed = False
+        self.intents = IntentLog(self.db)
+        self.writer = MetadataWriter(self._write_group, config.METADATA_COMMIT_LINGER, config.METADATA_COMMIT_MAX_UPDATES)
+        self._synced_wals = set()
+        self._migrate()
+        self.recover(block_storage.namespace)
+
+    @staticmethod
+    def _metadata_key(bucket_name: str, object_key: str) -> bytes:
+        return f"{bucket_name}:{object_key}".encode()
+
+    @staticmethod
+    def _manifest_key(metadata_key: bytes) -> bytes:
+        return MANIFEST_KEY_PREFIX + metadata_key
+
+    def get_metadata(self, bucket_name: str, object_key: str, with_blocks: bool = True) -> ObjectMetadata:
+        metadata_key = self._metadata_key(bucket_name, object_key)
+        if with_blocks:
+            value, manifest = self.db.multi_get([metadata_key, self._manifest_key(metadata_key)])
+        else:
+            value, manifest = self.db.get(metadata_key), None
+
+        if value is None:
+            raise FileNotFoundError(f"Object {object_key} not found in bucket {bucket_name}")
+        return self._decode_record(value, manifest)
+
+    def _get_many(self, bucket_name: str, object_keys: List[str]) -> List[Optional[ObjectMetadata]]:
+        return self._get_records([self._metadata_key(bucket_name, object_key) for object_key in object_keys])
+
+    def _get_records(self, metadata_keys: List[bytes]) -> List[Optional[ObjectMetadata]]:
+        # Records and manifests of all the objects in one multi_get
+        values = self.db.multi_get(metadata_keys + [self._manifest_key(key) for key in metadata_keys])
+        return [
+            self._decode_record(value, manifest) if value is not None else None
+            for value, manifest in zip(values[:len(metadata_keys)], values[len(metadata_keys):])
+        ]
+
+    @staticmethod
+    def _decode_record(value: bytes, manifest: Optional[bytes]) -> ObjectMetadata:
+        metadata = decode_metadata(value)
+        if metadata.block_ids is None and manifest is not None:
+            metadata.block_ids, metadata.block_sizes = decode_manifest(manifest)
+        return metadata
+
+    def locate_object(self, bucket_name: str, object_key: str) -> Tuple[ObjectMetadata, List[BlockRef]]:
+        metadata = self.get_metadata(bucket_name, object_key)
+        return metadata, self.resolve_blocks(metadata.block_ids)
+
+    def resolve_blocks(self, block_ids: List) -> List[BlockRef]:
+        return list(self.block_index.resolve(block_ids))
+
+    def locate_objects(self, bucket_name: str, object_keys: List[str]) -> List[Optional[Tuple[ObjectMetadata, List[BlockRef]]]]:
+        # None for objects that do not exist; the blocks of all the others are
+        # resolved in one pass over the block index.
+        found = [metadata for metadata in self._get_many(bucket_name, object_keys) if metadata is not None]
+        locators = iter(self.block_index.resolve(block_id for metadata in found for block_id in metadata.block_ids))
+        located = {
+            metadata.object_key: (metadata, list(islice(locators, len(metadata.block_ids))))
+            for metadata in found
+        }
+        return [located.get(object_key) for object_key in object_keys]
+
+    def locate_range(self, bucket_name: str, object_key: str, start: int,
+                     length: int) -> Tuple[ObjectMetadata, List[BlockRef], int, int]:
+        # Resolves only the blocks covering the range; returns them with the
+        # offset of the range within the first one and the clamped length.
+        metadata = self.get_metadata(bucket_name, object_key)
+        start, length = check_range(metadata, start, length)
+        first, end, skip = block_range(metadata, start, length)
+        return metadata, list(self.block_index.resolve(metadata.block_ids[first:end])), skip, length
+
+    def _save_metadata(self, metadata: ObjectMetadata, batch):
+        metadata_key = self._metadata_key(metadata.bucket_name, metadata.object_key)
+        batch.add(metadata_key, encode_summary(metadata))
+        batch.add(self._manifest_key(metadata_key), encode_manifest(metadata.block_ids, metadata.block_sizes))
+
+    def pin_existing_blocks(self, intent_id: int, digests: List[bytes]) -> List[bool]:
+        # Pins are held for an open upload, so that ending it releases any
+        # its process did not, having died say
+        found = self.block_index.pin_existing(digests)
+        pinned = [digest for digest, exists in zip(digests, found) if exists]
+        with self._inflight_lock:
+            pins = self._upload_pins.get(intent_id)
+            if pins is not None:
+                pins.update(pinned)
+        if pins is None:
+            self.block_index.unpin(pinned)
+            raise RuntimeError(f"Upload {intent_id} is not open")
+        return found
+
+    def unpin_blocks(self, intent_id: int, digests: List[bytes]):
+        with self._inflight_lock:
+            pins = self._upload_pins.get(intent_id)
+            if pins is None:
+                return  # released when the upload ended
+            for digest in digests:
+                pins[digest] -= 1
+                if not pins[digest]:
+                    del pins[digest]
+        self.block_index.unpin(digests)
+
+    def reference_blocks(self, intent_id: int, digests: bytes, new_blocks: Dict[bytes, BlockLocator]):
+        # Takes the block references of part of a large upload ahead of its
+        # commit, so the upload need not keep every block's bookkeeping until
+        # then. The packed digests are recorded under the upload intent: the
+        # commit deletes the record, ending the intent otherwise releases the
+        # references.
+        with self._inflight_lock:
+            refs = self._upload_refs.setdefault(intent_id, [])
+            key = UPLOAD_REFS_KEY_PREFIX + UPLOAD_REFS_KEY_FORMAT.pack(intent_id, len(refs))
+            refs.append(key)
+        batch = rocksdbpy.WriteBatch()
+        batch.add(key, digests)
+        self.block_index.commit(batch, split_digests(digests), new_blocks, [])
+
+    def commit_object(self, metadata: ObjectMetadata, digests: bytes, new_blocks: Dict[bytes, BlockLocator],
+                      intent_id: Optional[int] = None):
+        self.commit_objects([metadata], digests, new_blocks, intent_id)
+
+    def commit_objects(self, objects: List[ObjectMetadata], digests: bytes, new_blocks: Dict[bytes, BlockLocator],
+                       intent_id: Optional[int] = None):
+        # The object records, the block references not taken yet (packed
+        # digests, one per block occurrence), the release of the objects they
+        # replace and the end of the upload intent are written in one batch,
+        # together with concurrent commits and deletes. A key given twice
+        # keeps its last object.
+        metadata_keys = [self._metadata_key(metadata.bucket_name, metadata.object_key) for metadata in objects]
+        added = split_digests(digests)
+        with self._inflight_lock:
+            upload_refs = list(self._upload_refs.get(intent_id, ()))
+
+        def apply(group: _CommitGroup):
+            for metadata_key, metadata in zip(metadata_keys, objects):
+                group.replace(metadata_key, metadata)
+                self._save_metadata(metadata, group.batch)
+            group.added.extend(added)
+            group.new_blocks.update(new_blocks)
+            if intent_id is not None:
+                self.intents.complete(intent_id, group.batch)
+                for key in upload_refs:
+                    group.batch.delete(key)
+                group.uploads.append(intent_id)
+
+        sync = any(_sync_writes(metadata.bucket_name) for metadata in objects)
+        self.writer.submit(MetadataUpdate(metadata_keys, apply, sync))
+
+    def _write_group(self, updates: List[MetadataUpdate]):
+        # Stages the updates in order and writes them as one batch. An update
+        # that cannot be staged fails alone: the group is staged again
+        # without it.
+        with self.block_index.lock:
+            while updates:
+                metadata_keys = list(dict.fromkeys(key for update in updates for key in update.keys))
+                group = _CommitGroup(dict(zip(metadata_keys, self._get_records(metadata_keys))))
+                failed = None
+                for update in updates:
+                    try:
+                        update.result = update.apply(group)
+                    except Exception as e:
+                        update.error = failed = e
+                        break
+                if failed is None:
+                    break
+                updates = [update for update in updates if update.error is None]
+            if not updates:
+                return
+            free_intent, block_files = self._log_free(group.batch, group.dropped)
+            self.block_index.commit(group.batch, group.added, group.new_blocks, group.released)
+            if any(update.sync for update in updates):
+                self._sync_wal()
+        if group.uploads:
+            with self._inflight_lock:
+                self._committed_uploads.update(group.uploads)
+        self._free_block_files(free_intent, block_files)
+
+    def _sync_wal(self):
+        # rocksdbpy does not expose WriteOptions.sync. RocksDB hands each
+        # write to the OS before returning, so syncing the live WAL files
+        # afterwards gives the same guarantee; the directory is synced too
+        # when a WAL file appeared since the last time.
+        wal_names = {name for name in os.listdir(self.db_path) if name.endswith('.log')}
+        for name in wal_names:
+            try:
+                fd = os.open(os.path.join(self.db_path, name), os.O_RDONLY)
+            except FileNotFoundError:
+                continue  # obsolete and deleted meanwhile
+            try:
+                os.fdatasync(fd)
+            finally:
+                os.close(fd)
+        if wal_names - self._synced_wals:
+            fd = os.open(self.db_path, os.O_RDONLY)
+            try:
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+        self._synced_wals = wal_names
+
+    def _log_free(self, batch, records: List[ObjectMetadata]) -> Tuple[Optional[int], List[int]]:
+        # Legacy block files are unlinked once the batch dropping their
+        # records is written; the intent has recovery finish the job.
+        block_files = [block_id for metadata in records for block_id in metadata.block_ids or [] if isinstance(block_id, int)]
+        if not block_files:
+            return None, []
+        return self.intents.begin(FREE, batch, block_files=block_files), block_files
+
+    def _free_block_files(self, intent_id: Optional[int], block_files: List[int]):
+        if intent_id is None:
+            return
+        self.block_storage.delete_blocks(block_files)
+        self.intents.complete(intent_id)
+
+    def list_objects(self, bucket_name: str, prefix: str = "", delimiter: str = "", start_after: str = "",
+                     continuation_token: str = "", max_keys: int = 0, include_block_ids: bool = False) -> ListObjectsResult:
+        if not 0 < max_keys <= config.LIST_MAX_KEYS:
+            max_keys = config.LIST_MAX_KEYS
+        # Keys at or below `after` have been returned already; a common prefix
+        # is resumed from prefix + b"\xff", which sorts after all its keys
+        # because 0xff never occurs in utf-8.
+        after = self._decode_continuation_token(continuation_token) if continuation_token else start_after.encode()
+        base = self._metadata_key(bucket_name, "")
+        key_prefix = base + prefix.encode()
+
+        objects = []
+        common_prefixes = []
+        is_truncated = False
+        position = base + max(prefix.encode(), after)
+        while position is not None:
+            seek, position = position, None
+            for key, value in self.db.iterator(mode='from', key=seek):
+                if not key.startswith(key_prefix):
+                    break
+                object_key = key[len(base):]
+                if object_key <= after:
+                    continue
+                if len(objects) + len(common_prefixes) >= max_keys:
+                    is_truncated = True
+                    break
+                if delimiter:
+                    name = object_key.decode()
+                    index = name.find(delimiter, len(prefix))
+                    if index >= 0:
+                        common_prefix = name[:index + len(delimiter)]
+                        common_prefixes.append(common_prefix)
+                        after = common_prefix.encode() + b"\xff"
+                        position = base + after
+                        break
+                objects.append(decode_metadata(value))
+                after = object_key
+
+        if include_block_ids:
+            missing = [metadata for metadata in objects if metadata.block_ids is None]
+            manifests = self.db.multi_get([
+                self._manifest_key(self._metadata_key(metadata.bucket_name, metadata.object_key))
+                for metadata in missing
+            ]) if missing else []
+            for metadata, manifest in zip(missing, manifests):
+                metadata.block_ids, metadata.block_sizes = decode_manifest(manifest) if manifest is not None else ([], None)
+
+        return ListObjectsResult(
+            objects=objects,
+            common_prefixes=common_prefixes,
+            is_truncated=is_truncated,
+            next_continuation_token=base64.urlsafe_b64encode(after).decode() if is_truncated else ""
+        )
+
+    @staticmethod
+    def _decode_continuation_token(token: str) -> bytes:
+        try:
+            return base64.b64decode(token.encode(), altchars=b"-_", validate=True)
+        except (ValueError, binascii.Error):
+            raise ValueError("Invalid continuation token")
+
+    def delete_object(self, bucket_name: str, object_key: str) -> ObjectMetadata:
+        metadata, = self.delete_objects(bucket_name, [object_key])
+        if metadata is None:
+            raise FileNotFoundError(f"Object {object_key} not found in bucket {bucket_name}")
+        return metadata
+
+    def delete_objects(self, bucket_name: str, object_keys: List[str]) -> List[Optional[ObjectMetadata]]:
+        # None for objects that do not exist. Metadata is deleted and block
+        # references released in one batch, like commits.
+        unique_keys = list(dict.fromkeys(object_keys))
+        metadata_keys = [self._metadata_key(bucket_name, object_key) for object_key in unique_keys]
+
+        def apply(group: _CommitGroup) -> List[Optional[ObjectMetadata]]:
+            deleted = []
+            for metadata_key in metadata_keys:
+                metadata = group.replace(metadata_key, None)
+                if metadata is not None:
+                    group.batch.delete(metadata_key)
+                    group.batch.delete(self._manifest_key(metadata_key))
+                deleted.append(metadata)
+            return deleted
+
+        deleted = self.writer.submit(MetadataUpdate(metadata_keys, apply, _sync_writes(bucket_name)))
+        deleted = dict(zip(unique_keys, deleted))
+        return [deleted[object_key] for object_key in object_keys]
+
+    def begin_upload(self, segment_id: int) -> int:
+        # From segment_id on, the uploading namespace appends blocks that are
+        # not yet referenced by metadata: its segments must not be compacted
+        # away underneath the upload, and after a crash recovery cuts off
+        # what the upload left behind.
+        intent_id = self.intents.begin(UPLOAD, namespace=segment_namespace(segment_id), segment_id=segment_id)
+        with self._inflight_lock:
+            self._inflight_segments[segment_id] += 1
+            self._upload_segments[intent_id] = segment_id
+            self._upload_pins[intent_id] = Counter()
+        return intent_id
+
+    def end_upload(self, intent_id: int):
+        # After the commit, or instead of it if the upload failed, in which
+        # case the references it took are released and its blocks are left
+        # to compaction. Either way pins it still holds are released.
+        with self._inflight_lock:
+            segment_id = self._upload_segments.pop(intent_id, None)
+            if segment_id is not None:
+                self._inflight_segments[segment_id] -= 1
+                if not self._inflight_segments[segment_id]:
+                    del self._inflight_segments[segment_id]
+            refs = self._upload_refs.pop(intent_id, [])
+            pins = self._upload_pins.pop(intent_id, None)
+            committed = intent_id in self._committed_uploads
+            self._committed_uploads.discard(intent_id)
+        if pins:
+            self.block_index.unpin(list(pins.elements()))
+        if committed:
+            return
+        for key in refs:
+            self._release_upload_refs(key)
+        self.intents.complete(intent_id)
+
+    def _release_upload_refs(self, key: bytes):
+        with self.block_index.lock:
+            digests = self.db.get(key)
+            if digests is None:
+                return
+            batch = rocksdbpy.WriteBatch()
+            batch.delete(key)
+            self.block_index.commit(batch, [], {}, split_digests(digests))
+
+    def _stored_upload_refs(self, intent_id: int) -> List[bytes]:
+        prefix = UPLOAD_REFS_KEY_PREFIX + UPLOAD_REFS_KEY_FORMAT.pack(intent_id, 0)[:8]
+        keys = []
+        for key, _ in self.db.iterator(mode='from', key=prefix):
+            if not key.startswith(prefix):
+                break
+            keys.append(key)
+        return keys
+
+    def recover(self, namespace: int):
+        # Deals with the intents left by the last process that wrote to this
+        # namespace. Must run before the namespace's segments are reopened for
+        # appending; the owner's namespace also finishes interrupted frees.
+        pending = self.intents.pending()
+        if namespace == 0:
+            for intent in pending:
+                if intent.kind == FREE:
+                    self._free_block_files(intent.intent_id, intent.details['block_files'])
+        uploads = [intent for intent in pending if intent.kind == UPLOAD and intent.details['namespace'] == namespace]
+        if not uploads:
+            return
+        truncated = self._truncate_orphaned_tail(namespace, min(intent.details['segment_id'] for intent in uploads))
+        for intent in uploads:
+            # Releases the references the upload took before it died, and
+            # the pins this process still holds for it if it was a worker's
+            with self._inflight_lock:
+                self._upload_refs[intent.intent_id] = self._stored_upload_refs(intent.intent_id)
+            self.end_upload(intent.intent_id)
+        logger.warning(
+            "Recovered %d interrupted uploads in segment namespace %d, truncating %d orphaned bytes",
+            len(uploads), namespace, truncated
+        )
+
+    def _truncate_orphaned_tail(self, namespace: int, first_segment_id: int) -> int:
+        # Blocks past the last one in the block index were never committed;
+        # in the newest segment they are cut off, elsewhere compaction takes
+        # care of them.
+        segment_ids = [segment_id for segment_id in self.block_storage.list_segments() if segment_namespace(segment_id) == namespace]
+        if not segment_ids or segment_ids[-1] < first_segment_id:
+            return 0
+        newest = segment_ids[-1]
+        live_end = max((
+            entry.locator.offset + entry.locator.length
+            for _, entry in self.block_index.iter_entries() if entry.locator.segment_id == newest
+        ), default=0)
+        return self.block_storage.truncate_segment(newest, live_end)
+
+    def collect_garbage(self) -> int:
+        # One step of the background sweep over the block index: drops the
+        # next entries that no object references any more, so compaction can
+        # reclaim their space. Returns the number of entries dropped.
+        scanned = 0
+        dropped = 0
+        last_digest = None
+        for digest, entry in self.block_index.iter_entries(after=self._gc_cursor):
+            if scanned >= config.GC_BATCH_SIZE:
+                break
+            scanned += 1
+            last_digest = digest
+            if not entry.refcount and self.block_index.drop_if_unreferenced(digest):
+                dropped += 1
+        # Start over once the sweep reaches the end of the index
+        self._gc_cursor = last_digest if scanned >= config.GC_BATCH_SIZE else None
+        return dropped
+
+    def compact_segments(self) -> int:
+        with self._compaction_lock:
+            self.block_storage.release_retired_segments()
+
+            segment_ids = self.block_storage.list_segments()
+            # In every namespace the newest segment may still be appended to,
+            # and so may any segment from the first pinned one onwards.
+            first_pinned = {}
+            for segment_id in segment_ids + [self.block_storage.active_segment_id]:
+                first_pinned[segment_namespace(segment_id)] = segment_id
+            with self._inflight_lock:
+                for segment_id in self._inflight_segments:
+                    namespace = segment_namespace(segment_id)
+                    first_pinned[namespace] = min(first_pinned.get(namespace, segment_id), segment_id)
+
+            live_bytes = self.block_index.live_bytes_per_segment()
+
+            candidates = {}
+            for segment_id in segment_ids:
+                if segment_id >= first_pinned[segment_namespace(segment_id)]:
+                    continue
+                size = self.block_storage.segment_size_on_disk(segment_id)
+                if live_bytes[segment_id] < size * config.SEGMENT_COMPACTION_THRESHOLD:
+                    candidates[segment_id] = size - live_bytes[segment_id]
+            if not candidates:
+                return 0
+
+            relocated = []
+            with self.block_storage.writer() as writer:
+                for digest, entry in self.block_index.iter_entries():
+                    if entry.locator.segment_id not in candidates:
+                        continue
+                    if not entry.refcount and self.block_index.drop_if_unreferenced(digest):
+                        continue
+                    self._relocation_limiter.acquire(entry.locator.length)
+                    relocated.append((digest, entry.locator))
+                    # Copied as stored; the new locator keeps the codec
+                    writer.write(self.block_storage.read_stored_block(entry.locator), entry.locator.codec)
+                    if len(relocated) >= self.RELOCATION_BATCH_SIZE:
+                        self._publish_relocations(writer, relocated)
+                self._publish_relocations(writer, relocated)
+
+            for segment_id in candidates:
+                self.block_storage.remove_segment(segment_id)
+            return sum(candidates.values())
+
+    def _publish_relocations(self, writer: BlockWriter, relocated: List[Tuple[bytes, BlockLocator]]):
+        # Copies must be readable before the index points at them
+        for (digest, old), new in zip(relocated, writer.flush()):
+            self.block_index.relocate(digest, old, new)
+        relocated.clear()
+
+    def _migrate(self):
+        version = self.db.get(FORMAT_VERSION_KEY)
+        if version is not None and int(version) >= FORMAT_VERSION:
+            return
+
+        # Version 1 replaced segment locators in object records with content
+        # addressed block ids, indexing the blocks where they already are.
+        # Version 2 moved block lists out of object records into manifests.
+        for key, value in self.db.iterator():
+            if key.startswith(b"\x00"):
+                continue
+            metadata = decode_metadata(value)
+            if metadata.block_ids is None:
+                continue
+            added = []
+            new_blocks = {}
+            for i, block_id in enumerate(metadata.block_ids):
+                if isinstance(block_id, BlockLocator):
+                    digest = block_digest(self.block_storage.read_blocks([block_id]))
+                    new_blocks.setdefault(digest, block_id)
+                    added.append(digest)
+                    metadata.block_ids[i] = digest.hex()
+            batch = rocksdbpy.WriteBatch()
+            self._save_metadata(metadata, batch)
+            self.block_index.commit(batch, added, new_blocks, [])
+
+        self.db.set(FORMAT_VERSION_KEY, str(FORMAT_VERSION).encode())
+
+    def start_background_compaction(self, interval: float):
+        start_periodic_task("block-gc", config.GC_INTERVAL, self.collect_garbage)
+        start_periodic_task("segment-compaction", interval, self.compact_segments)
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        self.block_index.save_bloom_filter()
+        self.db.close()
+
+    def __del__(self):
+        if not getattr(self, '_closed', True):
+            self._closed = True
+            self.db.close()
\ No newline at end of file
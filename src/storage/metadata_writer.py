@@ -0,0 +1,65 @@
+import threading
+import time
+from typing import Any, Callable, Iterable, List, Optional
+
+class MetadataUpdate:
+    # One caller's part of a group commit. keys are the metadata keys it
+    # reads and writes; apply stages its writes into the group and returns
+    # what the caller gets back once the group is written.
+    def __init__(self, keys: Iterable[bytes], apply: Callable[[Any], Any], sync: bool = False):
+        self.keys = list(keys)
+        self.apply = apply
+        self.sync = sync
+        self.done = False
+        self.result = None
+        self.error: Optional[BaseException] = None
+
+class MetadataWriter:
+    # Group commit: updates submitted by concurrent callers queue up, and
+    # whichever caller finds no write in progress becomes the leader. It
+    # lingers briefly for company, then writes up to max_updates queued
+    # updates in one go through write_group, while the others wait for
+    # their result. The next waiting caller then leads the following group.
+    def __init__(self, write_group: Callable[[List[MetadataUpdate]], None], linger: float, max_updates: int):
+        self._write_group = write_group
+        self.linger = linger
+        self.max_updates = max(1, max_updates)
+        self._queue: List[MetadataUpdate] = []
+        self._writing = False
+        self._cond = threading.Condition()
+
+    def submit(self, update: MetadataUpdate) -> Any:
+        with self._cond:
+            self._queue.append(update)
+        while True:
+            with self._cond:
+                while self._writing and not update.done:
+                    self._cond.wait()
+                if update.done:
+                    break
+                self._writing = True
+            self._lead()
+        if update.error is not None:
+            raise update.error
+        return update.result
+
+    def _lead(self):
+        group = []
+        try:
+            if self.linger:
+                time.sleep(self.linger)
+            with self._cond:
+                group = self._queue[:self.max_updates]
+                del self._queue[:len(group)]
+            try:
+                self._write_group(group)
+            except Exception as e:
+                for update in group:
+                    if update.error is None:
+                        update.error = e
+        finally:
+            with self._cond:
+                for update in group:
+                    update.done = True
+                self._writing = False
+                self._cond.notify_all()
\ No newline at end of file
@@ -1,8 +1,47 @@
+from collections.abc import Sequence
 from dataclasses import dataclass
 from datetime import datetime
 from typing import Dict, List, Optional
 import hashlib
 
+class BlockDigests(Sequence):
+    # Block ids as packed 16 byte digests, read as the hex strings decoded
+    # records hold, so that an upload of millions of blocks keeps no string
+    # per block
+    DIGEST_SIZE = 16
+
+    def __init__(self, packed: bytes = b''):
+        self.packed = bytes(packed)
+
+    def __len__(self) -> int:
+        return len(self.packed) // self.DIGEST_SIZE
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(len(self))
+            if step != 1:
+                return [self[i] for i in range(start, stop, step)]
+            return BlockDigests(self.packed[start * self.DIGEST_SIZE:max(start, stop) * self.DIGEST_SIZE])
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("block index out of range")
+        return self.packed[index * self.DIGEST_SIZE:(index + 1) * self.DIGEST_SIZE].hex()
+
+    def __iter__(self):
+        for offset in range(0, len(self.packed), self.DIGEST_SIZE):
+            yield self.packed[offset:offset + self.DIGEST_SIZE].hex()
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, BlockDigests):
+            return self.packed == other.packed
+        return isinstance(other, list) and list(self) == other
+
+    __hash__ = None
+
+    def __repr__(self) -> str:
+        return f"BlockDigests({len(self)} blocks)"
+
 @dataclass
 class ObjectMetadata:
     object_key: str
@@ -20,9 +59,19 @@ class ObjectMetadata:
     parts: List[Dict[str, any]] = None
     is_encrypted: bool = False
     replication_info: Dict[str, any] = None
-    block_ids: List[int] = None
+    block_ids: List[str] = None  # hex block digests (or BlockDigests); legacy objects hold int block file ids
+    codec: Optional[str] = None  # set when blocks are compressed individually; md5_hash and size are then of the original data
+    block_sizes: List[int] = None  # original size of each block, for range reads; None for older objects
     
 
+@dataclass
+class ListObjectsResult:
+    objects: List[ObjectMetadata]
+    common_prefixes: List[str]
+    is_truncated: bool = False
+    next_continuation_token: str = ""
+
+
 @dataclass
 class StorageObject:
     metadata: ObjectMetadata
@@ -1,109 +1,512 @@
-import json
-from typing import List, Dict
-from .models import ObjectMetadata, StorageObject
-from .block_storage import BlockStorage
-from utils.file_utils import calculate_md5, compress_data, decompress_data
-from utils.bloom_filter import BloomFilter
+import itertools
+import logging
+import sys
+import threading
+from array import array
+from contextlib import ExitStack, contextmanager
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+from .models import BlockDigests, ListObjectsResult, ObjectMetadata, StorageObject
+from .block_storage import BlockLocator, BlockRef, BlockStorage
+from .block_index import block_digest
+from .chunker import get_chunker
+from .codecs import CODEC_NONE, BlockCompressor, Codec, get_codec
+from .ingest import IngestPipeline
+from .metadata_store import MetadataStore, block_range, check_range, clamp_range
+from utils import metrics
+from utils.background import start_periodic_task
+from utils.cache import SizedLRUCache
+from utils.file_utils import decompress_data, decompress_stream
 from datetime import datetime
-import rocksdbpy
-import os
 from config import config
 
-class ObjectStorage:
-    def __init__(self):
-        opts = rocksdbpy.Option()
-        opts.create_if_missing(True)
-        self.db = rocksdbpy.open(config.ROCKSDB_PATH, opts)
-        self.block_storage = BlockStorage()
-        self.chunk_bloom_filter = BloomFilter(1000000, 7)
-
-    def upload_file(self, bucket_name: str, object_key: str, data: bytes, owner_id: str, compress: bool = False) -> StorageObject:
-        if compress:
-            data = compress_data(data)
-
-        block_ids = self.block_storage.write_blocks(data)
-
-        for block_id in block_ids:
-            if not self.chunk_bloom_filter.check(block_id):
-                # Block might not exist in the filter, add it
-                self.chunk_bloom_filter.add(block_id)
-
-        metadata = ObjectMetadata(
-            object_key=object_key,
+logger = logging.getLogger(__name__)
+
+def _metadata_size(metadata: ObjectMetadata) -> int:
+    # Rough in-memory footprint of a decoded record and its block list
+    return 1024 + 100 * len(metadata.block_ids or [])
+
+def _slice_stream(chunks: Iterable[bytes], skip: int, length: int) -> Iterator[bytes]:
+    # Drops the first skip bytes and stops after length more
+    for chunk in chunks:
+        if skip >= len(chunk):
+            skip -= len(chunk)
+            continue
+        if skip or len(chunk) - skip > length:
+            chunk = chunk[skip:skip + length]
+            skip = 0
+        if chunk:
+            yield chunk
+        length -= len(chunk)
+        if not length:
+            return
+
+def _skip_to(chunks: Iterator[bytes], start: int) -> Iterator[bytes]:
+    # Drops the first start bytes right away, so that a range starting past
+    # the end fails before anything is returned
+    skipped = 0
+    for chunk in chunks:
+        if skipped + len(chunk) > start:
+            return itertools.chain([chunk[start - skipped:]], chunks)
+        skipped += len(chunk)
+    if skipped < start:
+        raise ValueError(f"Range starts at {start}, beyond the end of the object ({skipped} bytes)")
+    return iter(())
+
+class BatchLimitExceeded(Exception):
+    # A batch get left the object out rather than read it: the object or
+    # what came before it in the batch is too large
+    pass
+
+def _block_codec(compress: bool, codec: str) -> Optional[Codec]:
+    # Naming a codec implies compression; compress alone uses the default
+    return get_codec(codec or (config.DEFAULT_CODEC if compress else 'none'))
+
+class _Upload:
+    # An object being uploaded: its data, codec and the blocks stored so far,
+    # packed, as a large upload runs to millions of blocks
+    def __init__(self, bucket_name: str, object_key: str, chunks: Iterable[bytes], block_codec: Optional[Codec]):
+        self.object_key = object_key
+        self.chunks = chunks
+        self.codec = block_codec
+        self.compressor = BlockCompressor(block_codec, config.COMPRESSION_MIN_SAVINGS) if block_codec else None
+        self.pipeline = IngestPipeline(get_chunker(bucket_name))
+        self.digests = bytearray()
+        self.block_sizes = array('I')
+
+    def blocks(self) -> Iterator[bytes]:
+        return self.pipeline.blocks(self.chunks)
+
+    def compress(self, block: bytes) -> Tuple[bytes, int]:
+        if self.compressor is None:
+            return block, CODEC_NONE
+        return self.compressor.compress(block)
+
+    def metadata(self, bucket_name: str, owner_id: str) -> ObjectMetadata:
+        return ObjectMetadata(
+            object_key=self.object_key,
             bucket_name=bucket_name,
-            size=len(data),
-            md5_hash=calculate_md5(data),
+            size=self.pipeline.size,
+            md5_hash=self.pipeline.md5.hexdigest(),
             mime_type="application/octet-stream",
             created_at=datetime.now(),
             modified_at=datetime.now(),
             owner_id=owner_id,
             acl={"owner": "FULL_CONTROL"},
-            is_compressed=compress,
-            block_ids=block_ids
+            is_compressed=self.codec is not None,
+            block_ids=BlockDigests(self.digests),
+            codec=self.codec.name if self.codec else None,
+            block_sizes=self.block_sizes
         )
 
-        storage_object = StorageObject(metadata=metadata, data=data)
-        self._save_metadata(storage_object.metadata)
+class _UploadSession:
+    # Stores the blocks of one or more uploads under an upload intent: new
+    # blocks are compressed and written, blocks already stored are pinned
+    # until they are referenced. Blocks are referenced a window at a time
+    # ahead of the commit, which takes the last window, so the bookkeeping
+    # kept here does not grow with the upload. Leaving it releases the pins,
+    # waits for the writes and ends the intent, committed or not.
+    def __init__(self, storage: 'ObjectStorage'):
+        self.storage = storage
+        self.window = bytearray()  # packed digests of the blocks not referenced yet
+        self.window_bytes = 0
+        self.new_digests = {}  # ordered, matching the locators returned by the writer
+        self.reused = set()
+        with ExitStack() as stack:
+            self.intent_id = stack.enter_context(storage._upload_intent())
+            self.writer = stack.enter_context(storage.block_storage.writer())
+            stack.callback(self._unpin)
+            self._stack = stack.pop_all()
 
-        return storage_object
+    def add(self, blocks: Iterable[Tuple[_Upload, bytes]]):
+        for batch in self.storage._batched(blocks):
+            with metrics.stage('hash'):
+                block_digests = [block_digest(block) for _, block in batch]
+            lookups = list(dict.fromkeys(
+                digest for digest in block_digests if digest not in self.new_digests and digest not in self.reused
+            ))
+            if lookups:
+                with metrics.stage('rocksdb_get'):
+                    found = self.storage.metadata.pin_existing_blocks(self.intent_id, lookups)
+                self.reused.update(digest for digest, exists in zip(lookups, found) if exists)
+            unstored = []
+            for (upload, block), digest in zip(batch, block_digests):
+                upload.digests += digest
+                upload.block_sizes.append(len(block))
+                self.window += digest
+                self.window_bytes += len(block)
+                if digest in self.new_digests or digest in self.reused:
+                    continue
+                self.new_digests[digest] = None
+                unstored.append((upload, block))
+            # Timed per batch rather than per block, which can be a few KB
+            with metrics.stage('compress'):
+                unstored = [upload.compress(block) for upload, block in unstored]
+            with metrics.stage('block_write'):
+                for block, codec in unstored:
+                    self.writer.write(block, codec)
+            if self.window_bytes >= config.UPLOAD_WINDOW_BYTES:
+                self._reference_window()
 
-    def get_object(self, bucket_name: str, object_key: str) -> StorageObject:
-        metadata = self._get_metadata(bucket_name, object_key)
+    def _flush(self) -> Dict[bytes, BlockLocator]:
+        with metrics.stage('block_write'):
+            return dict(zip(self.new_digests, self.writer.flush()))
 
-        data = self.block_storage.read_blocks(metadata.block_ids)
+    def _reference_window(self):
+        new_blocks = self._flush()
+        with metrics.stage('rocksdb_put'):
+            self.storage.metadata.reference_blocks(self.intent_id, bytes(self.window), new_blocks)
+        reused = self.reused
+        self.window = bytearray()
+        self.window_bytes = 0
+        self.new_digests = {}
+        self.reused = set()
+        self.storage.metadata.unpin_blocks(self.intent_id, list(reused))
 
-        if metadata.is_compressed:
-            data = decompress_data(data)
+    def commit(self, bucket_name: str, uploads: List[_Upload], owner_id: str) -> List[ObjectMetadata]:
+        new_blocks = self._flush()
+        objects = [upload.metadata(bucket_name, owner_id) for upload in uploads]
+        with metrics.stage('rocksdb_put'):
+            self.storage.metadata.commit_objects(objects, bytes(self.window), new_blocks, self.intent_id)
+        for upload in uploads:
+            self.storage._invalidate_cached(bucket_name, upload.object_key)
+        return objects
 
+    def _unpin(self):
+        if self.reused:
+            self.storage.metadata.unpin_blocks(self.intent_id, list(self.reused))
+
+    def __enter__(self) -> '_UploadSession':
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return self._stack.__exit__(exc_type, exc_value, traceback)
+
+class StreamingUpload:
+    # An upload handed its data as it arrives rather than pulling it, so a
+    # slow sender costs no thread between calls. Calls may come from
+    # different threads; abort waits for one in progress. Any failure
+    # abandons the upload.
+    def __init__(self, storage: 'ObjectStorage', bucket_name: str, object_key: str, owner_id: str,
+                 block_codec: Optional[Codec]):
+        self._bucket_name = bucket_name
+        self._owner_id = owner_id
+        self._upload = _Upload(bucket_name, object_key, (), block_codec)
+        self._lock = threading.Lock()
+        self._session = _UploadSession(storage)
+
+    def write(self, chunks: Iterable[bytes]):
+        with self._lock:
+            self._add(chunks, final=False)
+
+    def finish(self, chunks: Iterable[bytes] = ()) -> ObjectMetadata:
+        with self._lock:
+            self._add(chunks, final=True)
+            try:
+                metadata, = self._session.commit(self._bucket_name, [self._upload], self._owner_id)
+            except BaseException:
+                self._session.__exit__(*sys.exc_info())
+                raise
+            self._session.__exit__(None, None, None)
+            return metadata
+
+    def abort(self):
+        with self._lock:
+            self._session.__exit__(None, None, None)
+
+    def _add(self, chunks: Iterable[bytes], final: bool):
+        pipeline = self._upload.pipeline
+        blocks = (block for chunk in chunks for block in pipeline.feed(chunk))
+        if final:
+            blocks = itertools.chain(blocks, pipeline.finish())
+        try:
+            self._session.add((self._upload, block) for block in blocks)
+        except BaseException:
+            self._session.__exit__(*sys.exc_info())
+            raise
+
+class ObjectStorage:
+    PIN_BATCH_SIZE = 256  # blocks looked up in the block index per call
+
+    def __init__(self, metadata=None, namespace: int = 0):
+        # Without a metadata store this process owns RocksDB; worker processes
+        # pass a proxy to the metadata service and their own segment namespace.
+        # Either way whatever a crash left in the namespace is recovered before
+        # its segments are opened for appending.
+        self._owns_metadata = metadata is None
+        if metadata is None:
+            self.block_storage = BlockStorage(namespace)
+            self.metadata = MetadataStore(self.block_storage)
+        else:
+            metadata.recover(namespace)
+            self.block_storage = BlockStorage(namespace)
+            self.metadata = metadata
+        # Keyed by (bucket_name, object_key)
+        self.metadata_cache = SizedLRUCache(config.METADATA_CACHE_BYTES, sizeof=_metadata_size)
+        self.object_cache = SizedLRUCache(config.OBJECT_CACHE_BYTES, sizeof=lambda storage_object: len(storage_object.data))
+        self._closed = False
+
+    def upload_file(self, bucket_name: str, object_key: str, data: bytes, owner_id: str, compress: bool = False,
+                    codec: str = "") -> StorageObject:
+        metadata = self.upload_stream(bucket_name, object_key, [data], owner_id, compress, codec)
         return StorageObject(metadata=metadata, data=data)
 
-    def _metadata_to_dict(self, metadata: ObjectMetadata) -> dict:
-        metadata_dict = metadata.__dict__.copy()
-        metadata_dict['created_at'] = metadata_dict['created_at'].isoformat()
-        metadata_dict['modified_at'] = metadata_dict['modified_at'].isoformat()
-        return metadata_dict
-
-    def _get_metadata(self, bucket_name: str, object_key: str) -> ObjectMetadata:
-        metadata_key = f"{bucket_name}:{object_key}".encode()
-        metadata_json = self.db.get(metadata_key)
-
-        if metadata_json is None:
-            raise FileNotFoundError(f"Object {object_key} not found in bucket {bucket_name}")
-
-        metadata_dict = json.loads(metadata_json)
-        metadata_dict['created_at'] = datetime.fromisoformat(metadata_dict['created_at'])
-        metadata_dict['modified_at'] = datetime.fromisoformat(metadata_dict['modified_at'])
-        return ObjectMetadata(**metadata_dict)
-
-    def _save_metadata(self, metadata: ObjectMetadata):
-        metadata_key = f"{metadata.bucket_name}:{metadata.object_key}".encode()
-        metadata_dict = self._metadata_to_dict(metadata)
-        metadata_json = json.dumps(metadata_dict)
-        self.db.set(metadata_key, metadata_json.encode())
-
-    def list_objects(self, bucket_name: str) -> List[ObjectMetadata]:
-        objects = []
-        iterator = self.db.iterator(mode='from', key=bucket_name.encode())
-        for key, value in iterator:
-            key = key.decode()
-            if not key.startswith(f"{bucket_name}:"):
-                break
-            metadata_dict = json.loads(value)
-            metadata_dict['created_at'] = datetime.fromisoformat(metadata_dict['created_at'])
-            metadata_dict['modified_at'] = datetime.fromisoformat(metadata_dict['modified_at'])
-            metadata = ObjectMetadata(**metadata_dict)
-            objects.append(metadata)
-        return objects
+    def upload_stream(self, bucket_name: str, object_key: str, chunks: Iterable[bytes], owner_id: str, compress: bool = False,
+                      codec: str = "") -> ObjectMetadata:
+        upload = _Upload(bucket_name, object_key, chunks, _block_codec(compress, codec))
+        return self._store_uploads(bucket_name, [upload], owner_id)[0]
+
+    def open_upload(self, bucket_name: str, object_key: str, owner_id: str, compress: bool = False,
+                    codec: str = "") -> StreamingUpload:
+        return StreamingUpload(self, bucket_name, object_key, owner_id, _block_codec(compress, codec))
+
+    def upload_files(self, bucket_name: str, objects: List[Tuple[str, bytes, bool, str]],
+                     owner_id: str) -> List[Union[ObjectMetadata, Exception]]:
+        # objects are (object_key, data, compress, codec). All of them share
+        # the block index lookups, the writes and one metadata batch; an object
+        # with an invalid codec fails on its own.
+        results = []
+        uploads = []
+        for object_key, data, compress, codec in objects:
+            try:
+                upload = _Upload(bucket_name, object_key, [data], _block_codec(compress, codec))
+            except ValueError as e:
+                results.append(e)
+                continue
+            results.append(upload)
+            uploads.append(upload)
+        stored = iter(self._store_uploads(bucket_name, uploads, owner_id))
+        return [result if isinstance(result, Exception) else next(stored) for result in results]
+
+    def _store_uploads(self, bucket_name: str, uploads: List['_Upload'], owner_id: str) -> List[ObjectMetadata]:
+        if not uploads:
+            return []
+        with _UploadSession(self) as session:
+            session.add((upload, block) for upload in uploads for block in upload.blocks())
+            return session.commit(bucket_name, uploads, owner_id)
+
+    def _batched(self, items: Iterable[Tuple['_Upload', bytes]]) -> Iterator[List[Tuple['_Upload', bytes]]]:
+        batch = []
+        batch_bytes = 0
+        for item in items:
+            batch.append(item)
+            batch_bytes += len(item[1])
+            if len(batch) >= self.PIN_BATCH_SIZE or batch_bytes >= config.BLOCK_IO_BATCH_SIZE:
+                yield batch
+                batch = []
+                batch_bytes = 0
+        if batch:
+            yield batch
+
+    def get_object(self, bucket_name: str, object_key: str, range_start: int = 0, range_length: int = 0) -> StorageObject:
+        cache_key = (bucket_name, object_key)
+        storage_object = self._get_cached(self.object_cache, cache_key, lambda cached: cached.metadata)
+        if storage_object is not None:
+            if range_start or range_length:
+                start, length = clamp_range(len(storage_object.data), range_start, range_length)
+                return StorageObject(metadata=storage_object.metadata, data=storage_object.data[start:start + length])
+            return storage_object
+
+        if range_start or range_length:
+            metadata, chunks = self.get_object_stream(bucket_name, object_key, range_start, range_length)
+            return StorageObject(metadata=metadata, data=b''.join(chunks))
+
+        generation = self.object_cache.generation(cache_key)
+        metadata, locators = self._locate(bucket_name, object_key)
+
+        with metrics.stage('block_read'):
+            data = self.block_storage.read_blocks(locators)
+
+        # Blocks compressed individually come back decompressed; objects
+        # from before block codecs are one gzip stream.
+        if metadata.is_compressed and metadata.codec is None:
+            data = decompress_data(data)
+
+        storage_object = StorageObject(metadata=metadata, data=data)
+        if len(data) <= config.OBJECT_CACHE_MAX_OBJECT_SIZE:
+            self.object_cache.set(cache_key, storage_object, generation)
+        return storage_object
+
+    def get_object_stream(self, bucket_name: str, object_key: str, range_start: int = 0,
+                          range_length: int = 0) -> Tuple[ObjectMetadata, Iterator[bytes]]:
+        ranged = bool(range_start or range_length)
+        chunk_size = config.STREAM_CHUNK_SIZE
+        storage_object = self._get_cached(self.object_cache, (bucket_name, object_key), lambda cached: cached.metadata)
+        if storage_object is not None:
+            start, length = clamp_range(len(storage_object.data), range_start, range_length)
+            data = storage_object.data
+            return storage_object.metadata, (data[i:min(i + chunk_size, start + length)] for i in range(start, start + length, chunk_size))
+
+        if ranged:
+            metadata, locators, skip, length = self._locate_range(bucket_name, object_key, range_start, range_length)
+        else:
+            metadata, locators = self._locate(bucket_name, object_key)
+
+        chunks = metrics.timed_stream('block_read', self.block_storage.read_stream(locators, chunk_size))
+
+        if metadata.is_compressed and metadata.codec is None:
+            # The whole gzip stream is read; a range is cut out of the
+            # decompressed data, whose size the record does not have
+            chunks = decompress_stream(chunks, chunk_size)
+            if ranged:
+                chunks = _skip_to(iter(chunks), skip)
+                if length:
+                    chunks = _slice_stream(chunks, 0, length)
+        elif ranged:
+            chunks = _slice_stream(chunks, skip, length)
+
+        return metadata, chunks
+
+    def _locate_range(self, bucket_name: str, object_key: str, start: int, length: int) -> Tuple[ObjectMetadata, List[BlockRef], int, int]:
+        # Only the blocks covering the range are resolved and read; a cached
+        # record is used when there is one, but a range does not fill the cache.
+        metadata = self._get_cached(self.metadata_cache, (bucket_name, object_key), lambda cached: cached)
+        with metrics.stage('rocksdb_get'):
+            if metadata is not None:
+                start, length = check_range(metadata, start, length)
+                first, end, skip = block_range(metadata, start, length)
+                return metadata, self.metadata.resolve_blocks(metadata.block_ids[first:end]), skip, length
+            return self.metadata.locate_range(bucket_name, object_key, start, length)
+
+    def get_objects(self, bucket_name: str, object_keys: List[str], max_bytes: int = 0,
+                    max_object_size: int = 0) -> List[Union[StorageObject, Exception]]:
+        # Objects that are not cached are located with one metadata lookup and
+        # read together; missing ones come back as FileNotFoundError. Objects
+        # are taken in request order while their data fits in max_bytes, and
+        # none larger than max_object_size (0 for no limit); the others come
+        # back as BatchLimitExceeded without any of their blocks being read.
+        found = {}
+        for object_key in dict.fromkeys(object_keys):
+            try:
+                storage_object = self._get_cached(self.object_cache, (bucket_name, object_key), lambda cached: cached.metadata)
+            except FileNotFoundError as e:
+                storage_object = e
+            if storage_object is not None:
+                found[object_key] = storage_object
+        missing = [object_key for object_key in dict.fromkeys(object_keys) if object_key not in found]
+
+        generations = [self.object_cache.generation((bucket_name, object_key)) for object_key in missing]
+        with metrics.stage('rocksdb_get'):
+            locations = self.metadata.locate_objects(bucket_name, missing) if missing else []
+        for object_key, location in zip(missing, locations):
+            if location is None:
+                found[object_key] = FileNotFoundError(f"Object {object_key} not found in bucket {bucket_name}")
+        located = dict(zip(missing, locations))
+
+        budget = max_bytes
+        for object_key in dict.fromkeys(object_keys):
+            result = found.get(object_key)
+            if isinstance(result, Exception):
+                continue
+            size = len(result.data) if result is not None else located[object_key][0].size
+            if max_object_size and size > max_object_size:
+                found[object_key] = BatchLimitExceeded("Object is too large for a batch; get it on its own")
+            elif max_bytes and size > budget:
+                found[object_key] = BatchLimitExceeded("Batch response is full; get this object on its own")
+            else:
+                budget -= size
+
+        reads = [
+            (object_key, generation, located[object_key]) for object_key, generation in zip(missing, generations)
+            if object_key not in found
+        ]
+        with metrics.stage('block_read'):
+            contents = iter(self.block_storage.read_objects([locators for _, _, (_, locators) in reads]))
+        for object_key, generation, location in reads:
+            metadata, data = location[0], next(contents)
+            if metadata.is_compressed and metadata.codec is None:
+                data = decompress_data(data)
+            found[object_key] = StorageObject(metadata=metadata, data=data)
+            if len(data) <= config.OBJECT_CACHE_MAX_OBJECT_SIZE:
+                self.object_cache.set((bucket_name, object_key), found[object_key], generation)
+        return [found[object_key] for object_key in object_keys]
+
+    def _locate(self, bucket_name: str, object_key: str) -> Tuple[ObjectMetadata, List[BlockRef]]:
+        # Only records are cached: compaction moves blocks and removes their
+        # old segments, so locators are resolved again on every read.
+        cache_key = (bucket_name, object_key)
+        metadata = self._get_cached(self.metadata_cache, cache_key, lambda cached: cached)
+        with metrics.stage('rocksdb_get'):
+            if metadata is not None:
+                return metadata, self.metadata.resolve_blocks(metadata.block_ids)
+            generation = self.metadata_cache.generation(cache_key)
+            metadata, locators = self.metadata.locate_object(bucket_name, object_key)
+        self.metadata_cache.set(cache_key, metadata, generation)
+        return metadata, locators
+
+    def _get_cached(self, cache: SizedLRUCache, cache_key: Tuple[str, str], metadata_of: Callable[[Any], ObjectMetadata]):
+        cached = cache.get(cache_key)
+        if cached is None or self._owns_metadata:
+            return cached
+        # Another worker process may have replaced or deleted the object since;
+        # its summary record is cheap to compare against.
+        try:
+            with metrics.stage('rocksdb_get'):
+                current = self.metadata.get_metadata(*cache_key, with_blocks=False)
+        except FileNotFoundError:
+            cache.invalidate(cache_key)
+            raise
+        cached_metadata = metadata_of(cached)
+        if (current.md5_hash, current.modified_at) != (cached_metadata.md5_hash, cached_metadata.modified_at):
+            cache.invalidate(cache_key)
+            return None
+        return cached
+
+    def _invalidate_cached(self, bucket_name: str, object_key: str):
+        self.metadata_cache.invalidate((bucket_name, object_key))
+        self.object_cache.invalidate((bucket_name, object_key))
+
+    def cache_stats(self) -> Dict[str, Dict[str, int]]:
+        return {'metadata': self.metadata_cache.stats(), 'objects': self.object_cache.stats()}
+
+    def list_objects(self, bucket_name: str, prefix: str = "", delimiter: str = "", start_after: str = "",
+                     continuation_token: str = "", max_keys: int = 0, include_block_ids: bool = False) -> ListObjectsResult:
+        with metrics.stage('rocksdb_get'):
+            return self.metadata.list_objects(
+                bucket_name, prefix, delimiter, start_after, continuation_token, max_keys, include_block_ids
+            )
 
     def delete_object(self, bucket_name: str, object_key: str):
-        metadata = self._get_metadata(bucket_name, object_key)
+        # Legacy block files are unlinked by the metadata store, under an intent
+        with metrics.stage('rocksdb_put'):
+            self.metadata.delete_object(bucket_name, object_key)
+        self._invalidate_cached(bucket_name, object_key)
+
+    def delete_objects(self, bucket_name: str, object_keys: List[str]) -> List[Optional[Exception]]:
+        # One metadata batch for all the objects; None for each one deleted
+        with metrics.stage('rocksdb_put'):
+            deleted = self.metadata.delete_objects(bucket_name, object_keys)
+        for object_key in object_keys:
+            self._invalidate_cached(bucket_name, object_key)
+        return [
+            None if metadata is not None else FileNotFoundError(f"Object {object_key} not found in bucket {bucket_name}")
+            for object_key, metadata in zip(object_keys, deleted)
+        ]
+
+    @contextmanager
+    def _upload_intent(self):
+        with metrics.stage('rocksdb_put'):
+            intent_id = self.metadata.begin_upload(self.block_storage.active_segment_id)
+        try:
+            yield intent_id
+        finally:
+            with metrics.stage('rocksdb_put'):
+                self.metadata.end_upload(intent_id)
 
-        # Delete metadata from RocksDB
-        metadata_key = f"{bucket_name}:{object_key}".encode()
-        self.db.delete(metadata_key)
+    def compact_segments(self) -> int:
+        return self.metadata.compact_segments()
 
-        # Delete blocks from block storage
-        self.block_storage.delete_blocks(metadata.block_ids)
+    def start_background_compaction(self, interval: float):
+        if self._owns_metadata:
+            self.metadata.start_background_compaction(interval)
+        else:
+            # Compaction runs in the metadata service; this process only has
+            # to let go of the segments it removed.
+            start_periodic_task("segment-release", interval, self.block_storage.release_retired_segments)
 
-    def __del__(self):
-        self.db.close()
\ No newline at end of file
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        if self._owns_metadata:
+            self.metadata.close()
+        self.block_storage.close()
\ No newline at end of file
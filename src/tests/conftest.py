@@ -0,0 +1,15 @@
+import os
+import sys
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import config
+
+@pytest.fixture
+def data_dir(tmp_path, monkeypatch):
+    # Fresh RocksDB, segments and Bloom filter for each test
+    monkeypatch.setattr(config, 'ROCKSDB_PATH', str(tmp_path / 'rocksdb'))
+    monkeypatch.setattr(config, 'BLOCK_STORAGE_PATH', str(tmp_path / 'blocks'))
+    monkeypatch.setattr(config, 'BLOOM_FILTER_PATH', str(tmp_path / 'bloom_filter.bin'))
+    return tmp_path
\ No newline at end of file
@@ -0,0 +1,25 @@
+import os
+from utils import bloom_filter as bloom_filter_module
+from utils.bloom_filter import BloomFilter
+
+def test_batches_set_and_check_the_same_bits(monkeypatch):
+    # Batches are indexed in numpy; the bits must match one item at a time,
+    # or snapshots and lookups would disagree
+    items = [os.urandom(16) for _ in range(3000)] + ['text', 12345]
+    for capacity in (100, 10_000_000):
+        single = BloomFilter.for_capacity(capacity, 0.01)
+        batched = BloomFilter.for_capacity(capacity, 0.01)
+        for item in items[::2]:
+            single.add(item)
+        batched.add_many(items[::2])
+        assert batched.bit_array == single.bit_array
+        assert batched.check_many(items) == [single.check(item) for item in items]
+        assert all(batched.check_many(items[::2]))
+
+        monkeypatch.setattr(bloom_filter_module, 'np', None)
+        unbatched = BloomFilter.for_capacity(capacity, 0.01)
+        unbatched.add_many(items[::2])
+        assert unbatched.bit_array == single.bit_array
+        assert unbatched.check_many(items) == [single.check(item) for item in items]
+        monkeypatch.undo()
+    assert BloomFilter.for_capacity(100, 0.01).check_many([]) == []
\ No newline at end of file
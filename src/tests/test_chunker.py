@@ -0,0 +1,54 @@
+import random
+from storage import chunker as chunker_module
+from storage.chunker import ContentDefinedChunker, FixedSizeChunker
+
+def _data(size: int) -> bytes:
+    rng = random.Random(5)
+    # Random runs with long repeats between them, which only max_size cuts
+    return b''.join(rng.randbytes(size // 8) + bytes([i]) * (size // 16) for i in range(6))
+
+def _splits(data: bytes, rng: random.Random):
+    yield [data]
+    yield [data[:1], data[1:2], data[2:]]
+    for high in (100, 10000, 300000):
+        pieces = []
+        offset = 0
+        while offset < len(data):
+            size = rng.randint(1, high)
+            pieces.append(data[offset:offset + size])
+            offset += size
+        yield pieces
+
+def test_cdc_cuts_do_not_depend_on_message_splits():
+    data = _data(3 * 1024 * 1024)
+    reference = [bytes(block) for block in ContentDefinedChunker(2048, 8192, 65536, batch_size=len(data)).split([data])]
+    assert b''.join(reference) == data
+    assert all(2048 <= len(block) <= 65536 for block in reference[:-1])
+    assert any(len(block) == 65536 for block in reference)
+
+    rng = random.Random(1)
+    for batch_size in (1, 64 * 1024, 1024 * 1024):
+        chunker = ContentDefinedChunker(2048, 8192, 65536, batch_size=batch_size)
+        for pieces in _splits(data, rng):
+            assert [bytes(block) for block in chunker.split(pieces)] == reference
+
+def test_cdc_cuts_resynchronize_after_an_edit():
+    data = _data(1024 * 1024)
+    chunker = ContentDefinedChunker(2048, 8192, 65536)
+    before = {bytes(block) for block in chunker.split([data])}
+    after = [bytes(block) for block in chunker.split([data[:5000] + b'inserted' + data[5000:]])]
+    assert sum(block not in before for block in after) <= 2
+
+def test_cdc_python_and_vectorized_cuts_agree(monkeypatch):
+    data = _data(512 * 1024)
+    chunker = ContentDefinedChunker(2048, 8192, 65536)
+    vectorized = [bytes(block) for block in chunker.split([data])]
+    monkeypatch.setattr(chunker_module, 'np', None)
+    assert [bytes(block) for block in chunker.split([data[:70000], data[70000:]])] == vectorized
+
+def test_fixed_size_cuts_do_not_depend_on_message_splits():
+    data = _data(100000)
+    rng = random.Random(2)
+    for pieces in _splits(data, rng):
+        blocks = [bytes(block) for block in FixedSizeChunker(4096).split(pieces)]
+        assert blocks == [data[offset:offset + 4096] for offset in range(0, len(data), 4096)]
\ No newline at end of file
@@ -0,0 +1,84 @@
+from datetime import datetime
+import pytest
+
+def _metadata(**fields):
+    from storage.models import ObjectMetadata
+    defaults = dict(
+        object_key='key', bucket_name='bucket', size=3, md5_hash='900150983cd24fb0d6963f7d28e17f72',
+        mime_type='application/octet-stream', created_at=datetime(2024, 1, 2, 3, 4, 5, 6000),
+        modified_at=datetime(2024, 1, 2, 3, 4, 5, 6000), owner_id='owner', acl={'owner': 'FULL_CONTROL'}
+    )
+    return ObjectMetadata(**dict(defaults, **fields))
+
+def test_records_with_retired_fields_decode(monkeypatch):
+    # Records written while content_md5 existed still carry it
+    from storage import metadata_codec
+
+    metadata = _metadata(is_compressed=True, block_ids=[])
+    metadata.content_md5 = 'd41d8cd98f00b204e9800998ecf8427e'
+    monkeypatch.setattr(metadata_codec, 'EXTRA_FIELDS', metadata_codec.EXTRA_FIELDS + ('content_md5',))
+    record = metadata_codec.encode_metadata(metadata)
+    monkeypatch.undo()
+
+    decoded = metadata_codec.decode_metadata(record)
+    assert not hasattr(decoded, 'content_md5')
+    assert decoded.md5_hash == metadata.md5_hash and decoded.is_compressed
+
+def test_records_round_trip():
+    from storage.metadata_codec import decode_metadata, encode_metadata, encode_summary
+
+    digests = ['00' * 16, 'ff' * 16, '0123456789abcdef' * 2]
+    for metadata in [
+        _metadata(block_ids=digests),
+        _metadata(block_ids=[]),
+        _metadata(block_ids=[1, 2, 2 ** 40]),  # legacy block files
+        _metadata(
+            object_key='dir/ключ ✓', version='v2', is_compressed=True, is_encrypted=True, codec='zstd',
+            user_metadata={'a': 'b'}, parts=[{'number': 1, 'size': 3}], replication_info={'zone': 'x'},
+            block_ids=digests,
+        ),
+    ]:
+        assert decode_metadata(encode_metadata(metadata)) == metadata
+        summary = decode_metadata(encode_summary(metadata))
+        assert summary.block_ids is None
+        summary.block_ids = metadata.block_ids
+        assert summary == metadata
+
+def test_manifests_round_trip():
+    from array import array
+    from storage.metadata_codec import decode_manifest, encode_manifest
+    from storage.models import BlockDigests
+
+    digests = ['00' * 16, 'ff' * 16, 'ab' * 16]
+    packed = BlockDigests(bytes.fromhex(''.join(digests)))
+    assert decode_manifest(encode_manifest(digests)) == (digests, None)
+    assert decode_manifest(encode_manifest(digests, [4096, 4096, 10])) == (digests, [4096, 4096, 10])
+    assert decode_manifest(encode_manifest(digests, [100, 5000, 70000])) == (digests, [100, 5000, 70000])
+    assert decode_manifest(encode_manifest(packed, array('I', [1, 2, 3]))) == (digests, [1, 2, 3])
+    assert decode_manifest(encode_manifest([7, 8], [4096, 1])) == ([7, 8], [4096, 1])
+    assert decode_manifest(encode_manifest([])) == ([], None)
+    with pytest.raises(ValueError):
+        encode_manifest([digests[0], 7])
+
+def test_legacy_json_records_decode():
+    # As written before the binary format: the dataclass fields as JSON,
+    # with ISO timestamps, block file ids or segment locators
+    import json
+    from storage.block_storage import BlockLocator
+    from storage.metadata_codec import decode_metadata
+
+    expected = _metadata(block_ids=[3, 4])
+    record = dict(expected.__dict__, created_at=expected.created_at.isoformat(), modified_at=expected.modified_at.isoformat())
+    del record['codec'], record['block_sizes']
+    assert decode_metadata(json.dumps(record).encode()) == expected
+
+    record['block_ids'] = [[5, 0, 4096], [5, 4096, 100]]
+    decoded = decode_metadata(json.dumps(record).encode())
+    assert decoded.block_ids == [BlockLocator(5, 0, 4096), BlockLocator(5, 4096, 100)]
+
+def test_unknown_record_versions_are_rejected():
+    from storage.metadata_codec import decode_metadata, encode_metadata
+
+    record = encode_metadata(_metadata(block_ids=[]))
+    with pytest.raises(ValueError):
+        decode_metadata(bytes([2]) + record[1:])
\ No newline at end of file
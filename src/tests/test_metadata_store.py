@@ -0,0 +1,215 @@
+import os
+import threading
+from datetime import datetime
+import pytest
+from config import config
+
+def _upload_refs(store):
+    from storage.metadata_store import UPLOAD_REFS_KEY_PREFIX
+    return [key for key, _ in store.db.iterator(mode='from', key=UPLOAD_REFS_KEY_PREFIX) if key.startswith(UPLOAD_REFS_KEY_PREFIX)]
+
+def test_recovery_after_worker_crash(data_dir, monkeypatch):
+    # A worker dies with an upload open: some of its blocks are referenced
+    # under the upload intent, the rest are on disk but not indexed, and the
+    # metadata service still holds pins for blocks it reused. Restarting the
+    # worker recovers its segment namespace.
+    monkeypatch.setattr(config, 'OBJECT_CACHE_BYTES', 0)
+    monkeypatch.setattr(config, 'UPLOAD_WINDOW_BYTES', 1536 * 1024)
+    monkeypatch.setattr(config, 'BLOCK_IO_BATCH_SIZE', 64 * 1024)
+    from storage.block_storage import SEGMENT_NAMESPACE_BITS
+    from storage.object_storage import ObjectStorage
+
+    owner = ObjectStorage()
+    try:
+        kept = os.urandom(100000)
+        owner.upload_file('bucket', 'kept', kept, 'owner')
+        worker = ObjectStorage(owner.metadata, namespace=1)
+        committed = os.urandom(100000)
+        worker.upload_file('bucket', 'committed', committed, 'owner')
+        segment_id = worker.block_storage.active_segment_id
+        live_size = worker.block_storage.segment_size_on_disk(segment_id)
+
+        upload = worker.open_upload('bucket', 'interrupted', 'owner')
+        upload.write([os.urandom(2560 * 1024), kept])
+        worker.block_storage.close()  # lets queued writes land; the upload is never ended
+        assert _upload_refs(owner.metadata)
+        assert owner.metadata.block_index._pins
+        assert worker.block_storage.segment_size_on_disk(segment_id) > live_size + 1536 * 1024
+        live_blocks = sum(1 for _, entry in owner.metadata.block_index.iter_entries() if entry.refcount)
+
+        restarted = ObjectStorage(owner.metadata, namespace=1)
+        assert restarted.block_storage.active_segment_id == segment_id
+        assert not owner.metadata.intents.pending()
+        assert not _upload_refs(owner.metadata)
+        assert not owner.metadata.block_index._pins
+        # Blocks referenced before the crash are kept up to the last one,
+        # for compaction to reclaim once collected; the rest is cut off.
+        assert sum(1 for _, entry in owner.metadata.block_index.iter_entries() if entry.refcount) < live_blocks
+        size = restarted.block_storage.segment_size_on_disk(segment_id)
+        assert live_size < size <= live_size + 2 * 1024 * 1024
+        assert size == max(
+            entry.locator.offset + entry.locator.length
+            for _, entry in owner.metadata.block_index.iter_entries() if entry.locator.segment_id == segment_id
+        )
+        assert segment_id >> SEGMENT_NAMESPACE_BITS == 1
+
+        assert restarted.get_object('bucket', 'committed').data == committed
+        assert owner.get_object('bucket', 'kept').data == kept
+        restarted.upload_file('bucket', 'after', kept, 'owner')
+        assert restarted.get_object('bucket', 'after').data == kept
+        restarted.block_storage.close()
+        upload.abort()  # what is left of the dead worker's upload, in this process
+    finally:
+        owner.close()
+
+def test_compaction_reclaims_dead_segments(data_dir, monkeypatch):
+    # Segments mostly holding deleted blocks are rewritten: live blocks are
+    # copied out and the old files unlinked a pass later. Fuller segments
+    # and the one still being appended to stay as they are.
+    monkeypatch.setattr(config, 'SEGMENT_SIZE', 64 * 1024)
+    monkeypatch.setattr(config, 'OBJECT_CACHE_BYTES', 0)
+    monkeypatch.setattr(config, 'METADATA_CACHE_BYTES', 0)
+    from storage.object_storage import ObjectStorage
+
+    storage = ObjectStorage()
+    try:
+        data = {f'object-{i}': os.urandom(16000) for i in range(16)}
+        for object_key, object_data in data.items():
+            storage.upload_file('bucket', object_key, object_data, 'owner')
+        block_storage = storage.block_storage
+        segment_ids = block_storage.list_segments()
+        assert len(segment_ids) >= 4
+
+        # Three of every four objects in the first segments, none elsewhere
+        deleted = [f'object-{i}' for i in range(8) if i % 4]
+        storage.delete_objects('bucket', deleted)
+        sizes_before = {segment_id: block_storage.segment_size_on_disk(segment_id) for segment_id in segment_ids}
+
+        reclaimed = storage.compact_segments()
+        assert reclaimed > 0
+        assert storage.compact_segments() == 0  # nothing left to compact; retired segments go now
+        remaining = block_storage.list_segments()
+        removed = [segment_id for segment_id in segment_ids if segment_id not in remaining]
+        assert removed and segment_ids[-1] not in removed
+        assert reclaimed == sum(sizes_before[segment_id] for segment_id in removed) - sum(
+            entry.locator.length for _, entry in storage.metadata.block_index.iter_entries()
+            if entry.locator.segment_id not in segment_ids
+        )
+        for segment_id in removed:
+            assert not os.path.exists(block_storage._get_segment_file_path(segment_id))
+        for segment_id in remaining:
+            if segment_id in sizes_before:
+                assert block_storage.segment_size_on_disk(segment_id) == sizes_before[segment_id]
+
+        for object_key, object_data in data.items():
+            if object_key in deleted:
+                continue
+            assert storage.get_object('bucket', object_key).data == object_data
+    finally:
+        storage.close()
+
+def test_group_commit_isolates_failed_updates(data_dir, monkeypatch):
+    # Updates from concurrent callers share one write; one that cannot be
+    # staged fails alone and leaves nothing behind.
+    from storage.models import ObjectMetadata
+    from storage.object_storage import ObjectStorage
+
+    monkeypatch.setattr(config, 'METADATA_COMMIT_LINGER', 0.2)
+    storage = ObjectStorage()
+    store = storage.metadata
+    groups = []
+    write_group = store.writer._write_group
+    store.writer._write_group = lambda updates: groups.append(len(updates)) or write_group(updates)
+    try:
+        storage.upload_file('bucket', 'deleted', b'd' * 10000, 'owner')
+        existing = bytes.fromhex(store.get_metadata('bucket', 'deleted').block_ids[0])
+        groups.clear()
+
+        broken = ObjectMetadata(
+            object_key='broken', bucket_name='bucket', size=4, md5_hash='', mime_type='application/octet-stream',
+            created_at=datetime.now(), modified_at=datetime.now(), owner_id='owner', acl={},
+            block_ids=[existing.hex(), 7]  # digests and legacy ids cannot be mixed
+        )
+        data = {f'object-{i}': os.urandom(10000) for i in range(3)}
+        errors = {}
+
+        def run(name, call):
+            try:
+                call()
+            except Exception as e:
+                errors[name] = e
+
+        calls = {object_key: (lambda object_key=object_key: storage.upload_file('bucket', object_key, data[object_key], 'owner'))
+                 for object_key in data}
+        calls['broken'] = lambda: store.commit_objects([broken], existing, {})
+        calls['delete'] = lambda: storage.delete_objects('bucket', ['deleted'])
+        threads = [threading.Thread(target=run, args=item) for item in calls.items()]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert max(groups) > 1
+        assert list(errors) == ['broken'] and isinstance(errors['broken'], ValueError)
+        for object_key, object_data in data.items():
+            assert storage.get_object('bucket', object_key).data == object_data
+        with pytest.raises(FileNotFoundError):
+            store.get_metadata('bucket', 'broken')
+        with pytest.raises(FileNotFoundError):
+            store.get_metadata('bucket', 'deleted')
+        assert store.block_index.get(existing).refcount == 0
+    finally:
+        storage.close()
+
+def _expected_listing(keys, prefix, delimiter, start_after):
+    # S3 semantics, worked out the slow way
+    objects, common_prefixes = [], []
+    for key in sorted(keys, key=str.encode):
+        if not key.startswith(prefix) or key.encode() <= start_after.encode():
+            continue
+        index = key.find(delimiter, len(prefix)) if delimiter else -1
+        if index < 0:
+            objects.append(key)
+        elif key[:index + len(delimiter)] not in common_prefixes:
+            common_prefixes.append(key[:index + len(delimiter)])
+    return objects, common_prefixes
+
+def test_list_objects_pages(data_dir):
+    # Every page size gives the same listing as one unbounded page, with
+    # and without a delimiter, prefix or start_after
+    from storage.object_storage import ObjectStorage
+
+    keys = [
+        'a', 'a/', 'a/b', 'a/b/c', 'a/c', 'a/d/e', 'a/d/f', 'ab', 'b/x', 'b/y/z', 'c', 'é/1', 'é/2', 'z/z/z',
+    ]
+    storage = ObjectStorage()
+    try:
+        for key in keys:
+            storage.upload_file('bucket', key, key.encode(), 'owner')
+        storage.upload_file('bucket2', 'a/b', b'other bucket', 'owner')
+
+        for prefix, delimiter, start_after in [
+            ('', '', ''), ('', '/', ''), ('a/', '/', ''), ('a', '/', ''), ('a/', '', 'a/b'),
+            ('', '/', 'a/b'), ('', '/', 'b/'), ('é', '/', ''), ('a/d', '/', 'a/d/e'), ('', '/', 'zz'),
+        ]:
+            expected = _expected_listing(keys, prefix, delimiter, start_after)
+            for max_keys in range(1, len(keys) + 2):
+                objects, common_prefixes = [], []
+                token = ''
+                while True:
+                    page = storage.list_objects(
+                        'bucket', prefix, delimiter, start_after, continuation_token=token, max_keys=max_keys
+                    )
+                    assert len(page.objects) + len(page.common_prefixes) <= max_keys
+                    objects.extend(metadata.object_key for metadata in page.objects)
+                    common_prefixes.extend(page.common_prefixes)
+                    if not page.is_truncated:
+                        assert not page.next_continuation_token
+                        break
+                    token = page.next_continuation_token
+                assert (objects, common_prefixes) == expected, (prefix, delimiter, start_after, max_keys)
+
+        with pytest.raises(ValueError):
+            storage.list_objects('bucket', continuation_token='not a token!')
+    finally:
+        storage.close()
\ No newline at end of file
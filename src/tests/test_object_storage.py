@@ -0,0 +1,200 @@
+import os
+import pytest
+from config import config
+
+def test_cached_metadata_survives_compaction(data_dir, monkeypatch):
+    # Compaction moves the blocks of a cached object and removes their old
+    # segment; reads must follow them rather than use stale locators.
+    monkeypatch.setattr(config, 'SEGMENT_SIZE', 64 * 1024)
+    monkeypatch.setattr(config, 'OBJECT_CACHE_BYTES', 0)
+    from storage.object_storage import ObjectStorage
+
+    storage = ObjectStorage()
+    try:
+        data = os.urandom(20000)
+        for i in range(8):
+            storage.upload_file('bucket', f'before-{i}', os.urandom(20000), 'owner')
+        storage.upload_file('bucket', 'kept', data, 'owner')
+        for i in range(8):
+            storage.upload_file('bucket', f'after-{i}', os.urandom(20000), 'owner')
+        assert storage.get_object('bucket', 'kept').data == data
+
+        storage.delete_objects('bucket', [f'{side}-{i}' for side in ('before', 'after') for i in range(8)])
+        assert storage.compact_segments()
+        storage.compact_segments()  # releases the segments removed by the first pass
+
+        assert storage.get_object('bucket', 'kept').data == data
+        assert b''.join(storage.get_object_stream('bucket', 'kept')[1]) == data
+        assert storage.get_object('bucket', 'kept', 100, 50).data == data[100:150]
+    finally:
+        storage.close()
+
+def test_ranges_of_legacy_gzip_objects(data_dir):
+    # Records from before block codecs are one gzip stream and store its
+    # compressed size; ranges apply to the decompressed data.
+    from datetime import datetime
+    from storage.block_index import block_digest
+    from storage.models import ObjectMetadata
+    from storage.object_storage import ObjectStorage
+    from utils.file_utils import compress_data
+
+    storage = ObjectStorage()
+    try:
+        data = b'abc' * 10000
+        compressed = compress_data(data)
+        locator = storage.block_storage.write_block(compressed)
+        digest = block_digest(compressed)
+        metadata = ObjectMetadata(
+            object_key='legacy', bucket_name='bucket', size=len(compressed), md5_hash='', mime_type='application/octet-stream',
+            created_at=datetime.now(), modified_at=datetime.now(), owner_id='owner', acl={}, is_compressed=True,
+            block_ids=[digest.hex()]
+        )
+        storage.metadata.commit_objects([metadata], digest, {digest: locator})
+
+        for _ in range(2):  # read, then read again from the object cache
+            assert storage.get_object('bucket', 'legacy', 100, 50).data == data[100:150]
+            assert storage.get_object('bucket', 'legacy', 10, 100).data == data[10:110]
+            assert storage.get_object('bucket', 'legacy', 29990).data == data[29990:]
+            assert b''.join(storage.get_object_stream('bucket', 'legacy', 1000, 5000)[1]) == data[1000:6000]
+            with pytest.raises(ValueError):
+                storage.get_object_stream('bucket', 'legacy', len(data) + 1)
+            assert storage.get_object('bucket', 'legacy').data == data
+    finally:
+        storage.close()
+
+def test_streaming_upload(data_dir):
+    from storage.object_storage import ObjectStorage
+
+    storage = ObjectStorage()
+    try:
+        data = os.urandom(300000)
+        upload = storage.open_upload('bucket', 'streamed', 'owner')
+        upload.write([data[:1000], data[1000:5000]])
+        upload.write([data[5000:200000]])
+        metadata = upload.finish([data[200000:]])
+        assert metadata.size == len(data)
+        assert storage.get_object('bucket', 'streamed').data == data
+
+        # An abandoned upload leaves nothing behind but unreferenced blocks
+        upload = storage.open_upload('bucket', 'abandoned', 'owner')
+        upload.write([data])
+        upload.abort()
+        assert not storage.metadata.intents.pending()
+        with pytest.raises(FileNotFoundError):
+            storage.get_object('bucket', 'abandoned')
+    finally:
+        storage.close()
+
+def test_upload_references_blocks_in_windows(data_dir, monkeypatch):
+    # Large uploads reference their blocks a window at a time; the commit
+    # keeps them and an abandoned upload releases them.
+    from collections import Counter
+    from storage.metadata_store import UPLOAD_REFS_KEY_PREFIX
+    from storage.object_storage import ObjectStorage
+
+    monkeypatch.setattr(config, 'UPLOAD_WINDOW_BYTES', 64 * 1024)
+    storage = ObjectStorage()
+
+    def refcounts(metadata):
+        return {digest: storage.metadata.block_index.get(bytes.fromhex(digest)).refcount for digest in metadata.block_ids}
+
+    def upload_refs():
+        return [key for key, _ in storage.metadata.db.iterator(mode='from', key=UPLOAD_REFS_KEY_PREFIX)
+                if key.startswith(UPLOAD_REFS_KEY_PREFIX)]
+
+    try:
+        data = os.urandom(300000)
+        metadata = storage.upload_file('bucket', 'large', data + data[:100000], 'owner').metadata
+        assert refcounts(metadata) == Counter(metadata.block_ids)
+        assert not upload_refs()
+        assert storage.get_object('bucket', 'large').data == data + data[:100000]
+
+        upload = storage.open_upload('bucket', 'abandoned', 'owner')
+        upload.write([os.urandom(300000), data])
+        upload.abort()
+        assert refcounts(metadata) == Counter(metadata.block_ids)
+        assert not upload_refs()
+        assert not storage.metadata.block_index._pins
+    finally:
+        storage.close()
+
+def test_recovery_releases_pins_of_dead_uploads(data_dir):
+    # A worker that dies mid-upload leaves its pins with the metadata
+    # service; recovering its namespace releases them.
+    from storage.block_index import block_digest
+    from storage.block_storage import SEGMENT_NAMESPACE_BITS
+    from storage.object_storage import ObjectStorage
+
+    storage = ObjectStorage()
+    try:
+        data = os.urandom(20000)
+        metadata = storage.upload_file('bucket', 'kept', data, 'owner').metadata
+        digests = [bytes.fromhex(block_id) for block_id in metadata.block_ids]
+
+        intent_id = storage.metadata.begin_upload(1 << SEGMENT_NAMESPACE_BITS)
+        assert all(storage.metadata.pin_existing_blocks(intent_id, digests))
+        assert not any(storage.metadata.pin_existing_blocks(intent_id, [block_digest(b'missing')]))
+        assert storage.metadata.block_index._pins
+
+        storage.metadata.recover(1)
+        assert not storage.metadata.block_index._pins
+        assert not storage.metadata.intents.pending()
+        with pytest.raises(RuntimeError):
+            storage.metadata.pin_existing_blocks(intent_id, digests)
+        assert not storage.metadata.block_index._pins
+    finally:
+        storage.close()
+
+def test_batch_get_reads_only_what_fits(data_dir, monkeypatch):
+    monkeypatch.setattr(config, 'OBJECT_CACHE_BYTES', 0)
+    from storage.object_storage import BatchLimitExceeded, ObjectStorage
+
+    storage = ObjectStorage()
+    try:
+        sizes = {'a': 30000, 'huge': 200000, 'b': 50000, 'c': 30000, 'd': 10000}
+        data = {object_key: os.urandom(size) for object_key, size in sizes.items()}
+        for object_key, object_data in data.items():
+            storage.upload_file('bucket', object_key, object_data, 'owner')
+
+        read = []
+        read_objects = storage.block_storage.read_objects
+        monkeypatch.setattr(storage.block_storage, 'read_objects', lambda objects: read.extend(objects) or read_objects(objects))
+        results = storage.get_objects('bucket', ['a', 'huge', 'b', 'missing', 'c', 'd'], 75000, 100000)
+
+        assert results[0].data == data['a']
+        assert isinstance(results[1], BatchLimitExceeded)
+        assert isinstance(results[2], BatchLimitExceeded)
+        assert isinstance(results[3], FileNotFoundError)
+        assert results[4].data == data['c']
+        assert results[5].data == data['d']
+        assert sum(locator.length for locators in read for locator in locators) == 70000
+    finally:
+        storage.close()
+
+def test_stream_outlives_compaction(data_dir, monkeypatch):
+    # A slow stream can see compaction move its blocks and unlink their
+    # old segment before it is done reading them.
+    monkeypatch.setattr(config, 'SEGMENT_SIZE', 64 * 1024)
+    monkeypatch.setattr(config, 'OBJECT_CACHE_BYTES', 0)
+    monkeypatch.setattr(config, 'BLOCK_IO_BATCH_SIZE', 4096)
+    monkeypatch.setattr(config, 'STREAM_CHUNK_SIZE', 4096)
+    from storage.object_storage import ObjectStorage
+
+    storage = ObjectStorage()
+    try:
+        data = os.urandom(20000)
+        storage.upload_file('bucket', 'before', os.urandom(40000), 'owner')
+        storage.upload_file('bucket', 'kept', data, 'owner')
+        storage.upload_file('bucket', 'after', os.urandom(60000), 'owner')
+        segment_ids = storage.block_storage.list_segments()
+
+        _, chunks = storage.get_object_stream('bucket', 'kept')
+        streamed = [next(chunks)]
+        storage.delete_objects('bucket', ['before', 'after'])
+        assert storage.compact_segments()
+        storage.compact_segments()
+        assert not set(segment_ids[:1]) & set(storage.block_storage.list_segments())
+        streamed.extend(chunks)
+        assert b''.join(streamed) == data
+    finally:
+        storage.close()
\ No newline at end of file
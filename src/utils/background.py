@@ -0,0 +1,19 @@
+import logging
+import threading
+import time
+from typing import Callable
+
+logger = logging.getLogger(__name__)
+
+def start_periodic_task(name: str, interval: float, task: Callable[[], object]) -> threading.Thread:
+    def run():
+        while True:
+            time.sleep(interval)
+            try:
+                task()
+            except Exception:
+                logger.exception("Background task %s failed", name)
+
+    thread = threading.Thread(target=run, name=name, daemon=True)
+    thread.start()
+    return thread
\ No newline at end of file
@@ -1,26 +1,94 @@
 import math
+import os
+import struct
 import mmh3
 
+try:
+    import numpy as np
+except ImportError:  # batches are checked one item at a time instead
+    np = None
+
 class BloomFilter:
+    SNAPSHOT_HEADER = struct.Struct(">4sQI")  # magic, size in bits, hash_count
+    SNAPSHOT_MAGIC = b"BLM1"
+
     def __init__(self, size, hash_count):
         self.size = size
         self.hash_count = hash_count
-        self.bit_array = [0] * size
+        self.bit_array = bytearray((size + 7) // 8)
+
+    @classmethod
+    def for_capacity(cls, n, p):
+        size = max(cls.get_size(n, p), 8)
+        return cls(size, max(cls.get_hash_count(size, n), 1))
+
+    def _indexes(self, item):
+        # Kirsch-Mitzenmacher double hashing: one 128-bit hash yields all k indexes
+        h1, h2 = mmh3.hash64(self._to_bytes(item), signed=False)
+        size = self.size
+        return [(h1 + i * h2) % size for i in range(self.hash_count)]
 
     def add(self, item):
-        item_bytes = self._to_bytes(item)
-        for seed in range(self.hash_count):
-            index = mmh3.hash(item_bytes, seed) % self.size
-            self.bit_array[index] = 1
+        bit_array = self.bit_array
+        for index in self._indexes(item):
+            bit_array[index >> 3] |= 1 << (index & 7)
 
     def check(self, item):
-        item_bytes = self._to_bytes(item)
-        for seed in range(self.hash_count):
-            index = mmh3.hash(item_bytes, seed) % self.size
-            if self.bit_array[index] == 0:
+        bit_array = self.bit_array
+        for index in self._indexes(item):
+            if not bit_array[index >> 3] & (1 << (index & 7)):
                 return False
         return True
 
+    def _index_matrix(self, items):
+        # The indexes of _indexes for a batch, one row per item. Reduced
+        # modulo size before combining, so uint64 never wraps and the bits
+        # match those of add and check.
+        hashes = np.array([mmh3.hash64(self._to_bytes(item), signed=False) for item in items], dtype=np.uint64)
+        size = np.uint64(self.size)
+        h1 = hashes[:, :1] % size
+        h2 = hashes[:, 1:] % size
+        return (h1 + np.arange(self.hash_count, dtype=np.uint64) * h2) % size
+
+    def add_many(self, items):
+        items = list(items)
+        if np is None or not items:
+            for item in items:
+                self.add(item)
+            return
+        indexes = self._index_matrix(items).ravel()
+        bits = np.frombuffer(self.bit_array, dtype=np.uint8)
+        np.bitwise_or.at(bits, indexes >> np.uint64(3), np.left_shift(1, indexes & np.uint64(7)).astype(np.uint8))
+
+    def check_many(self, items):
+        items = list(items)
+        if np is None or not items:
+            return [self.check(item) for item in items]
+        indexes = self._index_matrix(items)
+        bits = np.frombuffer(self.bit_array, dtype=np.uint8)[indexes >> np.uint64(3)]
+        return ((bits >> (indexes & np.uint64(7)).astype(np.uint8)) & 1).all(axis=1).tolist()
+
+    def save(self, path):
+        # Written to a temporary file first so a crash never leaves a torn snapshot
+        temp_path = f"{path}.tmp"
+        with open(temp_path, 'wb') as f:
+            f.write(self.SNAPSHOT_HEADER.pack(self.SNAPSHOT_MAGIC, self.size, self.hash_count))
+            f.write(self.bit_array)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'rb') as f:
+            magic, size, hash_count = cls.SNAPSHOT_HEADER.unpack(f.read(cls.SNAPSHOT_HEADER.size))
+            if magic != cls.SNAPSHOT_MAGIC:
+                raise ValueError(f"Not a Bloom filter snapshot: {path}")
+            bloom_filter = cls(size, hash_count)
+            if f.readinto(bloom_filter.bit_array) != len(bloom_filter.bit_array):
+                raise ValueError(f"Truncated Bloom filter snapshot: {path}")
+        return bloom_filter
+
     @staticmethod
     def _to_bytes(item):
         if isinstance(item, bytes):
@@ -40,4 +108,4 @@ class BloomFilter:
     @classmethod
     def get_hash_count(cls, m, n):
         k = (m/n) * math.log(2)
-        return int(k)
\ No newline at end of file
+        return int(k)
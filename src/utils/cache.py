@@ -0,0 +1,161 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional
+
+class TTLCache:
+    # Thread-safe LRU cache whose entries also expire after a time to live
+    def __init__(self, max_size: int, ttl: float):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return default
+            expires_at, value = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                return default
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        ttl = self.ttl if ttl is None else min(ttl, self.ttl)
+        if ttl <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, key: Hashable):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+class FrequencySketch:
+    # Count-min sketch of how often keys were requested recently. Counters
+    # saturate at 15 and are all halved every sample_size increments, so
+    # popularity fades and the sketch stays small.
+    SEEDS = (0x9E3779B1, 0x85EBCA77, 0xC2B2AE3D, 0x27D4EB2F)
+    MAX_COUNT = 15
+    HALVE = bytes(count >> 1 for count in range(256))
+
+    def __init__(self, expected_entries: int):
+        self.width = 1 << max(expected_entries - 1, 1).bit_length()
+        self.rows = [bytearray(self.width) for _ in self.SEEDS]
+        self.sample_size = 10 * self.width
+        self.additions = 0
+
+    def _indexes(self, key: Hashable):
+        mask = self.width - 1
+        return [hash((seed, key)) & mask for seed in self.SEEDS]
+
+    def increment(self, key: Hashable):
+        for row, index in zip(self.rows, self._indexes(key)):
+            if row[index] < self.MAX_COUNT:
+                row[index] += 1
+        self.additions += 1
+        if self.additions >= self.sample_size:
+            self.rows = [row.translate(self.HALVE) for row in self.rows]
+            self.additions //= 2
+
+    def estimate(self, key: Hashable) -> int:
+        return min(row[index] for row, index in zip(self.rows, self._indexes(key)))
+
+class SizedLRUCache:
+    # Thread-safe LRU bounded by the total size of its values. An entry that
+    # would evict others is only admitted if it has been requested more often
+    # recently than each of them (TinyLFU), so a scan of cold objects cannot
+    # flush the hot set.
+    GENERATION_STRIPES = 64
+
+    def __init__(self, max_bytes: int, sizeof: Callable[[Any], int] = len, expected_entries: int = 10_000):
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof
+        self._entries = OrderedDict()  # key -> (size, value)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._sketch = FrequencySketch(expected_entries)
+        self._generations = [0] * self.GENERATION_STRIPES
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.rejections = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            self._sketch.increment(key)
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def generation(self, key: Hashable) -> int:
+        # Taken before loading a value; set() drops the value if the key may
+        # have been invalidated in the meantime.
+        return self._generations[hash(key) % self.GENERATION_STRIPES]
+
+    def set(self, key: Hashable, value: Any, generation: Optional[int] = None) -> bool:
+        size = self.sizeof(value)
+        with self._lock:
+            if generation is not None and generation != self.generation(key):
+                return False
+            if size > self.max_bytes:
+                self.rejections += 1
+                return False
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._bytes -= previous[0]
+
+            excess = self._bytes + size - self.max_bytes
+            if excess > 0:
+                frequency = self._sketch.estimate(key)
+                victims = []
+                for victim_key, (victim_size, _) in self._entries.items():
+                    if excess <= 0:
+                        break
+                    if self._sketch.estimate(victim_key) >= frequency:
+                        self.rejections += 1
+                        return False
+                    victims.append(victim_key)
+                    excess -= victim_size
+                for victim_key in victims:
+                    self._bytes -= self._entries.pop(victim_key)[0]
+                self.evictions += len(victims)
+
+            self._entries[key] = (size, value)
+            self._bytes += size
+            return True
+
+    def invalidate(self, key: Hashable):
+        with self._lock:
+            self._generations[hash(key) % self.GENERATION_STRIPES] += 1
+            entry = self._entries.pop(key, None)
+            if entry is not None:
+                self._bytes -= entry[0]
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'rejections': self.rejections,
+                'entries': len(self._entries),
+                'bytes': self._bytes
+            }
\ No newline at end of file
@@ -1,9 +1,10 @@
 import hashlib
 import mimetypes
 import gzip
+import zlib
+from typing import Iterable, Iterator
 
 def calculate_md5(data: bytes) -> str:
-    print(data)
     return hashlib.md5(data).hexdigest()
 
 def get_mime_type(file_path: str) -> str:
@@ -14,4 +15,17 @@ def compress_data(data: bytes) -> bytes:
     return gzip.compress(data)
 
 def decompress_data(data: bytes) -> bytes:
-    return gzip.decompress(data)
\ No newline at end of file
+    return gzip.decompress(data)
+
+def decompress_stream(chunks: Iterable[bytes], max_chunk_size: int = 1024 * 1024) -> Iterator[bytes]:
+    decompressor = zlib.decompressobj(wbits=31)
+    for chunk in chunks:
+        # max_length keeps highly compressible input from expanding into one huge chunk
+        while chunk:
+            data = decompressor.decompress(chunk, max_chunk_size)
+            if data:
+                yield data
+            chunk = decompressor.unconsumed_tail
+    tail = decompressor.flush()
+    if tail:
+        yield tail
\ No newline at end of file
@@ -0,0 +1,215 @@
+import bisect
+import contextvars
+import http.server
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+# Seconds; Prometheus-style cumulative buckets with an implicit +Inf
+LATENCY_BUCKETS = (0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+def _escape(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+def _number(value: float) -> str:
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name: str, description: str, label_names: Sequence[str] = ()):
+        self.name = name
+        self.description = description
+        self.label_names = tuple(label_names)
+        self._children = {}
+        self._lock = threading.Lock()
+
+    def labels(self, *values: str):
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.label_names):
+                raise ValueError(f"{self.name} takes labels {self.label_names}")
+            with self._lock:
+                child = self._children.setdefault(values, self._new_child())
+        return child
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def collect(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            children = sorted(self._children.items())
+        for values, child in children:
+            lines.extend(self._samples(values, child))
+        return lines
+
+    def _samples(self, values: Tuple[str, ...], child) -> List[str]:
+        raise NotImplementedError
+
+class _CounterChild:
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1):
+        with self._lock:
+            self.value += amount
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def _samples(self, values, child):
+        return [f"{self.name}{_labels(self.label_names, values)} {_number(child.value)}"]
+
+class _HistogramChild:
+    def __init__(self, buckets: Sequence[float]):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # per bucket, not cumulative; the last is +Inf
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+
+    def snapshot(self) -> Tuple[List[int], float]:
+        with self._lock:
+            return list(self.counts), self.sum
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name: str, description: str, label_names: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, description, label_names)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def _samples(self, values, child):
+        counts, total = child.snapshot()
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float('inf'),), counts):
+            cumulative += count
+            le = 'le="+Inf"' if bound == float('inf') else f'le="{_number(bound)}"'
+            lines.append(f"{self.name}_bucket{_labels(self.label_names, values, le)} {cumulative}")
+        lines.append(f"{self.name}_sum{_labels(self.label_names, values)} {_number(total)}")
+        lines.append(f"{self.name}_count{_labels(self.label_names, values)} {cumulative}")
+        return lines
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def counter(self, name: str, description: str, label_names: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, description, label_names))
+
+    def histogram(self, name: str, description: str, label_names: Sequence[str] = (),
+                  buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, description, label_names, buckets))
+
+    def _register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric {metric.name} is already registered")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        # Prometheus text exposition format
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return ''.join(line + '\n' for metric in metrics for line in metric.collect())
+
+registry = Registry()
+
+STAGE_SECONDS = registry.histogram(
+    'objdir_stage_seconds', "Time spent in each stage of serving requests", ('stage',)
+)
+
+# Stage totals of the request being served in this context, if it is collected
+_request_stages: contextvars.ContextVar[Optional[Dict[str, float]]] = contextvars.ContextVar('request_stages', default=None)
+
+def _record_stage(name: str, seconds: float):
+    STAGE_SECONDS.labels(name).observe(seconds)
+    stages = _request_stages.get()
+    if stages is not None:
+        stages[name] = stages.get(name, 0.0) + seconds
+
+@contextmanager
+def request_stages():
+    # Collects the time spent in each stage by code run in this context until
+    # the block exits. Work handed to other threads is only included if it
+    # runs in a copy of this context.
+    stages = {}
+    previous = _request_stages.set(stages).old_value
+    try:
+        yield stages
+    finally:
+        # Not reset(): a streaming generator may be closed from another context
+        _request_stages.set(None if previous is contextvars.Token.MISSING else previous)
+
+@contextmanager
+def stage(name: str):
+    # Times the block as one observation of the named stage
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        _record_stage(name, time.perf_counter() - started)
+
+def timed_stream(name: str, items: Iterable) -> Iterator:
+    # For lazily produced data: the time spent producing all the items is
+    # recorded as one observation when the stream ends or is abandoned
+    elapsed = 0.0
+    iterator = iter(items)
+    try:
+        while True:
+            started = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            finally:
+                elapsed += time.perf_counter() - started
+            yield item
+    finally:
+        _record_stage(name, elapsed)
+
+class _MetricsHandler(http.server.BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split('?', 1)[0] != '/metrics':
+            self.send_error(404)
+            return
+        body = self.server.registry.render().encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass  # one line per scrape is noise
+
+def start_metrics_server(host: str, port: int, metrics: Registry = registry) -> http.server.ThreadingHTTPServer:
+    # Serves GET /metrics from a daemon thread; shutdown() stops it
+    server = http.server.ThreadingHTTPServer((host, port), _MetricsHandler)
+    server.daemon_threads = True
+    server.registry = metrics
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    return server
\ No newline at end of file
@@ -0,0 +1,71 @@
+import collections
+import os
+import sys
+import threading
+import time
+from typing import Dict, Optional
+
+# Threads whose innermost frame is in one of these are waiting for work, or
+# are gRPC's completion queue pollers blocked in C
+IDLE_FILES = tuple(os.sep + name for name in (
+    'threading.py', 'queue.py', 'selectors.py', os.path.join('concurrent', 'futures', 'thread.py'),
+    os.path.join('grpc', '_server.py'), os.path.join('grpc', '_channel.py'),
+))
+
+class SamplingProfiler:
+    # Samples the Python stacks of every other thread at a fixed interval and
+    # counts them as collapsed stacks ("thread;outer;...;inner count"), the
+    # input format of flamegraph.pl and speedscope. Only one profile runs in
+    # a process at a time.
+    _running = threading.Lock()
+
+    def __init__(self, interval: float, include_idle: bool = False):
+        self.interval = interval
+        self.include_idle = include_idle
+        self.stacks = collections.Counter()
+        self.samples = 0
+        self._labels: Dict[object, str] = {}
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        if not SamplingProfiler._running.acquire(blocking=False):
+            raise RuntimeError("A profile is already running")
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> collections.Counter:
+        self._stop.set()
+        self._thread.join()
+        SamplingProfiler._running.release()
+        return self.stacks
+
+    def _run(self):
+        own_id = threading.get_ident()
+        next_sample = time.monotonic()
+        while not self._stop.is_set():
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                if not self.include_idle and frame.f_code.co_filename.endswith(IDLE_FILES):
+                    continue
+                frames = []
+                while frame is not None:
+                    frames.append(self._label(frame.f_code))
+                    frame = frame.f_back
+                frames.append(names.get(thread_id, str(thread_id)))
+                self.stacks[';'.join(reversed(frames))] += 1
+            self.samples += 1
+            next_sample += self.interval
+            self._stop.wait(max(0.0, next_sample - time.monotonic()))
+
+    def _label(self, code) -> str:
+        label = self._labels.get(code)
+        if label is None:
+            label = f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+            self._labels[code] = label
+        return label
+
+def format_collapsed(stacks: collections.Counter) -> str:
+    return ''.join(f"{stack} {count}\n" for stack, count in sorted(stacks.items()))
\ No newline at end of file
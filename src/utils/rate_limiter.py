@@ -0,0 +1,24 @@
+import threading
+import time
+
+class RateLimiter:
+    # Token bucket: acquire blocks until the amount fits within rate units per
+    # second, allowing bursts of up to one second's worth. A rate of 0 never
+    # blocks.
+    def __init__(self, rate: float):
+        self.rate = rate
+        self._available = rate
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, amount: float):
+        if self.rate <= 0:
+            return
+        with self._lock:
+            now = time.monotonic()
+            self._available = min(self.rate, self._available + (now - self._updated) * self.rate)
+            self._updated = now
+            self._available -= amount
+            wait = -self._available / self.rate if self._available < 0 else 0
+        if wait:
+            time.sleep(wait)
\ No newline at end of file